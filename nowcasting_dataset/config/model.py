@@ -12,6 +12,7 @@ are used to validate the values of the data itself.
 
 """
 from datetime import datetime
+from enum import Enum
 from typing import Optional, Union
 
 import git
@@ -30,6 +31,46 @@ from nowcasting_dataset.dataset.split import split
 
 IMAGE_SIZE_PIXELS_FIELD = Field(64, description="The number of pixels of the region of interest.")
 METERS_PER_PIXEL_FIELD = Field(2000, description="The number of meters per pixel.")
+DISK_CACHE_PATH_FIELD = Field(
+    None,
+    description="If set, then cache the compressed Zarr chunks in this local directory, so each"
+    " chunk is only downloaded once per machine.  Several DataSources, and several processes,"
+    " can share one directory.  If None then don't cache.",
+)
+DISK_CACHE_MAX_GB_FIELD = Field(
+    100, gt=0, description="The maximum size of the disk cache, in gigabytes."
+)
+SATELLITE_INDEX_PATH_FIELD = Field(
+    None,
+    description="If set, then open the satellite Zarr stores using a persistent index of their"
+    " combined time coords saved at this path (a `.npz` file), instead of reading the metadata"
+    " of every store.  The index is built (or rebuilt, when the set of stores changes) if"
+    " necessary.  If None then open the stores with `xr.open_mfdataset()`.",
+)
+DAYLIGHT_MASK_CACHE_PATH_FIELD = Field(
+    None,
+    description="If set, then save the mask of which satellite timesteps are in daylight in this"
+    " directory, keyed by the time coords and the corners of the imagery, so later runs load it"
+    " instead of recomputing it.  If None then compute the mask every time.",
+)
+
+
+class ValidationLevel(Enum):
+    """How often to validate the batches created by each DataSource."""
+
+    OFF = "off"
+    SAMPLED = "sampled"
+    FULL = "full"
+
+
+class NWPInitTimePolicy(Enum):
+    """Which NWP init time to use for each target time in an example."""
+
+    #: The most recent init time at or before the start of the example, for every target time.
+    LATEST_BEFORE_START = "latest_before_start"
+    #: The most recent init time at or before each target time, for target times up to t0, and
+    #: the most recent init time at or before t0 for target times after t0.  See Issue #398.
+    CLOSEST_TO_T0 = "closest_to_t0"
 
 
 class General(BaseModel):
@@ -131,6 +172,17 @@ class Satellite(DataSourceMixin):
         METERS_PER_PIXEL_FIELD.default * 3,
         description="The number of meters per pixel for non-HRV satellite channels.",
     )
+    satellite_max_chunks_in_cache: int = Field(
+        0,
+        ge=0,
+        description="The maximum number of decompressed chunks that each worker keeps in memory,"
+        " so chunks shared by consecutive examples are only decompressed once.  Works best with"
+        " `process.sort_examples_within_each_batch`.  If 0 then don't cache chunks.",
+    )
+    satellite_disk_cache_path: Optional[str] = DISK_CACHE_PATH_FIELD
+    satellite_disk_cache_max_gb: float = DISK_CACHE_MAX_GB_FIELD
+    satellite_index_path: Optional[str] = SATELLITE_INDEX_PATH_FIELD
+    satellite_daylight_mask_cache_path: Optional[str] = DAYLIGHT_MASK_CACHE_PATH_FIELD
 
 
 class HRVSatellite(DataSourceMixin):
@@ -148,6 +200,17 @@ class HRVSatellite(DataSourceMixin):
     # time the number of pixels
     hrvsatellite_image_size_pixels: int = IMAGE_SIZE_PIXELS_FIELD
     hrvsatellite_meters_per_pixel: int = METERS_PER_PIXEL_FIELD
+    hrvsatellite_max_chunks_in_cache: int = Field(
+        0,
+        ge=0,
+        description="The maximum number of decompressed chunks that each worker keeps in memory,"
+        " so chunks shared by consecutive examples are only decompressed once.  Works best with"
+        " `process.sort_examples_within_each_batch`.  If 0 then don't cache chunks.",
+    )
+    hrvsatellite_disk_cache_path: Optional[str] = DISK_CACHE_PATH_FIELD
+    hrvsatellite_disk_cache_max_gb: float = DISK_CACHE_MAX_GB_FIELD
+    hrvsatellite_index_path: Optional[str] = SATELLITE_INDEX_PATH_FIELD
+    hrvsatellite_daylight_mask_cache_path: Optional[str] = DAYLIGHT_MASK_CACHE_PATH_FIELD
 
 
 class NWP(DataSourceMixin):
@@ -160,6 +223,35 @@ class NWP(DataSourceMixin):
     nwp_channels: tuple = Field(NWP_VARIABLE_NAMES, description="the channels used in the nwp data")
     nwp_image_size_pixels: int = IMAGE_SIZE_PIXELS_FIELD
     nwp_meters_per_pixel: int = METERS_PER_PIXEL_FIELD
+    nwp_disk_cache_path: Optional[str] = DISK_CACHE_PATH_FIELD
+    nwp_disk_cache_max_gb: float = DISK_CACHE_MAX_GB_FIELD
+    nwp_init_time_policy: NWPInitTimePolicy = Field(
+        NWPInitTimePolicy.LATEST_BEFORE_START,
+        description="Which NWP init time to use for each target time.  'latest_before_start'"
+        " uses one init time (the most recent at the start of the example) for the whole example."
+        "  'closest_to_t0' uses the most recent init time for each target time up to t0, and the"
+        " most recent init time at t0 for the forecast.",
+    )
+    nwp_point_store_path: Optional[str] = Field(
+        None,
+        description="If set, then read the NWP examples centred on the GSP and PV locations from"
+        " this NWP point store (created by scripts/extract_nwp_at_locations.py), instead of from"
+        " nwp_zarr_path.",
+    )
+    nwp_resample_to_5_minutes: bool = Field(
+        False,
+        description="If True then linearly interpolate each NWP batch from hourly to 5 minutely,"
+        " in one vectorised operation.  Each NWP example then has the same time steps as the"
+        " satellite data.",
+    )
+    nwp_max_chunks_in_cache: int = Field(
+        0,
+        ge=0,
+        description="The maximum number of decompressed NWP chunks that each worker keeps in"
+        " memory, so chunks shared by consecutive examples are only decompressed once.  Only"
+        " used with the 'latest_before_start' nwp_init_time_policy.  If 0 then don't cache"
+        " chunks.",
+    )
 
 
 class GSP(DataSourceMixin):
@@ -295,6 +387,62 @@ class InputData(BaseModel):
         )
 
 
+class BatchFileFormat(Enum):
+    """The format of the prepared batches."""
+
+    #: One NetCDF file per batch, per DataSource: <split>/<data_source_name>/000000.nc
+    NETCDF = "netcdf"
+    #: One Zarr store per DataSource, per split: <split>/<data_source_name>.zarr
+    ZARR = "zarr"
+
+
+class BatchFileEncoding(BaseModel):
+    """How to encode the data vars in the NetCDF batch files written by one DataSource."""
+
+    compression: Optional[str] = Field(
+        None, description="The HDF5 compression filter: 'gzip', 'lzf', or None (no compression)."
+    )
+    compression_level: Optional[int] = Field(
+        None, ge=0, le=9, description="The gzip compression level.  Higher is smaller but slower."
+    )
+    shuffle: bool = Field(
+        False,
+        description=(
+            "If True then apply the HDF5 byte shuffle filter before compressing, which often"
+            " makes floating point data compress much better."
+        ),
+    )
+    dtype: Optional[str] = Field(
+        None,
+        description=(
+            "If set (e.g. 'float32') then save floating point data vars with this dtype."
+            "  Other data vars are saved with their original dtype."
+        ),
+    )
+    chunks: Optional[dict[str, int]] = Field(
+        None,
+        description=(
+            "The length of each chunk along each dimension, keyed by the name of the dimension."
+            "  For example, {'example': 1} will store each example in its own chunk."
+            "  Dimensions which are not listed are not split into chunks.  If None then let"
+            " HDF5 choose the chunks."
+        ),
+    )
+
+    @validator("compression")
+    def compression_must_be_known(cls, v):
+        """Validate 'compression'"""
+        assert v in (None, "gzip", "lzf"), f"compression must be 'gzip', 'lzf' or None, not {v}"
+        return v
+
+    @validator("compression_level")
+    def compression_level_needs_gzip(cls, v, values):
+        """Validate 'compression_level'"""
+        if v is not None:
+            assert values.get("compression") == "gzip", "compression_level requires gzip!"
+        return v
+
+
 class OutputData(BaseModel):
     """Output data model"""
 
@@ -305,6 +453,27 @@ class OutputData(BaseModel):
             " 'gs://' or 's3://'"
         ),
     )
+    batch_file_format: BatchFileFormat = Field(
+        BatchFileFormat.NETCDF,
+        description=(
+            "'netcdf' saves each batch for each DataSource in its own NetCDF file.  'zarr'"
+            " appends the batches for each DataSource to one Zarr store per split, with one"
+            " batch per chunk, which avoids creating tens of thousands of small files.  'zarr'"
+            " writes directly to `filepath` (so it needs process.upload_every_n_batches to be"
+            " 0), needs one worker per DataSource (because batches are appended in order), and"
+            " ignores `batch_file_encoding`."
+        ),
+    )
+    batch_file_encoding: dict[str, BatchFileEncoding] = Field(
+        {},
+        description=(
+            "How to encode the batch files for each DataSource, keyed by the name of the"
+            " DataSource.  For example, {'satellite': {'compression': 'gzip',"
+            " 'compression_level': 4, 'shuffle': True}}.  The batch files of DataSources which"
+            " are not listed are not compressed.  Run scripts/benchmark_batch_file_encoding.py"
+            " to compare the file size, and the time to write and read, for different settings."
+        ),
+    )
 
     @validator("filepath")
     def filepath_pathy(cls, v):
@@ -362,13 +531,114 @@ class Process(BaseModel):
     upload_every_n_batches: int = Field(
         16,
         description=(
-            "How frequently to move batches from the local temporary directory to the cloud bucket."
+            "The maximum number of batches waiting in the local temporary directory to be"
+            " uploaded to the cloud bucket.  Batches are uploaded in a background thread whilst"
+            " the next batches are created, and each local file is deleted once it has been"
+            " uploaded.  Creating batches pauses if this many batches are waiting, so the local"
+            " disk doesn't fill up."
             "  If 0 then write batches directly to output_data.filepath, not to a temp directory."
         ),
     )
+    max_batches_waiting_to_be_written: int = Field(
+        1,
+        ge=1,
+        description=(
+            "The maximum number of batches (per DataSource, per worker) waiting to be written."
+            "  Batches are written in a background thread whilst the next batch is created, and"
+            " creating batches pauses if this many batches are waiting.  Increase this if"
+            " writing batches is slower than creating them in bursts, at the cost of holding"
+            " more batches in memory."
+        ),
+    )
 
     local_temp_path: str = Field("~/temp/")
 
+    export_locations_csv: bool = Field(
+        False,
+        description=(
+            "If True then also save the locations of each example as a CSV file, next to the"
+            " spatial_and_temporal_locations_of_each_example.npy file which is used to create"
+            " the batches.  The CSV file is only for people to read."
+        ),
+    )
+
+    n_workers_per_data_source: dict[str, int] = Field(
+        {},
+        description=(
+            "The number of worker processes used to create batches for each DataSource, keyed by"
+            " the name of the DataSource.  For example, {'satellite': 4} will split the batches"
+            " for the satellite DataSource across 4 processes.  Each worker claims the next"
+            " batch ID from a shared queue, so slow DataSources can be given more workers."
+            "  DataSources which are not listed get one worker."
+        ),
+    )
+
+    n_workers_for_sampling_locations: int = Field(
+        1,
+        ge=1,
+        description=(
+            "The number of worker processes used to sample the spatial and temporal locations"
+            " of each example.  The sampled locations only depend on `seed`, not on the number"
+            " of workers."
+        ),
+    )
+
+    sort_examples_within_each_batch: bool = Field(
+        False,
+        description=(
+            "If True then, when the locations of each example are sampled, sort the examples"
+            " within each batch by t0_datetime_UTC, so consecutive examples tend to read the same"
+            " Zarr chunks.  Each batch still holds the same examples, and examples never move"
+            " between batches or splits."
+        ),
+    )
+
+    group_examples_by_t0: bool = Field(
+        False,
+        description=(
+            "If True then create 't0-major' batches: Sort the examples within each batch by"
+            " t0_datetime_UTC (like `sort_examples_within_each_batch`), and make the Zarr"
+            " DataSources (satellite, hrvsatellite and nwp) load the time window for each"
+            " distinct t0 in a batch only once, and crop every example with that t0 from memory."
+            "  The batches are identical to the batches created when this is False."
+        ),
+    )
+
+    share_satellite_reads: bool = Field(
+        False,
+        description=(
+            "If True, and the satellite and hrvsatellite DataSources read the same Zarr store,"
+            " then the satellite workers create the batches for both DataSources, so each chunk"
+            " is read and decompressed only once, and the channels for each DataSource are"
+            " selected afterwards.  The batches are still saved in separate `satellite` and"
+            " `hrvsatellite` folders.  Requires `satellite_max_chunks_in_cache` to be big enough"
+            " to hold the chunks for one batch.  `n_workers_per_data_source['hrvsatellite']` is"
+            " ignored."
+        ),
+    )
+
+    validation_level: ValidationLevel = Field(
+        ValidationLevel.FULL,
+        description=(
+            "How often to validate the values in each batch.  'full' validates every batch."
+            "  'sampled' only validates every `validate_every_n_batches`th batch.  'off' never"
+            " validates."
+        ),
+    )
+
+    validate_every_n_batches: int = Field(
+        10,
+        ge=1,
+        description="If validation_level is 'sampled' then only validate every nth batch.",
+    )
+
+    @validator("n_workers_per_data_source")
+    def n_workers_per_data_source_must_be_positive(cls, v):
+        """Validate 'n_workers_per_data_source'"""
+        for data_source_name, n_workers in v.items():
+            assert n_workers > 0, f"n_workers for {data_source_name} must be > 0, not {n_workers}!"
+        return v
+
 
 class Configuration(BaseModel):
     """Configuration model for the dataset"""
@@ -0,0 +1,124 @@
+""" A least-recently-used cache of decompressed chunks, for ZarrDataSources.
+
+Each example only needs a small part of each chunk, but dask decompresses the whole chunk every
+time an example is loaded.  If examples which share chunks are loaded one after the other (see
+`nowcasting_dataset.dataset.locations.sort_locations_within_each_batch()`), then keeping the
+most recently used chunks in memory means each chunk is only decompressed once.
+"""
+import collections
+import concurrent.futures
+import itertools
+import threading
+from typing import Hashable
+
+import dask.array
+import numpy as np
+
+
+class LRUChunkCache:
+    """Keep the `max_chunks` most recently used decompressed chunks of a dask array in memory.
+
+    Each worker process has its own DataSource, and hence its own cache.  The cache is
+    thread-safe, so examples can be loaded in a thread pool.  Different chunks are loaded in
+    parallel, and each chunk is only loaded once, even if several threads ask for it at once.
+    """
+
+    def __init__(self, max_chunks: int):
+        """Create an empty cache.
+
+        Args:
+          max_chunks: The maximum number of decompressed chunks to keep in memory.
+        """
+        assert max_chunks > 0, f"max_chunks must be positive, not {max_chunks}"
+        self.max_chunks = max_chunks
+        self.n_hits = 0
+        self.n_misses = 0
+        self._chunks: collections.OrderedDict[Hashable, np.ndarray] = collections.OrderedDict()
+        self._lock = threading.Lock()
+        # The chunks which are being loaded, and the Future which each loading thread sets.
+        self._loading: dict[Hashable, concurrent.futures.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def get_chunk(self, dask_array: dask.array.Array, chunk_idx: tuple[int, ...]) -> np.ndarray:
+        """Get one decompressed chunk of `dask_array`, loading it if it isn't in the cache.
+
+        Args:
+          dask_array: The array to load the chunk from.
+          chunk_idx: The position of the chunk in the chunk grid of `dask_array`.
+        """
+        key = (dask_array.name, chunk_idx)
+        with self._lock:
+            if key in self._chunks:
+                self.n_hits += 1
+                self._chunks.move_to_end(key)
+                return self._chunks[key]
+            # If another thread is already loading this chunk, then wait for it, so two threads
+            # never decompress the same chunk.
+            future = self._loading.get(key)
+            if future is None:
+                self.n_misses += 1
+                future = self._loading[key] = concurrent.futures.Future()
+                is_loader = True
+            else:
+                self.n_hits += 1
+                is_loader = False
+
+        if not is_loader:
+            return future.result()
+
+        # Load without holding the lock, so threads can load different chunks in parallel.
+        try:
+            chunk = dask_array.blocks[chunk_idx].compute()
+        except BaseException as error:
+            with self._lock:
+                del self._loading[key]
+            future.set_exception(error)
+            raise
+
+        with self._lock:
+            del self._loading[key]
+            self._chunks[key] = chunk
+            if len(self._chunks) > self.max_chunks:
+                self._chunks.popitem(last=False)
+        future.set_result(chunk)
+        return chunk
+
+    def get_subarray(self, dask_array: dask.array.Array, slices: tuple[slice, ...]) -> np.ndarray:
+        """Get `dask_array[slices]` as a NumPy array, assembled from cached chunks.
+
+        Args:
+          dask_array: The array to select from.
+          slices: One slice per dimension of `dask_array`, with non-negative start and stop,
+            and a step of 1 (or None).
+        """
+        assert len(slices) == dask_array.ndim
+        chunk_starts_for_each_dim = [np.cumsum((0,) + chunks) for chunks in dask_array.chunks]
+        # Replace any Nones with integers.
+        slices = [slice(*s.indices(length)[:2]) for s, length in zip(slices, dask_array.shape)]
+        output = np.empty([max(s.stop - s.start, 0) for s in slices], dtype=dask_array.dtype)
+        if output.size == 0:
+            return output
+
+        # For each dim, find the chunks which overlap the slice.
+        chunk_idxs_for_each_dim = []
+        for s, chunk_starts in zip(slices, chunk_starts_for_each_dim):
+            first_chunk = np.searchsorted(chunk_starts, s.start, side="right") - 1
+            last_chunk = np.searchsorted(chunk_starts, s.stop, side="left") - 1
+            chunk_idxs_for_each_dim.append(range(first_chunk, last_chunk + 1))
+
+        for chunk_idx in itertools.product(*chunk_idxs_for_each_dim):
+            src_slices = []
+            dst_slices = []
+            for dim, i in enumerate(chunk_idx):
+                chunk_start = chunk_starts_for_each_dim[dim][i]
+                chunk_stop = chunk_starts_for_each_dim[dim][i + 1]
+                start = max(slices[dim].start, chunk_start)
+                stop = min(slices[dim].stop, chunk_stop)
+                src_slices.append(slice(start - chunk_start, stop - chunk_start))
+                dst_slices.append(slice(start - slices[dim].start, stop - slices[dim].start))
+            chunk = self.get_chunk(dask_array, chunk_idx)
+            output[tuple(dst_slices)] = chunk[tuple(src_slices)]
+
+        return output
@@ -1,25 +1,30 @@
 """  General Data Source Class """
+import contextlib
 import itertools
 import logging
+import queue
 from concurrent import futures
 from dataclasses import InitVar, dataclass
 from numbers import Number
 from pathlib import Path
-from typing import Iterable, List, Tuple, Union
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
+import numpy as np
 import pandas as pd
 import xarray as xr
 
 import nowcasting_dataset.filesystem.utils as nd_fs_utils
 import nowcasting_dataset.time as nd_time
-import nowcasting_dataset.utils as nd_utils
 from nowcasting_dataset import square
+from nowcasting_dataset.config.model import BatchFileEncoding, BatchFileFormat, ValidationLevel
 from nowcasting_dataset.consts import SPATIAL_AND_TEMPORAL_LOCATIONS_COLUMN_NAMES
 from nowcasting_dataset.data_sources.datasource_output import DataSourceOutput
 from nowcasting_dataset.dataset.xr_utils import (
     convert_coordinates_to_indexes_for_list_datasets,
     join_list_dataset_to_batch_dataset,
 )
+from nowcasting_dataset.filesystem.background_uploader import BackgroundUploader
+from nowcasting_dataset.filesystem.background_writer import BackgroundWriter, BackgroundZarrWriter
 
 logger = logging.getLogger(__name__)
 
@@ -147,6 +152,14 @@ class DataSource:
         dst_path: Path,
         local_temp_path: Path,
         upload_every_n_batches: int,
+        batch_idx_queue: Optional[queue.Queue] = None,
+        open_data_source: bool = True,
+        validation_level: ValidationLevel = ValidationLevel.FULL,
+        validate_every_n_batches: int = 1,
+        batch_file_encoding: Optional[BatchFileEncoding] = None,
+        max_batches_waiting_to_be_written: int = 1,
+        batch_file_format: BatchFileFormat = BatchFileFormat.NETCDF,
+        other_outputs: Sequence["BatchOutput"] = (),
     ) -> None:
         """Create multiple batches and save them to disk.
 
@@ -155,72 +168,107 @@ class DataSource:
         Args:
           spatial_and_temporal_locations_of_each_example: A DataFrame where each row specifies
             the spatial and temporal location of an example.  The number of rows must be
-            an exact multiple of `batch_size`.
+            an exact multiple of `batch_size`.  The first row is the first example of
+            batch `idx_of_first_batch`.
             Columns are: t0_datetime_UTC, x_center_OSGB, y_center_OSGB.
           idx_of_first_batch: The batch number of the first batch to create.
           batch_size: The number of examples per batch.
-          dst_path: The final destination path for the batches.  Must exist.
+          dst_path: The final destination path for the batches.  Must exist.  If
+            `batch_file_format` is ZARR then this is the path of the Zarr store.
           local_temp_path: The local temporary path.  This is only required when dst_path is a
             cloud storage bucket, so files must first be created on the VM's local disk in temp_path
-            and then uploaded to dst_path every upload_every_n_batches. Must exist. Will be emptied.
-          upload_every_n_batches: Upload the contents of temp_path to dst_path after this number
-            of batches have been created.  If 0 then will write directly to dst_path.
+            and then uploaded to dst_path in a background thread. Must exist. Will be emptied.
+          upload_every_n_batches: The maximum number of batches waiting in temp_path to be
+            uploaded.  Creating batches pauses when this many batches are waiting, so temp_path
+            doesn't fill up.  If 0 then will write directly to dst_path.
+          batch_idx_queue: Optional queue of batch IDs, shared between several worker processes
+            which are creating batches for this DataSource.  If set, then this worker keeps
+            claiming the next batch ID from the queue until the queue is empty.  If None then
+            create every batch in `spatial_and_temporal_locations_of_each_example`.
+          open_data_source: If True then call `open()` before creating batches.  Set to False
+            if `open()` has already been called in this process.
+          validation_level: Whether to validate every batch, every `validate_every_n_batches`th
+            batch, or no batches.
+          validate_every_n_batches: Used when `validation_level` is SAMPLED.
+          batch_file_encoding: How to compress and chunk the batch files.  If None then the
+            batch files are not compressed.
+          max_batches_waiting_to_be_written: Batches are written in a background thread whilst
+            the next batch is computed.  Computing batches pauses when this many batches are
+            waiting to be written.
+          batch_file_format: Save each batch as a NetCDF file, or append the batches to a Zarr
+            store.  Batches must be created in order when using Zarr, and
+            `upload_every_n_batches` must be 0.
+          other_outputs: Other (opened) DataSources which create batches for the same locations,
+            in the same loop.  Each batch of `self` is followed by the same batch of each other
+            DataSource, so DataSources which share reads (see
+            `SatelliteDataSource.share_reads_with()`) find the data in memory.
         """
         # Sanity checks:
         assert idx_of_first_batch >= 0
         assert batch_size > 0
         assert len(spatial_and_temporal_locations_of_each_example) % batch_size == 0
         assert upload_every_n_batches >= 0
+        assert batch_file_format == BatchFileFormat.NETCDF or upload_every_n_batches == 0
         assert spatial_and_temporal_locations_of_each_example.columns.to_list() == list(
             SPATIAL_AND_TEMPORAL_LOCATIONS_COLUMN_NAMES
         )
 
-        self.open()
+        if open_data_source:
+            self.open()
 
-        # Figure out where to write batches to:
-        save_batches_locally_and_upload = upload_every_n_batches > 0
-        if save_batches_locally_and_upload:
-            nd_fs_utils.delete_all_files_in_temp_path(local_temp_path)
-        path_to_write_to = local_temp_path if save_batches_locally_and_upload else dst_path
-
-        # Split locations per example into batches:
+        # Get the IDs of the batches to create:
         n_batches = len(spatial_and_temporal_locations_of_each_example) // batch_size
-        locations_for_batches = []
-        for batch_idx in range(n_batches):
-            start_example_idx = batch_idx * batch_size
-            end_example_idx = (batch_idx + 1) * batch_size
-            locations_for_batch = spatial_and_temporal_locations_of_each_example.iloc[
-                start_example_idx:end_example_idx
-            ]
-            locations_for_batches.append(locations_for_batch)
+        if batch_idx_queue is None:
+            batch_idxs = range(idx_of_first_batch, idx_of_first_batch + n_batches)
+        else:
+            batch_idxs = _claim_batch_idxs_from_queue(batch_idx_queue)
+
+        outputs = [
+            BatchOutput(
+                data_source=self,
+                dst_path=dst_path,
+                local_temp_path=local_temp_path,
+                batch_file_encoding=batch_file_encoding,
+            ),
+            *other_outputs,
+        ]
 
         # Loop round each batch:
-        for n_batches_processed, locations_for_batch in enumerate(locations_for_batches):
-            batch_idx = idx_of_first_batch + n_batches_processed
-            logger.debug(f"{self.__class__.__name__} creating batch {batch_idx}!")
-
-            # Generate batch.
-            batch = self.get_batch(
-                t0_datetimes=locations_for_batch.t0_datetime_UTC,
-                x_locations=locations_for_batch.x_center_OSGB,
-                y_locations=locations_for_batch.y_center_OSGB,
-            )
-
-            # Save batch to disk.
-            netcdf_filename = path_to_write_to / nd_utils.get_netcdf_filename(batch_idx)
-            batch.to_netcdf(netcdf_filename, engine="h5netcdf")
-
-            # Upload if necessary.
-            if (
-                save_batches_locally_and_upload
-                and n_batches_processed > 0
-                and n_batches_processed % upload_every_n_batches == 0
-            ):
-                nd_fs_utils.upload_and_delete_local_files(dst_path, path_to_write_to)
-
-        # Upload last few batches, if necessary:
-        if save_batches_locally_and_upload:
-            nd_fs_utils.upload_and_delete_local_files(dst_path, path_to_write_to)
+        with contextlib.ExitStack() as stack:
+            writers = [
+                _enter_batch_writer(
+                    stack,
+                    output,
+                    upload_every_n_batches=upload_every_n_batches,
+                    max_batches_waiting_to_be_written=max_batches_waiting_to_be_written,
+                    batch_file_format=batch_file_format,
+                )
+                for output in outputs
+            ]
+            for batch_idx in batch_idxs:
+                logger.debug(f"{self.__class__.__name__} creating batch {batch_idx}!")
+                assert idx_of_first_batch <= batch_idx < idx_of_first_batch + n_batches
+
+                # Get the locations for this batch:
+                start_example_idx = (batch_idx - idx_of_first_batch) * batch_size
+                end_example_idx = start_example_idx + batch_size
+                locations_for_batch = spatial_and_temporal_locations_of_each_example.iloc[
+                    start_example_idx:end_example_idx
+                ]
+
+                for output, writer in zip(outputs, writers):
+                    # Generate batch.
+                    batch = output.data_source.get_batch(
+                        t0_datetimes=locations_for_batch.t0_datetime_UTC,
+                        x_locations=locations_for_batch.x_center_OSGB,
+                        y_locations=locations_for_batch.y_center_OSGB,
+                        validate=should_validate_batch(
+                            batch_idx, validation_level, validate_every_n_batches
+                        ),
+                    )
+
+                    # Save batch to disk, and upload if necessary.
+                    writer.write(batch, batch_idx)
 
     # TODO: Issue #319: Standardise parameter names.
     def get_batch(
@@ -228,6 +276,7 @@ class DataSource:
         t0_datetimes: pd.DatetimeIndex,
         x_locations: Iterable[Number],
         y_locations: Iterable[Number],
+        validate: bool = True,
     ) -> DataSourceOutput:
         """
         Get Batch Data
@@ -238,6 +287,7 @@ class DataSource:
                 `future_minutes`.  The batch size is given by the length of the t0_datetimes.
             x_locations: x center batch locations
             y_locations: y center batch locations
+            validate: If True then validate the values in the batch.
 
         Returns: Batch data.
         """
@@ -247,6 +297,47 @@ class DataSource:
         assert len(t0_datetimes) == len(
             y_locations
         ), f"len(t0_datetimes) != len(y_locations): {len(t0_datetimes)} != {len(y_locations)}"
+        # Get the DataSource class, this could be one of the data sources like Sun
+        cls = self.get_data_model_for_batch()
+
+        # cast the batch to the cls, so that validation can occur
+        batch_one_datasource = cls(
+            self._get_batch_dataset(
+                t0_datetimes=t0_datetimes, x_locations=x_locations, y_locations=y_locations
+            )
+        )
+
+        # lets validate
+        if validate:
+            cls.validate(batch_one_datasource)
+
+        return batch_one_datasource
+
+    def _get_batch_dataset(
+        self,
+        t0_datetimes: pd.DatetimeIndex,
+        x_locations: Iterable[Number],
+        y_locations: Iterable[Number],
+    ) -> xr.Dataset:
+        """Get all the examples in a batch, joined into one xr.Dataset.
+
+        The dims of the returned Dataset are `example` and `<dim>_index` for each dim of the
+        examples, as created by `join_list_dataset_to_batch_dataset()`.
+
+        Child classes can override this to create the whole batch at once, instead of creating
+        one xr.Dataset per example.
+        """
+        return self._get_batch_dataset_from_examples(
+            t0_datetimes=t0_datetimes, x_locations=x_locations, y_locations=y_locations
+        )
+
+    def _get_batch_dataset_from_examples(
+        self,
+        t0_datetimes: pd.DatetimeIndex,
+        x_locations: Iterable[Number],
+        y_locations: Iterable[Number],
+    ) -> xr.Dataset:
+        """Get each example using `get_example()`, and then join the examples together."""
         zipped = list(zip(t0_datetimes, x_locations, y_locations))
         batch_size = len(t0_datetimes)
 
@@ -260,19 +351,11 @@ class DataSource:
                 future_examples.append(future_example)
             examples = [future_example.result() for future_example in future_examples]
 
-        # Get the DataSource class, this could be one of the data sources like Sun
-        cls = self.get_data_model_for_batch()
-
         # Set the coords to be indices before joining into a batch
         examples = convert_coordinates_to_indexes_for_list_datasets(examples)
 
-        # join the examples together, and cast them to the cls, so that validation can occur
-        batch_one_datasource = cls(join_list_dataset_to_batch_dataset(examples))
-
-        # lets validate
-        cls.validate(batch_one_datasource)
-
-        return batch_one_datasource
+        # join the examples together
+        return join_list_dataset_to_batch_dataset(examples)
 
     def datetime_index(self) -> pd.DatetimeIndex:
         """Returns a complete list of all available datetimes."""
@@ -306,11 +389,18 @@ class DataSource:
         )
 
     # TODO: Issue #319: Standardise parameter names.
-    def get_locations(self, t0_datetimes: pd.DatetimeIndex) -> Tuple[List[Number], List[Number]]:
+    def get_locations(
+        self, t0_datetimes: pd.DatetimeIndex, rng: Optional[np.random.Generator] = None
+    ) -> Tuple[List[Number], List[Number]]:
         """Find a valid geographical locations for each t0_datetime.
 
         Should be overridden by DataSources which may be used to define the locations.
 
+        Args:
+          t0_datetimes: The t0 datetime of each example.
+          rng: The random number generator to use.  If None, then the DataSource's own
+            random number generator is used.
+
         Returns:  x_locations, y_locations. Each has one entry per t0_datetime.
             Locations are in OSGB coordinates.
         """
@@ -333,6 +423,84 @@ class DataSource:
         raise NotImplementedError()
 
 
+@dataclass
+class BatchOutput:
+    """A DataSource, and where `DataSource.create_batches()` saves its batches.
+
+    See `DataSource.create_batches()` for the meaning of each path.
+    """
+
+    data_source: DataSource
+    dst_path: Path
+    local_temp_path: Path
+    batch_file_encoding: Optional[BatchFileEncoding] = None
+
+
+def _enter_batch_writer(
+    stack: contextlib.ExitStack,
+    output: BatchOutput,
+    upload_every_n_batches: int,
+    max_batches_waiting_to_be_written: int,
+    batch_file_format: BatchFileFormat,
+) -> Union[BackgroundWriter, BackgroundZarrWriter]:
+    """Open the background writer (and uploader, if necessary) for `output` on `stack`.
+
+    The writer is closed before the uploader.
+    """
+    # Figure out where to write batches to:
+    save_batches_locally_and_upload = upload_every_n_batches > 0
+    if save_batches_locally_and_upload:
+        nd_fs_utils.delete_all_files_in_temp_path(output.local_temp_path)
+        # Upload each batch in a background thread, whilst creating the next batch.
+        uploader = stack.enter_context(
+            BackgroundUploader(output.dst_path, max_files_in_queue=upload_every_n_batches)
+        )
+    else:
+        uploader = None
+    if save_batches_locally_and_upload:
+        path_to_write_to = output.local_temp_path
+    else:
+        path_to_write_to = output.dst_path
+
+    # Write (and then upload) each batch in a background thread, whilst computing the next batch.
+    if batch_file_format == BatchFileFormat.ZARR:
+        writer = BackgroundZarrWriter(
+            output.dst_path, max_batches_in_queue=max_batches_waiting_to_be_written
+        )
+    else:
+        writer = BackgroundWriter(
+            path_to_write_to,
+            batch_file_encoding=output.batch_file_encoding,
+            max_batches_in_queue=max_batches_waiting_to_be_written,
+            uploader=uploader,
+        )
+    return stack.enter_context(writer)
+
+
+def _claim_batch_idxs_from_queue(batch_idx_queue: queue.Queue) -> Iterator[int]:
+    """Yield batch IDs from `batch_idx_queue` until the queue is empty.
+
+    The queue is filled before any workers start, so an empty queue means that every batch
+    has been claimed by a worker.
+    """
+    while True:
+        try:
+            yield batch_idx_queue.get_nowait()
+        except queue.Empty:
+            return
+
+
+def should_validate_batch(
+    batch_idx: int, validation_level: ValidationLevel, validate_every_n_batches: int
+) -> bool:
+    """Return True if batch `batch_idx` should be validated."""
+    if validation_level == ValidationLevel.FULL:
+        return True
+    if validation_level == ValidationLevel.SAMPLED:
+        return batch_idx % validate_every_n_batches == 0
+    return False
+
+
 @dataclass
 class ImageDataSource(DataSource):
     """
@@ -366,6 +534,13 @@ class ZarrDataSource(ImageDataSource):
         Access using public data property.
       consolidated: Whether or not the Zarr store is consolidated.
       channels: The Zarr parameters to load.
+      disk_cache_path: If set, then cache the (compressed) Zarr chunks in this local directory,
+        so they're only downloaded once.  Can be shared by several DataSources and processes.
+        See `nowcasting_dataset.filesystem.disk_cache`.
+      disk_cache_max_gb: The maximum size of the disk cache, in gigabytes.
+      load_each_t0_once: If True then, for each distinct t0 in a batch, load the time window
+        once (for the smallest region which contains all the examples with that t0), and crop
+        each example from memory.  If False then load each example separately.
     """
 
     # zarr_path and channels must be set.  But dataclasses complains about defining a non-default
@@ -373,6 +548,9 @@ class ZarrDataSource(ImageDataSource):
     zarr_path: Union[Path, str] = None
     channels: Iterable[str] = None
     consolidated: bool = True
+    disk_cache_path: Optional[Union[Path, str]] = None
+    disk_cache_max_gb: float = 100
+    load_each_t0_once: bool = False
 
     def __post_init__(self, image_size_pixels: int, meters_per_pixel: int):
         """Post init"""
@@ -406,20 +584,35 @@ class ZarrDataSource(ImageDataSource):
 
         """
         selected_data = self._get_time_slice(t0_dt)
+        selected_data = self._get_square(selected_data, x_meters_center, y_meters_center)
+        return self._finish_example(selected_data, t0_dt, x_meters_center, y_meters_center)
+
+    def _get_square(
+        self, data_array: xr.DataArray, x_meters_center: Number, y_meters_center: Number
+    ) -> xr.DataArray:
+        """Select the square of `self._square.size_pixels` pixels centered on x and y."""
         bounding_box = self._square.bounding_box_centered_on(
             x_meters_center=x_meters_center, y_meters_center=y_meters_center
         )
-        selected_data = selected_data.sel(
+        data_array = data_array.sel(
             x=slice(bounding_box.left, bounding_box.right),
             y=slice(bounding_box.top, bounding_box.bottom),
         )
 
         # selected_sat_data is likely to have 1 too many pixels in x and y
         # because sel(x=slice(a, b)) is [a, b], not [a, b).  So trim:
-        selected_data = selected_data.isel(
+        return data_array.isel(
             x=slice(0, self._square.size_pixels), y=slice(0, self._square.size_pixels)
         )
 
+    def _finish_example(
+        self,
+        selected_data: xr.DataArray,
+        t0_dt: pd.Timestamp,
+        x_meters_center: Number,
+        y_meters_center: Number,
+    ) -> xr.Dataset:
+        """Post-process the selected data, check its shape, and load it into an xr.Dataset."""
         selected_data = self._post_process_example(selected_data, t0_dt)
 
         if selected_data.shape != self._shape_of_example:
@@ -435,6 +628,63 @@ class ZarrDataSource(ImageDataSource):
 
         return selected_data.load().to_dataset(name="data")
 
+    def _get_batch_dataset(
+        self,
+        t0_datetimes: pd.DatetimeIndex,
+        x_locations: Iterable[Number],
+        y_locations: Iterable[Number],
+    ) -> xr.Dataset:
+        """If `load_each_t0_once` then load each distinct t0 once, else load each example."""
+        if not self.load_each_t0_once:
+            return super()._get_batch_dataset(
+                t0_datetimes=t0_datetimes, x_locations=x_locations, y_locations=y_locations
+            )
+
+        x_locations = np.asarray(x_locations)
+        y_locations = np.asarray(y_locations)
+        example_idxs_for_each_t0 = pd.Series(np.arange(len(t0_datetimes))).groupby(
+            np.asarray(pd.DatetimeIndex(t0_datetimes))
+        )
+        examples = [None] * len(t0_datetimes)
+        with futures.ThreadPoolExecutor(max_workers=len(t0_datetimes)) as executor:
+            future_examples = []
+            for t0_dt, example_idxs in example_idxs_for_each_t0.indices.items():
+                future = executor.submit(
+                    self._get_examples_sharing_t0,
+                    pd.Timestamp(t0_dt),
+                    x_locations[example_idxs],
+                    y_locations[example_idxs],
+                )
+                future_examples.append((example_idxs, future))
+            for example_idxs, future in future_examples:
+                for example_idx, example in zip(example_idxs, future.result()):
+                    examples[example_idx] = example
+
+        examples = convert_coordinates_to_indexes_for_list_datasets(examples)
+        return join_list_dataset_to_batch_dataset(examples)
+
+    def _get_examples_sharing_t0(
+        self, t0_dt: pd.Timestamp, x_locations: np.ndarray, y_locations: np.ndarray
+    ) -> list[xr.Dataset]:
+        """Get the examples for one t0, loading the time window from disk only once.
+
+        Loads the smallest region which contains every example, and then crops each example
+        from that region in memory.
+        """
+        bounding_boxes = [
+            self._square.bounding_box_centered_on(x_meters_center=x, y_meters_center=y)
+            for x, y in zip(x_locations, y_locations)
+        ]
+        selected_data = self._get_time_slice(t0_dt)
+        selected_data = selected_data.sel(
+            x=slice(min(bb.left for bb in bounding_boxes), max(bb.right for bb in bounding_boxes)),
+            y=slice(max(bb.top for bb in bounding_boxes), min(bb.bottom for bb in bounding_boxes)),
+        ).load()
+        return [
+            self._finish_example(self._get_square(selected_data, x, y), t0_dt, x, y)
+            for x, y in zip(x_locations, y_locations)
+        ]
+
     def geospatial_border(self) -> List[Tuple[Number, Number]]:
         """
         Get 'corner' coordinates for a rectangle within the boundary of the data.
@@ -442,10 +692,18 @@ class ZarrDataSource(ImageDataSource):
         Returns List of 2-tuples of the x and y coordinates of each corner,
         in OSGB projection.
         """
+        # Only open the data if `open()` hasn't already opened it.
+        data = self._open_data() if self._data is None else self._data
+        return self._get_geospatial_border(data)
+
+    @staticmethod
+    def _get_geospatial_border(data: xr.DataArray) -> List[Tuple[Number, Number]]:
+        """Get the 'corner' coordinates of `data`.  See `geospatial_border()`."""
         GEO_BORDER: int = 64  #: In same geo projection and units as sat_data.
-        data = self._open_data()
+        x_coords = data.x.values
+        y_coords = data.y.values
         return [
-            (data.x.values[x], data.y.values[y])
+            (x_coords[x], y_coords[y])
             for x, y in itertools.product([GEO_BORDER, -GEO_BORDER], [GEO_BORDER, -GEO_BORDER])
         ]
 
@@ -4,11 +4,13 @@ from __future__ import annotations
 import logging
 import os
 from pathlib import Path
-from typing import Tuple
+from numbers import Number
+from typing import Optional, Tuple
 
 import numpy as np
 import xarray as xr
 
+from nowcasting_dataset.config.model import BatchFileEncoding
 from nowcasting_dataset.dataset.xr_utils import PydanticXArrayDataSet
 from nowcasting_dataset.filesystem.utils import makedirs
 from nowcasting_dataset.utils import get_netcdf_filename
@@ -28,13 +30,16 @@ class DataSourceOutput(PydanticXArrayDataSet):
         """Get the name of the class"""
         return self.__class__.__name__.lower()
 
-    def save_netcdf(self, batch_i: int, path: Path):
+    def save_netcdf(
+        self, batch_i: int, path: Path, batch_file_encoding: Optional[BatchFileEncoding] = None
+    ):
         """
         Save batch to netcdf file in path/<DataSourceOutputName>/.
 
         Args:
             batch_i: the batch id, used to make the filename
             path: the path where it will be saved. This can be local or in the cloud.
+            batch_file_encoding: How to encode the data vars.  If None then use lzf compression.
         """
         filename = get_netcdf_filename(batch_i)
 
@@ -49,9 +54,77 @@ class DataSourceOutput(PydanticXArrayDataSet):
         # make file
         local_filename = os.path.join(folder, filename)
 
-        encoding = {name: {"compression": "lzf"} for name in self.data_vars}
+        if batch_file_encoding is None:
+            batch_file_encoding = BatchFileEncoding(compression="lzf")
+        encoding = get_netcdf_encoding(self, batch_file_encoding)
         self.to_netcdf(local_filename, engine="h5netcdf", mode="w", encoding=encoding)
 
+    def check_data_var(
+        self,
+        data: xr.DataArray,
+        variable_name: str = None,
+        min_value: Optional[Number] = None,
+        max_value: Optional[Number] = None,
+        not_equal_value: Optional[Number] = None,
+        raise_error_if_equal: bool = True,
+    ):
+        """Check that all values are not NaNs, not infinite, and between min_value and max_value.
+
+        Gives the same result as `check_nan_and_inf()`, `check_dataset_greater_than_or_equal_to()`,
+        `check_dataset_less_than_or_equal_to()` and `check_dataset_not_equal()`, but only sweeps
+        through the data once (see `get_min_and_max()`), instead of once per check.
+
+        Args:
+            data: The data to check.
+            variable_name: The name of the data, to use in error messages.
+            min_value: If not None, raise an exception if any value is less than min_value.
+            max_value: If not None, raise an exception if any value is greater than max_value.
+            not_equal_value: If not None, check that no values are close to not_equal_value.
+            raise_error_if_equal: If True, raise an exception if any value is close to
+                not_equal_value.  If False, just log a warning.
+        """
+        data = np.asarray(data)
+        if data.size == 0:
+            return
+
+        min_data_value, max_data_value = get_min_and_max(data)
+
+        # NaNs propagate through min and max.
+        if np.isnan(min_data_value) or np.isnan(max_data_value):
+            self._log_and_raise("data values are NaNs", variable_name)
+
+        if np.isinf(min_data_value) or np.isinf(max_data_value):
+            self._log_and_raise("data values are Infinite", variable_name)
+
+        if min_value is not None and min_data_value < min_value:
+            self._log_and_raise(f"data values are less than {min_value}", variable_name)
+
+        if max_value is not None and max_data_value > max_value:
+            self._log_and_raise(f"data values are greater than {max_value}", variable_name)
+
+        if not_equal_value is not None:
+            # Only look for values close to not_equal_value (using the same tolerances as
+            # np.isclose) if not_equal_value is within the range of the data.
+            tolerance = 1e-08 + 1e-05 * abs(not_equal_value)
+            if (min_data_value - tolerance <= not_equal_value <= max_data_value + tolerance) and (
+                np.isclose(data, not_equal_value).any()
+            ):
+                self._log_and_raise(
+                    f"data values are equal to {not_equal_value}",
+                    variable_name,
+                    raise_error=raise_error_if_equal,
+                )
+
+    def _log_and_raise(self, message: str, variable_name: str = None, raise_error: bool = True):
+        message = f"Some {self.__class__.__name__} {message}"
+        if variable_name is not None:
+            message += f" ({variable_name})"
+        if raise_error:
+            logger.error(message)
+            raise Exception(message)
+        else:
+            logger.warning(message)
+
     def check_nan_and_inf(self, data: xr.Dataset, variable_name: str = None):
         """Check that all values are non NaNs and not infinite"""
 
@@ -132,6 +205,59 @@ class DataSourceOutput(PydanticXArrayDataSet):
             raise Exception(message)
 
 
+def get_netcdf_encoding(
+    dataset: xr.Dataset, batch_file_encoding: Optional[BatchFileEncoding]
+) -> dict[str, dict]:
+    """Get the `encoding` argument of `to_netcdf(engine="h5netcdf")` for each data var.
+
+    Args:
+        dataset: The batch to be saved.
+        batch_file_encoding: How to encode the batch.  If None then don't set any encoding.
+
+    Returns: Dict mapping from the name of each data var to its encoding.
+    """
+    if batch_file_encoding is None:
+        return {}
+
+    encoding = {}
+    for name, data_var in dataset.data_vars.items():
+        encoding_for_var = {}
+        if batch_file_encoding.compression is not None:
+            encoding_for_var["compression"] = batch_file_encoding.compression
+        if batch_file_encoding.compression_level is not None:
+            encoding_for_var["compression_opts"] = batch_file_encoding.compression_level
+        if batch_file_encoding.shuffle:
+            encoding_for_var["shuffle"] = True
+        if batch_file_encoding.dtype is not None and np.issubdtype(data_var.dtype, np.floating):
+            encoding_for_var["dtype"] = batch_file_encoding.dtype
+        if batch_file_encoding.chunks is not None:
+            encoding_for_var["chunksizes"] = tuple(
+                min(batch_file_encoding.chunks.get(dim, length), length)
+                for dim, length in zip(data_var.dims, data_var.shape)
+            )
+        encoding[name] = encoding_for_var
+    return encoding
+
+
+def get_min_and_max(array: np.ndarray, n_elements_per_block: int = 2 ** 18) -> Tuple:
+    """Get the minimum and maximum of `array`, sweeping through memory once.
+
+    The array is processed in blocks which are small enough to stay in the CPU cache, so the
+    maximum of each block is computed whilst the block is still in the cache.  NaNs propagate,
+    as in `np.min()` and `np.max()`.
+    """
+    array = array.reshape(-1)
+    mins_and_maxes = [
+        (block.min(), block.max())
+        for block in (
+            array[start : start + n_elements_per_block]
+            for start in range(0, array.size, n_elements_per_block)
+        )
+    ]
+    mins, maxes = zip(*mins_and_maxes)
+    return np.min(mins), np.max(maxes)
+
+
 def pad_nans(array, pad_width) -> np.ndarray:
     """Pad nans with nans"""
     array = array.astype(np.float32)
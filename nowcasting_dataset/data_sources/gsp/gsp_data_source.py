@@ -7,17 +7,19 @@ from dataclasses import dataclass
 from datetime import datetime
 from numbers import Number
 from pathlib import Path
-from typing import List, Optional, Tuple, Union
+from typing import Iterable, List, Optional, Tuple, Union
 
 import numpy as np
 import pandas as pd
 import xarray as xr
 
 import nowcasting_dataset.filesystem.utils as nd_fs_utils
+import nowcasting_dataset.utils as nd_utils
 from nowcasting_dataset.consts import DEFAULT_N_GSP_PER_EXAMPLE
 from nowcasting_dataset.data_sources.data_source import ImageDataSource
 from nowcasting_dataset.data_sources.gsp.eso import get_gsp_metadata_from_eso
 from nowcasting_dataset.data_sources.gsp.gsp_model import GSP
+from nowcasting_dataset.dataset.xr_utils import make_batch_dataset
 from nowcasting_dataset.geospatial import lat_lon_to_osgb
 from nowcasting_dataset.square import get_bounding_box_mask
 
@@ -109,7 +111,9 @@ class GSPDataSource(ImageDataSource):
         """
         return self.gsp_power.index
 
-    def get_locations(self, t0_datetimes: pd.DatetimeIndex) -> Tuple[List[Number], List[Number]]:
+    def get_locations(
+        self, t0_datetimes: pd.DatetimeIndex, rng: Optional[np.random.Generator] = None
+    ) -> Tuple[List[Number], List[Number]]:
         """
         Get x and y locations. Assume that all data is available for all GSP.
 
@@ -118,56 +122,48 @@ class GSPDataSource(ImageDataSource):
 
         Args:
             t0_datetimes: list of available t0 datetimes.
+            rng: The random number generator to use.  Defaults to `self.rng`.
 
         Returns: list of x and y locations
 
         """
+        if rng is None:
+            rng = self.rng
+
         total_gsp_nan_count = self.gsp_power.isna().sum().sum()
         if total_gsp_nan_count == 0:
 
             # get random GSP metadata
-            indexes = list(
-                self.rng.integers(low=0, high=len(self.metadata), size=len(t0_datetimes))
-            )
+            indexes = list(rng.integers(low=0, high=len(self.metadata), size=len(t0_datetimes)))
             metadata = self.metadata.iloc[indexes]
 
-            # get x, y locations
-            x_centers_osgb = list(metadata.location_x)
-            y_centers_osgb = list(metadata.location_y)
-
         else:
 
-            logger.warning(
+            logger.debug(
                 "There are some nans in the gsp data, "
-                "so to get x,y locations we have to do a big loop"
+                "so only choosing GSPs which have no nans for each t0_datetime"
             )
 
-            # Pick a random GSP for each t0_datetime, and then grab
-            # their geographical location.
-            x_centers_osgb = []
-            y_centers_osgb = []
-
-            for t0_dt in t0_datetimes:
-
-                # Choose start and end times
-                start_dt = self._get_start_dt(t0_dt)
-                end_dt = self._get_end_dt(t0_dt)
-
-                # remove any nans
-                gsp_power = self.gsp_power.loc[start_dt:end_dt].dropna(axis="columns", how="any")
+            # For each t0_datetime, find the GSPs with no NaNs between start_dt and end_dt.
+            t0_datetimes = pd.DatetimeIndex(t0_datetimes)
+            gsp_mask = nd_utils.get_columns_without_nans_in_windows(
+                df=self.gsp_power,
+                start_dts=self._get_start_dt(t0_datetimes),
+                end_dts=self._get_end_dt(t0_datetimes),
+            )
 
-                # get random index
-                random_gsp_id = self.rng.choice(gsp_power.columns)
-                meta_data = self.metadata[(self.metadata["gsp_id"] == random_gsp_id)]
+            # Pick a random GSP for each t0_datetime.
+            gsp_column_idxs = nd_utils.choose_random_true_element_in_each_row(gsp_mask, rng=rng)
+            random_gsp_ids = self.gsp_power.columns[gsp_column_idxs]
 
-                # Make sure there is only one GSP.
-                # Sometimes there are multiple gsp_ids at one location e.g. 'SELL_1'.
-                # TODO: Issue #272: Further investigation on multiple GSPs may be needed.
-                metadata_for_gsp = meta_data.iloc[0]
+            # Sometimes there are multiple gsp_ids at one location e.g. 'SELL_1'.
+            # So use the first row of metadata for each GSP.
+            # TODO: Issue #272: Further investigation on multiple GSPs may be needed.
+            metadata = self.metadata.drop_duplicates(subset="gsp_id").loc[random_gsp_ids]
 
-                # Get metadata for GSP
-                x_centers_osgb.append(metadata_for_gsp.location_x)
-                y_centers_osgb.append(metadata_for_gsp.location_y)
+        # get x, y locations
+        x_centers_osgb = list(metadata.location_x)
+        y_centers_osgb = list(metadata.location_y)
 
         return x_centers_osgb, y_centers_osgb
 
@@ -191,25 +187,9 @@ class GSPDataSource(ImageDataSource):
         # get the GSP power, including history and forecast
         selected_gsp_power, selected_capacity = self._get_time_slice(t0_dt)
 
-        # get the main gsp id, and the ids of the gsp in the bounding box
-        all_gsp_ids = self._get_gsp_ids_in_roi(
+        all_gsp_ids = self._get_gsp_ids_for_example(
             x_meters_center, y_meters_center, selected_gsp_power.columns
         )
-        if self.get_center:
-            central_gsp_id = self._get_central_gsp_id(
-                x_meters_center, y_meters_center, selected_gsp_power.columns
-            )
-            assert central_gsp_id in all_gsp_ids
-
-            # By convention, the 'target' GSP ID (the one in the center
-            # of the image) must be in the first position of the returned arrays.
-            all_gsp_ids = all_gsp_ids.drop(central_gsp_id)
-            all_gsp_ids = all_gsp_ids.insert(loc=0, item=central_gsp_id)
-        else:
-            logger.warning("Not getting center GSP")
-
-        # only select at most {n_gsp_per_example}
-        all_gsp_ids = all_gsp_ids[: self.n_gsp_per_example]
 
         # select the GSP power output for the selected GSP IDs
         selected_gsp_power = selected_gsp_power[all_gsp_ids]
@@ -261,6 +241,113 @@ class GSPDataSource(ImageDataSource):
 
         return gsp
 
+    def _get_batch_dataset(
+        self,
+        t0_datetimes: pd.DatetimeIndex,
+        x_locations: Iterable[Number],
+        y_locations: Iterable[Number],
+    ) -> xr.Dataset:
+        """Get all the examples at once, filling NumPy arrays instead of making an xr.Dataset
+        for each example.  Gives the same result as calling `get_example()` for each example."""
+        start_dts = pd.DatetimeIndex(self._get_start_dt(t0_datetimes)).floor("30T")
+        end_dts = self._get_end_dt(t0_datetimes)
+        power_row_idxs = nd_utils.get_row_idxs_of_windows(self.gsp_power.index, start_dts, end_dts)
+        capacity_row_idxs = nd_utils.get_row_idxs_of_windows(
+            self.gsp_capacity.index, start_dts, end_dts
+        )
+        if (
+            power_row_idxs is None
+            or capacity_row_idxs is None
+            or power_row_idxs.shape != capacity_row_idxs.shape
+        ):
+            # Not all examples have the same number of timesteps.
+            return super()._get_batch_dataset(
+                t0_datetimes=t0_datetimes, x_locations=x_locations, y_locations=y_locations
+            )
+
+        n_examples, n_timesteps = power_row_idxs.shape
+        shape = (n_examples, n_timesteps, self.n_gsp_per_example)
+        power_mw = np.zeros(shape, dtype=self.gsp_power.values.dtype)
+        capacity_mwp = np.zeros(shape, dtype=self.gsp_capacity.values.dtype)
+        x_coords = np.zeros((n_examples, self.n_gsp_per_example))
+        y_coords = np.zeros((n_examples, self.n_gsp_per_example))
+        # `get_example()` pads the IDs with NaNs, so the IDs are always floats.
+        gsp_ids = np.full((n_examples, self.n_gsp_per_example), np.NaN)
+
+        for example_i, (x_meters_center, y_meters_center) in enumerate(
+            zip(x_locations, y_locations)
+        ):
+            power_for_example = self.gsp_power.values[power_row_idxs[example_i]]
+            capacity_for_example = self.gsp_capacity.values[capacity_row_idxs[example_i]]
+
+            # Only use GSPs without any NaNs, like `_get_time_slice()`.
+            gsp_ids_with_data = self.gsp_power.columns[~np.isnan(power_for_example).any(axis=0)]
+            all_gsp_ids = self._get_gsp_ids_for_example(
+                x_meters_center, y_meters_center, gsp_ids_with_data
+            )
+            capacity_col_idxs = self.gsp_capacity.columns.get_indexer(all_gsp_ids)
+            capacity_for_example = capacity_for_example[:, capacity_col_idxs]
+            if (capacity_col_idxs == -1).any() or np.isnan(capacity_for_example).any():
+                # Let `get_example()` raise the appropriate exception.
+                return super()._get_batch_dataset(
+                    t0_datetimes=t0_datetimes, x_locations=x_locations, y_locations=y_locations
+                )
+
+            n_gsp = len(all_gsp_ids)
+            power_col_idxs = self.gsp_power.columns.get_indexer(all_gsp_ids)
+            power_mw[example_i, :, :n_gsp] = power_for_example[:, power_col_idxs]
+            capacity_mwp[example_i, :, :n_gsp] = capacity_for_example
+            x_coords[example_i, :n_gsp] = self.metadata.location_x[all_gsp_ids].values
+            y_coords[example_i, :n_gsp] = self.metadata.location_y[all_gsp_ids].values
+            gsp_ids[example_i, :n_gsp] = all_gsp_ids.values
+
+        return make_batch_dataset(
+            {
+                "power_mw": (("example", "time", "id"), power_mw),
+                "capacity_mwp": (("example", "time", "id"), capacity_mwp),
+                "x_coords": (("example", "id"), x_coords),
+                "y_coords": (("example", "id"), y_coords),
+                "time": (("example", "time"), self.gsp_power.index.values[power_row_idxs]),
+                "id": (("example", "id"), gsp_ids),
+            }
+        )
+
+    def _get_gsp_ids_for_example(
+        self,
+        x_meters_center: Number,
+        y_meters_center: Number,
+        gsp_ids_with_data_for_timeslice: pd.Int64Index,
+    ) -> pd.Int64Index:
+        """
+        Get the IDs of the GSPs for one example, with the central GSP first.
+
+        Args:
+            x_meters_center: x location of center GSP.
+            y_meters_center: y location of center GSP.
+            gsp_ids_with_data_for_timeslice: ids that are available for the example's time slice
+
+        Returns: At most `n_gsp_per_example` GSP ids
+        """
+        # get the main gsp id, and the ids of the gsp in the bounding box
+        all_gsp_ids = self._get_gsp_ids_in_roi(
+            x_meters_center, y_meters_center, gsp_ids_with_data_for_timeslice
+        )
+        if self.get_center:
+            central_gsp_id = self._get_central_gsp_id(
+                x_meters_center, y_meters_center, gsp_ids_with_data_for_timeslice
+            )
+            assert central_gsp_id in all_gsp_ids
+
+            # By convention, the 'target' GSP ID (the one in the center
+            # of the image) must be in the first position of the returned arrays.
+            all_gsp_ids = all_gsp_ids.drop(central_gsp_id)
+            all_gsp_ids = all_gsp_ids.insert(loc=0, item=central_gsp_id)
+        else:
+            logger.warning("Not getting center GSP")
+
+        # only select at most {n_gsp_per_example}
+        return all_gsp_ids[: self.n_gsp_per_example]
+
     def _get_central_gsp_id(
         self,
         x_meters_center: Number,
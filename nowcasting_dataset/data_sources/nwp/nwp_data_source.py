@@ -1,16 +1,23 @@
 """ NWP Data Source """
 import logging
 from dataclasses import InitVar, dataclass
-from typing import Iterable, Optional
+from numbers import Number
+from pathlib import Path
+from typing import Iterable, Optional, Union
 
 import numpy as np
 import pandas as pd
 import xarray as xr
 
+import nowcasting_dataset.time as nd_time
 from nowcasting_dataset import utils
+from nowcasting_dataset.config.model import NWPInitTimePolicy
 from nowcasting_dataset.consts import NWP_VARIABLE_NAMES
+from nowcasting_dataset.data_sources.chunk_cache import LRUChunkCache
 from nowcasting_dataset.data_sources.data_source import ZarrDataSource
 from nowcasting_dataset.data_sources.nwp.nwp_model import NWP
+from nowcasting_dataset.data_sources.nwp.nwp_point_store import open_nwp_point_store
+from nowcasting_dataset.filesystem.disk_cache import get_zarr_store
 
 _LOG = logging.getLogger(__name__)
 
@@ -46,11 +53,27 @@ class NWPDataSource(ZarrDataSource):
                 wdir10: Wind direction in degrees, 10 meters above surface.
                 prmsl : Pressure reduce to mean sea level in Pascals.
                 prate : Precipitation rate at the surface in kg/m^2/s.
+        init_time_policy: Which NWP init time to use for each target time.  See
+            `NWPInitTimePolicy`.
+        point_store_path: If set, then read the examples centred on the locations in this NWP
+            point store (written by `write_nwp_point_store()`) from the point store, instead of
+            from `zarr_path`.  Examples centred anywhere else are still read from `zarr_path`.
+        resample_to_5_minutes: If True then linearly interpolate each batch from hourly to
+            5-minutely, from `t0 - history_minutes` to `t0 + forecast_minutes`.
+        max_chunks_in_cache: If positive, then each example read from `zarr_path` is assembled
+            from a least-recently-used cache of up to this many decompressed chunks.  Only
+            used with `NWPInitTimePolicy.LATEST_BEFORE_START`, where each example is one
+            contiguous block of a single forecast.  If 0 then each example is loaded lazily
+            using dask.
     """
 
     channels: Optional[Iterable[str]] = NWP_VARIABLE_NAMES
     image_size_pixels: InitVar[int] = 2
     meters_per_pixel: InitVar[int] = 2_000
+    init_time_policy: NWPInitTimePolicy = NWPInitTimePolicy.LATEST_BEFORE_START
+    point_store_path: Optional[Union[Path, str]] = None
+    resample_to_5_minutes: bool = False
+    max_chunks_in_cache: int = 0
 
     def __post_init__(self, image_size_pixels: int, meters_per_pixel: int):
         """
@@ -62,13 +85,32 @@ class NWPDataSource(ZarrDataSource):
 
         """
         super().__post_init__(image_size_pixels, meters_per_pixel)
+        self.init_time_policy = NWPInitTimePolicy(self.init_time_policy)
         n_channels = len(self.channels)
+        # When resampling, every example has one more hourly step.  See `_get_hourly_end_dt()`.
+        n_hourly_steps = self.total_seq_length + int(self.resample_to_5_minutes)
         self._shape_of_example = (
             n_channels,
-            self.total_seq_length,
+            n_hourly_steps,
             image_size_pixels,
             image_size_pixels,
         )
+        # The interpolation weights for each offset of the start of the example from the hour.
+        # See `_get_resampling_weights()`.
+        self._resampling_weights = {}
+        # The init time lookup table, built by `open()`.  See `_build_init_time_lookup_table()`.
+        self._init_time_ns = None  # int64 nanoseconds since the Unix epoch.
+        self._step_ns = None  # int64 nanoseconds.
+        self._first_hour_ns = None
+        self._latest_init_time_idx_for_each_hour = None
+        self._point_data = None
+        self._point_location_x = None
+        self._point_location_y = None
+        self._target_time_periods = None
+        # The position of each x and y coord of `self.data`, so `_get_square()` can find the
+        # integer slices of each example.  Created by `open()`, with `self._chunk_cache`.
+        self._positions = None
+        self._chunk_cache = None
 
     def open(self) -> None:
         """
@@ -81,16 +123,146 @@ class NWPDataSource(ZarrDataSource):
         """
         data = self._open_data()
         self._data = data.sel(variable=list(self.channels))
+        self._build_init_time_lookup_table()
+        if self.point_store_path is not None:
+            self._open_point_store()
+        if (
+            self.max_chunks_in_cache > 0
+            and self.init_time_policy == NWPInitTimePolicy.LATEST_BEFORE_START
+        ):
+            self._chunk_cache = LRUChunkCache(max_chunks=self.max_chunks_in_cache)
+            self._positions = xr.Dataset(
+                {
+                    "x_idx": ("x", np.arange(len(self.data.x))),
+                    "y_idx": ("y", np.arange(len(self.data.y))),
+                },
+                coords={"x": self.data.x, "y": self.data.y},
+            )
+
+    def _open_point_store(self) -> None:
+        """Open the NWP point store, and check it matches `self.data`."""
+        point_data = open_nwp_point_store(
+            self.point_store_path,
+            disk_cache_path=self.disk_cache_path,
+            disk_cache_max_gb=self.disk_cache_max_gb,
+        )
+        point_data = point_data.sel(variable=list(self.channels))
+        for dim in ("init_time", "step"):
+            if not np.array_equal(point_data[dim].values, self.data[dim].values):
+                raise ValueError(
+                    f"The {dim} coords of the NWP point store {self.point_store_path} don't match"
+                    f" {self.zarr_path}.  Please re-create the point store."
+                )
+        if point_data.sizes["y_pixel"] != self._square.size_pixels:
+            raise ValueError(
+                f"The NWP point store {self.point_store_path} holds crops of"
+                f" {point_data.sizes['y_pixel']} pixels, not {self._square.size_pixels} pixels."
+            )
+        self._point_data = point_data
+        self._point_location_x = point_data.location_x.values
+        self._point_location_y = point_data.location_y.values
+
+    def _get_point_location_idxs(
+        self, x_locations: Iterable[Number], y_locations: Iterable[Number]
+    ) -> Optional[np.ndarray]:
+        """Find the index of each location in the point store.
+
+        Returns None if there's no point store, or if any location isn't in the point store.
+        """
+        if self._point_data is None:
+            return None
+        location_idxs = []
+        for x, y in zip(x_locations, y_locations):
+            matches = np.flatnonzero(
+                np.isclose(self._point_location_x, x) & np.isclose(self._point_location_y, y)
+            )
+            if len(matches) == 0:
+                return None
+            location_idxs.append(matches[0])
+        return np.array(location_idxs)
+
+    @staticmethod
+    def _get_point_example(point_data: xr.DataArray, location_i: int) -> xr.DataArray:
+        """Select one location from the point store, with the same dims as `self.data`."""
+        selected_data = point_data.isel(location=location_i)
+        selected_data = selected_data.drop_vars(["location_x", "location_y"])
+        return selected_data.swap_dims({"y_pixel": "y", "x_pixel": "x"})
+
+    def _build_init_time_lookup_table(self) -> None:
+        """Map each hour covered by `self.data` to the most recent init time at or before it.
+
+        Entry `i` of `self._latest_init_time_idx_for_each_hour` is the integer index of the
+        most recent init time at or before the hour `self._first_hour_ns + i` hours (or -1 if
+        there isn't one).  So each example can be selected with a single integer `isel`,
+        instead of searching the coords of `self.data` for every example.
+        """
+        self._init_time_ns = pd.DatetimeIndex(self.data.init_time.values).asi8
+        self._step_ns = pd.TimedeltaIndex(self.data.step.values).asi8
+        hour_ns = nd_time.ONE_HOUR.value
+        self._first_hour_ns = self._init_time_ns[0] // hour_ns * hour_ns
+        last_hour_ns = self._init_time_ns[-1] + self._step_ns[-1]
+        hours_ns = np.arange(self._first_hour_ns, last_hour_ns + hour_ns, hour_ns)
+        self._latest_init_time_idx_for_each_hour = (
+            np.searchsorted(self._init_time_ns, hours_ns, side="right") - 1
+        )
+
+    def _get_hour_idx(self, dt: pd.Timestamp) -> int:
+        """Get the index of the hour `dt` (which must be on the hour) in the lookup table."""
+        hour_idx, remainder = divmod(dt.value - self._first_hour_ns, nd_time.ONE_HOUR.value)
+        assert remainder == 0, f"{dt} is not on the hour"
+        if not 0 <= hour_idx < len(self._latest_init_time_idx_for_each_hour):
+            raise IndexError(f"{dt} is outside of the NWP data")
+        return hour_idx
 
     def _open_data(self) -> xr.DataArray:
-        return open_nwp(self.zarr_path, consolidated=self.consolidated)
+        return open_nwp(
+            self.zarr_path,
+            consolidated=self.consolidated,
+            disk_cache_path=self.disk_cache_path,
+            disk_cache_max_gb=self.disk_cache_max_gb,
+        )
 
     @staticmethod
     def get_data_model_for_batch():
         """Get the model that is used in the batch"""
         return NWP
 
-    def _get_time_slice(self, t0_dt: pd.Timestamp) -> xr.DataArray:
+    def get_example(
+        self, t0_dt: pd.Timestamp, x_meters_center: Number, y_meters_center: Number
+    ) -> xr.Dataset:
+        """Get an example, from the point store if it holds this location.  See `ZarrDataSource`."""
+        location_idxs = self._get_point_location_idxs([x_meters_center], [y_meters_center])
+        if location_idxs is None and self._chunk_cache is not None:
+            selected_data = self._get_example_from_chunk_cache(
+                t0_dt, x_meters_center=x_meters_center, y_meters_center=y_meters_center
+            )
+            return self._finish_example(selected_data, t0_dt, x_meters_center, y_meters_center)
+        if location_idxs is None:
+            return super().get_example(t0_dt, x_meters_center, y_meters_center)
+        selected_data = self._get_time_slice(t0_dt, data=self._point_data)
+        selected_data = self._get_point_example(selected_data, location_idxs[0])
+        return self._finish_example(selected_data, t0_dt, x_meters_center, y_meters_center)
+
+    def _get_examples_sharing_t0(
+        self, t0_dt: pd.Timestamp, x_locations: np.ndarray, y_locations: np.ndarray
+    ) -> list[xr.Dataset]:
+        """Get the examples for one t0, from the point store if it holds every location."""
+        location_idxs = self._get_point_location_idxs(x_locations, y_locations)
+        if location_idxs is None and self._chunk_cache is not None:
+            # The chunk cache already loads the chunks shared by these examples only once.
+            return [self.get_example(t0_dt, x, y) for x, y in zip(x_locations, y_locations)]
+        if location_idxs is None:
+            return super()._get_examples_sharing_t0(t0_dt, x_locations, y_locations)
+        selected_data = self._get_time_slice(t0_dt, data=self._point_data)
+        selected_data = selected_data.isel(location=location_idxs).load()
+        return [
+            self._finish_example(self._get_point_example(selected_data, i), t0_dt, x, y)
+            for i, (x, y) in enumerate(zip(x_locations, y_locations))
+        ]
+
+    def _get_time_slice(
+        self, t0_dt: pd.Timestamp, data: Optional[xr.DataArray] = None
+    ) -> xr.DataArray:
         """
         Select the numerical weather predictions for a single time slice.
 
@@ -100,34 +272,102 @@ class NWPDataSource(ZarrDataSource):
 
         Args:
             t0_dt: the time slice is around t0_dt.
+            data: The data to select from, with the same init_time and step coords as
+                `self.data`.  Defaults to `self.data`.
 
         Returns: Slice of data
 
         """
-        start_dt = self._get_start_dt(t0_dt)
-        end_dt = self._get_end_dt(t0_dt)
-
-        start_hourly = start_dt.floor("H")
-        end_hourly = end_dt.ceil("H")
-
-        # TODO: Issue #398: Use NWP init time closest to t0.
-        init_time_i = np.searchsorted(self.data.init_time, start_hourly.to_numpy(), side="right")
-        init_time_i -= 1  # Because searchsorted() gives the index to the entry _after_.
-        init_time = self.data.init_time.values[init_time_i]
-
-        step_start = start_hourly - init_time
-        step_end = end_hourly - init_time
+        if data is None:
+            data = self.data
+
+        if self.init_time_policy == NWPInitTimePolicy.LATEST_BEFORE_START:
+            init_time_idx, step_slice = self._get_init_time_idx_and_step_slice(t0_dt)
+            selected = data.isel(init_time=init_time_idx, step=step_slice)
+            return self._swap_step_for_target_time(selected)
+
+        start_hour_idx = self._get_hour_idx(self._get_start_dt(t0_dt).floor("H"))
+        end_hour_idx = self._get_hour_idx(self._get_hourly_end_dt(self._get_end_dt(t0_dt)))
+
+        # Use the most recent init time for each target time up to t0, and the most recent
+        # init time at t0 for every target time after t0.  The lookup table is sorted, so
+        # capping the hour at t0 does both.
+        hour_idxs = np.arange(start_hour_idx, end_hour_idx + 1)
+        t0_hour_idx = self._get_hour_idx(t0_dt.floor("H"))
+        init_time_idxs = self._latest_init_time_idx_for_each_hour[
+            np.minimum(hour_idxs, t0_hour_idx)
+        ]
+        hours_ns = self._first_hour_ns + hour_idxs * nd_time.ONE_HOUR.value
+        steps = hours_ns - self._init_time_ns[init_time_idxs]
+        step_idxs = np.minimum(np.searchsorted(self._step_ns, steps), len(self._step_ns) - 1)
+
+        # Like `LATEST_BEFORE_START`, leave out the target times which the forecasts don't reach.
+        available = (init_time_idxs >= 0) & (self._step_ns[step_idxs] == steps)
+        selected = data.isel(
+            init_time=xr.DataArray(init_time_idxs[available], dims="target_time"),
+            step=xr.DataArray(step_idxs[available], dims="target_time"),
+        )
+        return selected.assign_coords(target_time=selected.init_time.values + selected.step)
+
+    def _get_init_time_idx_and_step_slice(self, t0_dt: pd.Timestamp) -> tuple[int, slice]:
+        """Get the integer positions of the forecast for `t0_dt`, for `LATEST_BEFORE_START`."""
+        start_hourly = self._get_start_dt(t0_dt).floor("H")
+        end_hourly = self._get_hourly_end_dt(self._get_end_dt(t0_dt))
+        self._get_hour_idx(end_hourly)  # Check `end_hourly` is inside the NWP data.
+        init_time_idx = self._latest_init_time_idx_for_each_hour[self._get_hour_idx(start_hourly)]
+        init_time_ns = self._init_time_ns[init_time_idx]
+        step_start_idx = np.searchsorted(self._step_ns, start_hourly.value - init_time_ns)
+        step_end_idx = np.searchsorted(self._step_ns, end_hourly.value - init_time_ns, side="right")
+        return int(init_time_idx), slice(int(step_start_idx), int(step_end_idx))
 
-        selected = self.data.sel(init_time=init_time, step=slice(step_start, step_end))
-        selected = selected.swap_dims({"step": "target_time"})
-        selected["target_time"] = init_time + selected.step
-        return selected
+    @staticmethod
+    def _swap_step_for_target_time(selected: xr.DataArray) -> xr.DataArray:
+        """Replace the `step` dim of a single forecast with the `target_time` dim."""
+        selected = selected.assign_coords(target_time=selected.init_time.values + selected.step)
+        return selected.swap_dims({"step": "target_time"})
+
+    def _get_example_from_chunk_cache(
+        self, t0_dt: pd.Timestamp, x_meters_center: Number, y_meters_center: Number
+    ) -> xr.DataArray:
+        """Select the same data as `_get_time_slice()` and then `_get_square()` but assemble
+        the values from `self._chunk_cache`."""
+        init_time_idx, step_slice = self._get_init_time_idx_and_step_slice(t0_dt)
+        square = self._get_square(self._positions, x_meters_center, y_meters_center)
+        x_idxs = square.x_idx.values
+        y_idxs = square.y_idx.values
+        slices = {
+            "init_time": slice(init_time_idx, init_time_idx + 1),
+            "step": step_slice,
+            "x": slice(x_idxs[0], x_idxs[-1] + 1) if len(x_idxs) else slice(0, 0),
+            "y": slice(y_idxs[0], y_idxs[-1] + 1) if len(y_idxs) else slice(0, 0),
+        }
+        data = self.data
+        values = self._chunk_cache.get_subarray(
+            data.data, tuple(slices.get(dim, slice(None)) for dim in data.dims)
+        )
+        # Selecting from the lazy array doesn't load any data, but gets the coords right.
+        selected = data.isel(slices).copy(data=values).isel(init_time=0)
+        return self._swap_step_for_target_time(selected)
+
+    def _get_hourly_end_dt(self, end_dt: pd.Timestamp) -> pd.Timestamp:
+        """Get the last hourly target time needed for an example which ends at `end_dt`."""
+        if self.resample_to_5_minutes:
+            # Interpolating up to `end_dt` needs the hour after `end_dt`.  Always select that
+            # hour (even if `end_dt` is on the hour), so every example has the same shape.
+            return end_dt.floor("H") + nd_time.ONE_HOUR
+        return end_dt.ceil("H")
 
     def _post_process_example(self, selected_data: xr.Dataset, t0_dt: pd.Timestamp) -> xr.Dataset:
-        """Resamples to 5 minutely."""
+        """Select the hourly target times for the example.
+
+        Resampling to 5 minutely (if `resample_to_5_minutes`) is done for the whole batch at
+        once, by `_resample_batch_to_5_minutes()`.
+        """
 
         start_dt = self._get_start_dt(t0_dt)
         end_dt = self._get_end_dt(t0_dt)
+        if self.resample_to_5_minutes:
+            end_dt = self._get_hourly_end_dt(end_dt)
 
         # if t0_dt is not on the hour, e.g. 13.05.
         # Then if the history_minutes is 1 hours,
@@ -140,23 +380,172 @@ class NWPDataSource(ZarrDataSource):
 
         return selected_data
 
+    def _get_batch_dataset(
+        self,
+        t0_datetimes: pd.DatetimeIndex,
+        x_locations: Iterable[Number],
+        y_locations: Iterable[Number],
+    ) -> xr.Dataset:
+        """Get the batch, resampled to 5 minutely (if `resample_to_5_minutes`), without NaNs.
+
+        NaNs are replaced with zeros here, instead of when validating, so the batches don't
+        depend on `validation_level`.
+        """
+        batch = super()._get_batch_dataset(
+            t0_datetimes=t0_datetimes, x_locations=x_locations, y_locations=y_locations
+        )
+        if self.resample_to_5_minutes:
+            batch = self._resample_batch_to_5_minutes(batch, pd.DatetimeIndex(t0_datetimes))
+        # Replace the NaNs in place, in a single sweep through the data.
+        np.nan_to_num(batch.data.values, copy=False, nan=0, posinf=np.inf, neginf=-np.inf)
+        return batch
+
+    def _get_resampling_weights(self, start_offset_ns: int) -> tuple[np.ndarray, np.ndarray]:
+        """Get the interpolation weights for examples which start `start_offset_ns` past the hour.
+
+        Returns: The index of the hourly step before each 5-minutely time, and the weight of the
+            hourly step after it.  Both have one element per 5-minutely time.
+        """
+        if start_offset_ns not in self._resampling_weights:
+            n_times = (self.history_minutes + self.forecast_minutes) // 5 + 1
+            offsets_ns = start_offset_ns + np.arange(n_times) * nd_time.FIVE_MINUTES.value
+            hourly_idxs, remainders_ns = np.divmod(offsets_ns, nd_time.ONE_HOUR.value)
+            weights = (remainders_ns / nd_time.ONE_HOUR.value).astype(np.float32)
+            self._resampling_weights[start_offset_ns] = (hourly_idxs, weights)
+        return self._resampling_weights[start_offset_ns]
+
+    def _resample_batch_to_5_minutes(
+        self, batch: xr.Dataset, t0_datetimes: pd.DatetimeIndex
+    ) -> xr.Dataset:
+        """Linearly interpolate every example in the batch from hourly to 5 minutely, in one go.
+
+        The interpolation weights only depend on how far past the hour each example starts, so
+        they're computed once for each distinct offset.  The `init_time` of each 5-minutely
+        time is the `init_time` of the hourly step before it.
+        """
+        start_dts = self._get_start_dt(t0_datetimes)
+        start_offsets_ns = start_dts.asi8 - start_dts.floor("H").asi8
+        weights_for_each_example = [
+            self._get_resampling_weights(offset_ns) for offset_ns in start_offsets_ns
+        ]
+        hourly_idxs = np.stack([hourly_idxs for hourly_idxs, _ in weights_for_each_example])
+        weights = np.stack([weights for _, weights in weights_for_each_example])
+        next_hourly_idxs = np.minimum(hourly_idxs + 1, batch.sizes["time_index"] - 1)
+
+        # `data` has dims [example, channels_index, time_index, y_index, x_index].
+        data = batch.data.values
+        time_axis = batch.data.dims.index("time_index")
+        shape = [1] * data.ndim
+        shape[0], shape[time_axis] = hourly_idxs.shape
+        before = np.take_along_axis(data, hourly_idxs.reshape(shape), axis=time_axis)
+        after = np.take_along_axis(data, next_hourly_idxs.reshape(shape), axis=time_axis)
+        resampled = before + weights.reshape(shape) * (after - before)
+
+        n_times = hourly_idxs.shape[1]
+        five_minutes = nd_time.FIVE_MINUTES.to_timedelta64()
+        times = start_dts.values[:, np.newaxis] + np.arange(n_times) * five_minutes
+        if "time_index" not in batch.init_time.dims:
+            init_times = batch.init_time
+        else:
+            init_times = xr.DataArray(
+                np.take_along_axis(batch.init_time.values, hourly_idxs, axis=1),
+                dims=("example", "time_index"),
+            )
+        resampled_batch = batch.drop_vars(["data", "time", "init_time", "step", "time_index"])
+        resampled_batch = resampled_batch.assign(
+            data=(batch.data.dims, resampled),
+            time=(("example", "time_index"), times),
+        )
+        resampled_batch = resampled_batch.assign_coords(
+            init_time=init_times,
+            step=resampled_batch.time - init_times,
+            time_index=np.arange(n_times),
+        )
+        return resampled_batch
+
+    def get_contiguous_t0_time_periods(self) -> pd.DataFrame:
+        """Get all time periods which contain valid t0 datetimes.  See `DataSource`."""
+        contiguous_time_periods = super().get_contiguous_t0_time_periods()
+        if self.resample_to_5_minutes:
+            # Every example needs the hour after its end.  See `_get_hourly_end_dt()`.
+            contiguous_time_periods["end_dt"] -= nd_time.ONE_HOUR
+            contiguous_time_periods = contiguous_time_periods[
+                contiguous_time_periods.start_dt <= contiguous_time_periods.end_dt
+            ].reset_index(drop=True)
+        return contiguous_time_periods
+
     def datetime_index(self) -> pd.DatetimeIndex:
         """Returns a complete list of all available datetimes"""
-        if self._data is None:
-            nwp = self._open_data()
-        else:
-            nwp = self._data
+        target_time_periods = self._get_target_time_periods()
+        if target_time_periods is None:
+            return self._get_target_times()
+        return pd.DatetimeIndex(
+            np.concatenate(
+                [
+                    pd.date_range(period.start_dt, period.end_dt, freq=self.sample_period_duration)
+                    for period in target_time_periods.itertuples()
+                ]
+            )
+        )
+
+    def get_contiguous_time_periods(self) -> pd.DataFrame:
+        """Get all the time periods for which this DataSource has contiguous data.
+
+        Computed from the init times and steps, without listing every target time.
+        """
+        target_time_periods = self._get_target_time_periods()
+        if target_time_periods is None:
+            return super().get_contiguous_time_periods()
+        n_timesteps = (
+            target_time_periods.end_dt - target_time_periods.start_dt
+        ) / self.sample_period_duration + 1
+        contiguous_time_periods = target_time_periods[n_timesteps > self.total_seq_length]
+        assert len(contiguous_time_periods) > 0
+        return contiguous_time_periods.reset_index(drop=True)
+
+    def _get_init_times_and_steps(self) -> tuple[np.ndarray, np.ndarray]:
+        """Get the init times and steps, as int64 nanoseconds, without loading any NWPs."""
+        if self._init_time_ns is not None:
+            return self._init_time_ns, self._step_ns
+        nwp = self._open_data() if self._data is None else self._data
+        return pd.DatetimeIndex(nwp.init_time.values).asi8, pd.TimedeltaIndex(nwp.step.values).asi8
+
+    def _get_target_time_periods(self) -> Optional[pd.DataFrame]:
+        """Get the time periods of contiguous target times (the times the NWPs are _about_).
+
+        Each forecast covers the target times from `init_time + step[0]` to
+        `init_time + step[-1]`, so the time periods are the union of those intervals.  This
+        only holds if the steps are `sample_period_duration` apart, and every target time is
+        aligned to `sample_period_duration`.  If not, returns None.
+
+        The result is cached, because it only depends on the NWP coords.
+        """
+        if self._target_time_periods is None:
+            init_time_ns, step_ns = self._get_init_times_and_steps()
+            period_ns = self.sample_period_duration.value
+            if (
+                len(step_ns) == 0
+                or (np.diff(step_ns) != period_ns).any()
+                or ((init_time_ns + step_ns[0]) % period_ns != 0).any()
+            ):
+                _LOG.warning("The NWP steps aren't regular, so listing every target time.")
+                return None
+            self._target_time_periods = nd_time.merge_time_periods(
+                start_dts=pd.DatetimeIndex(init_time_ns + step_ns[0]),
+                end_dts=pd.DatetimeIndex(init_time_ns + step_ns[-1]),
+                max_gap_duration=self.sample_period_duration,
+            )
+        return self._target_time_periods.copy()
+
+    def _get_target_times(self) -> pd.DatetimeIndex:
+        """List every target time, from every init time plus every step."""
+        init_time_ns, step_ns = self._get_init_times_and_steps()
 
         # We need to return the `target_times` (the times the NWPs are _about_).
         # The `target_time` is the `init_time` plus the forecast horizon `step`.
-        # `step` is an array of timedeltas, so we can just add `init_time` to `step`.
-        target_times = nwp["init_time"] + nwp["step"]
-        target_times = target_times.values.flatten()
+        target_times = np.add.outer(init_time_ns, step_ns).flatten()
         target_times = np.unique(target_times)
-        target_times = np.sort(target_times)
-        target_times = pd.DatetimeIndex(target_times)
-
-        return target_times
+        return pd.DatetimeIndex(target_times)
 
     @property
     def sample_period_minutes(self) -> int:
@@ -164,20 +553,27 @@ class NWPDataSource(ZarrDataSource):
         return 60
 
 
-def open_nwp(zarr_path: str, consolidated: bool) -> xr.DataArray:
+def open_nwp(
+    zarr_path: str,
+    consolidated: bool,
+    disk_cache_path: Optional[str] = None,
+    disk_cache_max_gb: float = 100,
+) -> xr.DataArray:
     """
     Open The NWP data
 
     Args:
         zarr_path: zarr_path must start with 'gs://' if it's on GCP.
         consolidated: Is the Zarr metadata consolidated?
+        disk_cache_path: If set, then cache the Zarr chunks in this local directory.
+        disk_cache_max_gb: The maximum size of the disk cache, in gigabytes.
 
     Returns: NWP data.
     """
     _LOG.debug("Opening NWP data: %s", zarr_path)
     utils.set_fsspec_for_multiprocess()
     nwp = xr.open_dataset(
-        zarr_path,
+        get_zarr_store(zarr_path, disk_cache_path, disk_cache_max_gb),
         engine="zarr",
         consolidated=consolidated,
         mode="r",
@@ -202,27 +598,9 @@ def open_nwp(zarr_path: str, consolidated: bool) -> xr.DataArray:
         ukv = ukv.reindex(y=y_reversed)
 
     # Sanity checks.
-    # If there are any duplicated init_times then drop the duplicated init_times:
+    # Sort the init_times, and drop any duplicated init_times:
+    ukv = utils.sort_and_drop_duplicates(ukv, dim="init_time", name="NWP Zarr")
     init_time = pd.DatetimeIndex(ukv["init_time"])
-    if not init_time.is_unique:
-        n_duplicates = init_time.duplicated().sum()
-        _LOG.warning(f"NWP Zarr has {n_duplicates:,d} duplicated init_times.  Fixing...")
-        ukv = ukv.drop_duplicates(dim="init_time")
-        init_time = pd.DatetimeIndex(ukv["init_time"])
-
-    # If any init_times are not monotonic_increasing then drop the out-of-order init_times:
-    if not init_time.is_monotonic_increasing:
-        total_n_out_of_order_times = 0
-        _LOG.warning("NWP Zarr init_time is not monotonic_increasing.  Fixing...")
-        while not init_time.is_monotonic_increasing:
-            diff = np.diff(init_time.view(int))
-            out_of_order = np.where(diff < 0)[0]
-            total_n_out_of_order_times += len(out_of_order)
-            out_of_order = init_time[out_of_order]
-            ukv = ukv.drop_sel(init_time=out_of_order)
-            init_time = pd.DatetimeIndex(ukv["init_time"])
-        _LOG.info(f"Fixed {total_n_out_of_order_times:,d} out of order init_times.")
-
     assert init_time.is_unique
     assert init_time.is_monotonic_increasing
 
@@ -19,10 +19,11 @@ class NWP(DataSourceOutput):
 
     @classmethod
     def model_validation(cls, v):
-        """Check that all values are not NaNs"""
+        """Check that all values are not NaNs and not infinite.
 
-        # TODO issue 481, change back to 'check_nan_and_inf'
-        v.__setitem__("data", v.check_nan_and_fill_warning(data=v.data))
+        NaNs are replaced by zeros in `NWPDataSource`, whether or not the batch is validated.
+        """
+        v.check_data_var(data=v.data)
 
         v.check_data_var_dim(
             v.data, ("example", "time_index", "x_index", "y_index", "channels_index")
@@ -0,0 +1,127 @@
+""" A compact store of the NWP forecasts around a fixed set of locations.
+
+Each NWP example is a small crop (by default 2 x 2 pixels), but reading it from the UKV Zarr
+reads whole (352 x 274 pixel) chunks.  When the examples are centred on known sites (the GSP
+centroids and the PV systems), `write_nwp_point_store()` reads the UKV Zarr once, and saves just
+the crop around each site, with dims `[variable, init_time, step, location, y_pixel, x_pixel]`.
+`NWPDataSource` then reads examples centred on those sites from the point store.
+"""
+import logging
+from numbers import Number
+from pathlib import Path
+from typing import Iterable, Union
+
+import numpy as np
+import xarray as xr
+
+from nowcasting_dataset.data_sources.data_source import ZarrDataSource
+from nowcasting_dataset.filesystem.disk_cache import get_zarr_store
+
+_LOG = logging.getLogger(__name__)
+
+
+def extract_nwp_at_locations(
+    data_source: ZarrDataSource, x_locations: Iterable[Number], y_locations: Iterable[Number]
+) -> xr.DataArray:
+    """Lazily select the crop which `data_source` would use for an example at each location.
+
+    Locations whose crop would run off the edge of the NWP data are left out, because
+    `data_source` can't make examples there.
+
+    Args:
+        data_source: An opened NWPDataSource.  Its `image_size_pixels` and `meters_per_pixel`
+            define the crop.
+        x_locations: The x coordinate of each location, in OSGB.
+        y_locations: The y coordinate of each location, in OSGB.
+
+    Returns: DataArray with dims `[variable, init_time, step, location, y_pixel, x_pixel]`.
+        The `location_x` and `location_y` coords hold the centre of each location, and the
+        `x` and `y` coords hold the coords of each pixel.
+    """
+    data = data_source.data
+    size_pixels = data_source._square.size_pixels
+
+    # Use `_get_square()` to find the positions of the pixels in each crop, so the crops are
+    # exactly the same as the crops of examples read from `data`.
+    positions = xr.Dataset(
+        {"x_idx": ("x", np.arange(len(data.x))), "y_idx": ("y", np.arange(len(data.y)))},
+        coords={"x": data.x, "y": data.y},
+    )
+    location_xs, location_ys, x_idxs, y_idxs = [], [], [], []
+    for x, y in zip(x_locations, y_locations):
+        square = data_source._get_square(positions, x, y)
+        if square.sizes["x"] != size_pixels or square.sizes["y"] != size_pixels:
+            _LOG.warning(f"Leaving out x={x}, y={y}, because it's too close to the NWP edge")
+            continue
+        location_xs.append(x)
+        location_ys.append(y)
+        x_idxs.append(square.x_idx.values)
+        y_idxs.append(square.y_idx.values)
+
+    selected = data.isel(
+        x=xr.DataArray(np.array(x_idxs), dims=["location", "x_pixel"]),
+        y=xr.DataArray(np.array(y_idxs), dims=["location", "y_pixel"]),
+    )
+    selected = selected.transpose(..., "location", "y_pixel", "x_pixel")
+    return selected.assign_coords(
+        location_x=("location", np.array(location_xs, dtype=np.float64)),
+        location_y=("location", np.array(location_ys, dtype=np.float64)),
+    )
+
+
+def write_nwp_point_store(
+    data_source: ZarrDataSource,
+    x_locations: Iterable[Number],
+    y_locations: Iterable[Number],
+    output_path: Union[str, Path],
+    init_times_per_chunk: int = 1,
+    locations_per_chunk: int = 64,
+) -> None:
+    """Extract the NWP crops around each location, and write them to a new Zarr store.
+
+    Reads `init_times_per_chunk` init times of the UKV Zarr at a time, so the memory used
+    doesn't depend on the length of the NWP archive.  Duplicated locations are only saved once.
+
+    Args:
+        data_source: An opened NWPDataSource.  See `extract_nwp_at_locations()`.
+        x_locations: The x coordinate of each location, in OSGB.
+        y_locations: The y coordinate of each location, in OSGB.
+        output_path: The path of the new Zarr store.  Can be any fsspec URL.
+        init_times_per_chunk: The number of init times in each Zarr chunk.
+        locations_per_chunk: The number of locations in each Zarr chunk.
+    """
+    locations = np.unique(np.stack([x_locations, y_locations], axis=1), axis=0)
+    _LOG.info(f"Extracting the NWP forecasts at {len(locations)} locations to {output_path}")
+    point_data = extract_nwp_at_locations(data_source, locations[:, 0], locations[:, 1])
+    point_data = point_data.to_dataset(name="UKV")
+    chunks = dict(point_data.UKV.sizes)
+    chunks["init_time"] = init_times_per_chunk
+    chunks["location"] = min(locations_per_chunk, len(locations))
+    encoding = {"UKV": {"chunks": list(chunks.values())}}
+
+    n_init_times = len(point_data.init_time)
+    for start_idx in range(0, n_init_times, init_times_per_chunk):
+        _LOG.debug(f"Writing init times {start_idx} to {start_idx + init_times_per_chunk}")
+        chunk = point_data.isel(init_time=slice(start_idx, start_idx + init_times_per_chunk))
+        chunk = chunk.load()
+        if start_idx == 0:
+            chunk.to_zarr(str(output_path), mode="w", encoding=encoding, consolidated=True)
+        else:
+            chunk.to_zarr(str(output_path), append_dim="init_time", consolidated=True)
+
+
+def open_nwp_point_store(
+    zarr_path: Union[str, Path],
+    disk_cache_path: Union[str, Path, None] = None,
+    disk_cache_max_gb: float = 100,
+) -> xr.DataArray:
+    """Lazily open a point store written by `write_nwp_point_store()`."""
+    _LOG.debug(f"Opening NWP point store: {zarr_path}")
+    point_data = xr.open_dataset(
+        get_zarr_store(zarr_path, disk_cache_path, disk_cache_max_gb),
+        engine="zarr",
+        consolidated=True,
+        mode="r",
+        chunks={},
+    )
+    return point_data["UKV"]
@@ -1,13 +1,12 @@
 """ PV Data Source """
 
 import datetime
-import functools
 import io
 import logging
 from dataclasses import dataclass
 from numbers import Number
 from pathlib import Path
-from typing import List, Optional, Tuple, Union
+from typing import Iterable, List, Optional, Tuple, Union
 
 import fsspec
 import numpy as np
@@ -15,10 +14,12 @@ import pandas as pd
 import xarray as xr
 
 import nowcasting_dataset.filesystem.utils as nd_fs_utils
+import nowcasting_dataset.utils as nd_utils
 from nowcasting_dataset import geospatial
 from nowcasting_dataset.consts import DEFAULT_N_PV_SYSTEMS_PER_EXAMPLE
 from nowcasting_dataset.data_sources.data_source import ImageDataSource
 from nowcasting_dataset.data_sources.pv.pv_model import PV
+from nowcasting_dataset.dataset.xr_utils import make_batch_dataset
 from nowcasting_dataset.square import get_bounding_box_mask
 
 logger = logging.getLogger(__name__)
@@ -211,6 +212,31 @@ class PVDataSource(ImageDataSource):
 
         return pv_system_ids
 
+    def _get_pv_system_ids_for_example(
+        self,
+        x_meters_center: Number,
+        y_meters_center: Number,
+        pv_system_ids_with_data_for_timeslice: pd.Int64Index,
+    ) -> pd.Int64Index:
+        """Get the IDs of (at most `n_pv_systems_per_example`) PV systems for one example.
+
+        The central PV system (if `get_center`) is always first.
+        """
+        all_pv_system_ids = self._get_all_pv_system_ids_in_roi(
+            x_meters_center, y_meters_center, pv_system_ids_with_data_for_timeslice
+        )
+        if self.get_center:
+            central_pv_system_id = self._get_central_pv_system_id(
+                x_meters_center, y_meters_center, pv_system_ids_with_data_for_timeslice
+            )
+
+            # By convention, the 'target' PV system ID (the one in the center
+            # of the image) must be in the first position of the returned arrays.
+            all_pv_system_ids = all_pv_system_ids.drop(central_pv_system_id)
+            all_pv_system_ids = all_pv_system_ids.insert(loc=0, item=central_pv_system_id)
+
+        return all_pv_system_ids[: self.n_pv_systems_per_example]
+
     def get_example(
         self, t0_dt: pd.Timestamp, x_meters_center: Number, y_meters_center: Number
     ) -> xr.Dataset:
@@ -229,20 +255,9 @@ class PVDataSource(ImageDataSource):
         logger.debug("Getting PV example data")
 
         selected_pv_power, selected_pv_capacity = self._get_time_slice(t0_dt)
-        all_pv_system_ids = self._get_all_pv_system_ids_in_roi(
+        all_pv_system_ids = self._get_pv_system_ids_for_example(
             x_meters_center, y_meters_center, selected_pv_power.columns
         )
-        if self.get_center:
-            central_pv_system_id = self._get_central_pv_system_id(
-                x_meters_center, y_meters_center, selected_pv_power.columns
-            )
-
-            # By convention, the 'target' PV system ID (the one in the center
-            # of the image) must be in the first position of the returned arrays.
-            all_pv_system_ids = all_pv_system_ids.drop(central_pv_system_id)
-            all_pv_system_ids = all_pv_system_ids.insert(loc=0, item=central_pv_system_id)
-
-        all_pv_system_ids = all_pv_system_ids[: self.n_pv_systems_per_example]
 
         selected_pv_power = selected_pv_power[all_pv_system_ids]
         selected_pv_capacity = selected_pv_capacity[all_pv_system_ids]
@@ -299,35 +314,104 @@ class PVDataSource(ImageDataSource):
 
         return pv
 
-    def get_locations(self, t0_datetimes: pd.DatetimeIndex) -> Tuple[List[Number], List[Number]]:
+    def _get_batch_dataset(
+        self,
+        t0_datetimes: pd.DatetimeIndex,
+        x_locations: Iterable[Number],
+        y_locations: Iterable[Number],
+    ) -> xr.Dataset:
+        """Get all the examples at once, filling NumPy arrays instead of making an xr.Dataset
+        for each example.  Gives the same result as calling `get_example()` for each example."""
+        row_idxs = nd_utils.get_row_idxs_of_windows(
+            self.pv_power.index,
+            start_dts=self._get_start_dt(t0_datetimes),
+            end_dts=self._get_end_dt(t0_datetimes),
+        )
+        if row_idxs is None:
+            # Not all examples have the same number of timesteps.
+            return super()._get_batch_dataset(
+                t0_datetimes=t0_datetimes, x_locations=x_locations, y_locations=y_locations
+            )
+
+        n_examples, n_timesteps = row_idxs.shape
+        n_pv_systems = self.n_pv_systems_per_example
+        power_mw = np.zeros(
+            (n_examples, n_timesteps, n_pv_systems), dtype=self.pv_power.values.dtype
+        )
+        capacity_mwp = np.zeros((n_examples, n_pv_systems), dtype=self.pv_capacity.values.dtype)
+        x_coords = np.zeros((n_examples, n_pv_systems))
+        y_coords = np.zeros((n_examples, n_pv_systems))
+        pv_system_row_number = np.zeros((n_examples, n_pv_systems), dtype=int)
+        # `get_example()` pads the IDs with NaNs, so the IDs are always floats.
+        pv_system_ids = np.full((n_examples, n_pv_systems), np.NaN)
+
+        for example_i, (x_meters_center, y_meters_center) in enumerate(
+            zip(x_locations, y_locations)
+        ):
+            power_for_example = self.pv_power.values[row_idxs[example_i]]
+
+            # Only use PV systems without any NaNs or negative values, like `_get_time_slice()`.
+            has_data = ~np.isnan(power_for_example).any(axis=0)
+            has_data &= (power_for_example >= 0).all(axis=0)
+            all_pv_system_ids = self._get_pv_system_ids_for_example(
+                x_meters_center, y_meters_center, self.pv_power.columns[has_data]
+            )
+
+            n = len(all_pv_system_ids)
+            col_idxs = self.pv_power.columns.get_indexer(all_pv_system_ids)
+            power_mw[example_i, :, :n] = power_for_example[:, col_idxs]
+            capacity_mwp[example_i, :n] = self.pv_capacity.values[col_idxs]
+            x_coords[example_i, :n] = self.pv_metadata.location_x[all_pv_system_ids].values
+            y_coords[example_i, :n] = self.pv_metadata.location_y[all_pv_system_ids].values
+            pv_system_row_number[example_i, :n] = np.flatnonzero(
+                self.pv_metadata.index.isin(all_pv_system_ids)
+            )
+            pv_system_ids[example_i, :n] = all_pv_system_ids.values
+
+        return make_batch_dataset(
+            {
+                "power_mw": (("example", "time", "id"), power_mw),
+                "capacity_mwp": (("example", "id"), capacity_mwp),
+                "x_coords": (("example", "id"), x_coords),
+                "y_coords": (("example", "id"), y_coords),
+                "pv_system_row_number": (("example", "id"), pv_system_row_number),
+                "time": (("example", "time"), self.pv_power.index.values[row_idxs]),
+                "id": (("example", "id"), pv_system_ids),
+            }
+        )
+
+    def get_locations(
+        self, t0_datetimes: pd.DatetimeIndex, rng: Optional[np.random.Generator] = None
+    ) -> Tuple[List[Number], List[Number]]:
         """Find a valid geographical location for each t0_datetime.
 
+        Args:
+            t0_datetimes: list of available t0 datetimes.
+            rng: The random number generator to use.  Defaults to `self.rng`.
+
         Returns:  x_locations, y_locations. Each has one entry per t0_datetime.
             Locations are in OSGB coordinates.
         """
-        # Set this up as a separate function, so we can cache the result!
-        @functools.cache  # functools.cache requires Python >= 3.9
-        def _get_pv_system_ids(t0_datetime: pd.Timestamp) -> pd.Int64Index:
-            start_dt = self._get_start_dt(t0_datetime)
-            end_dt = self._get_end_dt(t0_datetime)
-            available_pv_data = self.pv_power.loc[start_dt:end_dt]
-            columns_mask = available_pv_data.notna().all().values
-            pv_system_ids = available_pv_data.columns[columns_mask]
-            assert len(pv_system_ids) > 0
-            return pv_system_ids
+        if rng is None:
+            rng = self.rng
+
+        # For each t0_datetime, find the PV systems with no NaNs between start_dt and end_dt.
+        t0_datetimes = pd.DatetimeIndex(t0_datetimes)
+        pv_system_mask = nd_utils.get_columns_without_nans_in_windows(
+            df=self.pv_power,
+            start_dts=self._get_start_dt(t0_datetimes),
+            end_dts=self._get_end_dt(t0_datetimes),
+        )
 
         # Pick a random PV system for each t0_datetime, and then grab
         # their geographical location.
-        x_locations = []
-        y_locations = []
-        for t0_datetime in t0_datetimes:
-            pv_system_ids = _get_pv_system_ids(t0_datetime)
-            pv_system_id = self.rng.choice(pv_system_ids)
-
-            # Get metadata for PV system
-            metadata_for_pv_system = self.pv_metadata.loc[pv_system_id]
-            x_locations.append(metadata_for_pv_system.location_x)
-            y_locations.append(metadata_for_pv_system.location_y)
+        pv_system_column_idxs = nd_utils.choose_random_true_element_in_each_row(
+            pv_system_mask, rng=rng
+        )
+        pv_system_ids = self.pv_power.columns[pv_system_column_idxs]
+        metadata_for_pv_systems = self.pv_metadata.loc[pv_system_ids]
+        x_locations = list(metadata_for_pv_systems.location_x)
+        y_locations = list(metadata_for_pv_systems.location_y)
 
         return x_locations, y_locations
 
@@ -23,8 +23,7 @@ class PV(DataSourceOutput):
     @classmethod
     def model_validation(cls, v):
         """Check that all values are non NaNs"""
-        v.check_nan_and_inf(data=v.power_mw)
-        v.check_dataset_greater_than_or_equal_to(data=v.power_mw, min_value=0)
+        v.check_data_var(data=v.power_mw, min_value=0)
 
         v.check_data_var_dim(v.power_mw, ("example", "time_index", "id_index"))
         v.check_data_var_dim(v.capacity_mwp, ("example", "id_index"))
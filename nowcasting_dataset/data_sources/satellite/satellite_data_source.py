@@ -9,21 +9,43 @@ import numpy as np
 import pandas as pd
 import xarray as xr
 
+import nowcasting_dataset.filesystem.utils as nd_fs_utils
 import nowcasting_dataset.time as nd_time
+import nowcasting_dataset.utils as nd_utils
 from nowcasting_dataset.consts import SAT_VARIABLE_NAMES
+from nowcasting_dataset.data_sources.chunk_cache import LRUChunkCache
 from nowcasting_dataset.data_sources.data_source import ZarrDataSource
+from nowcasting_dataset.data_sources.satellite.satellite_index import (
+    load_or_build_satellite_index,
+    open_data_array_from_index,
+)
 from nowcasting_dataset.data_sources.satellite.satellite_model import Satellite
+from nowcasting_dataset.filesystem.disk_cache import get_zarr_store
 
 _LOG = logging.getLogger("nowcasting_dataset")
 
 
 @dataclass
 class SatelliteDataSource(ZarrDataSource):
-    """Satellite Data Source."""
+    """Satellite Data Source.
+
+    Attributes:
+      max_chunks_in_cache: If positive, then each example is assembled from a least-recently-used
+        cache of up to this many decompressed chunks, so chunks shared by consecutive examples
+        are only decompressed once.  If 0 then each example is loaded lazily using dask.
+      index_path: If set, then open `zarr_path` using the persistent index at this path, instead
+        of reading the metadata of every store.  See `open_sat_data()`.
+      daylight_mask_cache_path: If set, then `datetime_index()` saves the daylight mask in this
+        directory, keyed by the time coords and the geospatial border, and loads it from there
+        next time.
+    """
 
     channels: Optional[Iterable[str]] = SAT_VARIABLE_NAMES[1:]
     image_size_pixels: InitVar[int] = 128
     meters_per_pixel: InitVar[int] = 2_000
+    max_chunks_in_cache: int = 0
+    index_path: Optional[str] = None
+    daylight_mask_cache_path: Optional[str] = None
 
     def __post_init__(self, image_size_pixels: int, meters_per_pixel: int):
         """Post Init"""
@@ -35,6 +57,36 @@ class SatelliteDataSource(ZarrDataSource):
             image_size_pixels,
             n_channels,
         )
+        # The coords of `self._data`, cached as NumPy arrays by `open()`, so each example can be
+        # selected by integer position without looking up the (lazy) coords of `self._data`.
+        self._time_ns = None  # int64 nanoseconds since the Unix epoch.
+        self._x_coords = None
+        self._y_coords = None
+        self._chunk_cache = None  # Created by `open()`, so each worker process has its own cache.
+        # The array which `self._chunk_cache` loads chunks from, and the positions of
+        # `self.channels` in its `channels` dim (or None if it only holds `self.channels`).
+        # Replaced by `share_reads_with()`.
+        self._data_for_chunk_cache = None
+        self._channel_idxs_for_chunk_cache = None
+        # True once `update_index()` has checked the index at `self.index_path`.
+        self._index_is_up_to_date = False
+
+    def update_index(self) -> None:
+        """Build (or rebuild, if the stores have changed) the index at `self.index_path`.
+
+        Call this once in the main process, before copying this DataSource into the worker
+        processes.  The workers then load the index without checking every store.
+        """
+        if self.index_path is None:
+            return
+        load_or_build_satellite_index(
+            self.index_path,
+            zarr_path=self.zarr_path,
+            consolidated=self.consolidated,
+            data_var_name="stacked_eumetsat_data",
+            preprocess=remove_acq_time_from_dataset_and_fix_time_coords,
+        )
+        self._index_is_up_to_date = True
 
     def open(self) -> None:
         """
@@ -49,9 +101,60 @@ class SatelliteDataSource(ZarrDataSource):
         self._data = self._data.sel(variable=list(self.channels))
         if "variable" in self._data.dims:
             self._data = self._data.rename({"variable": "channels"})
+        self._cache_coords()
+        if self.max_chunks_in_cache > 0:
+            self._chunk_cache = LRUChunkCache(max_chunks=self.max_chunks_in_cache)
+            self._data_for_chunk_cache = self._data
+            self._channel_idxs_for_chunk_cache = None
+
+    def share_reads_with(self, other: "SatelliteDataSource") -> None:
+        """Load the data for `self` and `other` from a single read of their Zarr store.
+
+        Both DataSources then load chunks containing the channels of both DataSources through
+        the chunk cache of `self`, and select their own channels after decompression.  So, if
+        both DataSources get the same batch one after the other (see the `other_outputs`
+        argument of `create_batches()`), then each chunk is only read and decompressed once.
+
+        Both DataSources must already be open, and must read the same Zarr store.  `self`
+        must have a chunk cache (see `max_chunks_in_cache`) big enough to hold the chunks for
+        one batch.
+        """
+        if self.zarr_path != other.zarr_path:
+            raise ValueError(
+                "Only DataSources which read the same Zarr store can share reads, but"
+                f" {self.zarr_path} != {other.zarr_path}"
+            )
+        if self._chunk_cache is None:
+            raise ValueError("DataSources can only share reads through a chunk cache.")
+
+        channels = list(dict.fromkeys([*self.channels, *other.channels]))
+        # Select the channels from a fresh copy of the lazy data, so both DataSources use the
+        # same dask array, and hence the same cached chunks.
+        data = self._open_data().sel(variable=channels)
+        if "variable" in data.dims:
+            data = data.rename({"variable": "channels"})
+        for data_source in (self, other):
+            data_source._chunk_cache = self._chunk_cache
+            data_source._data_for_chunk_cache = data
+            data_source._channel_idxs_for_chunk_cache = [
+                channels.index(channel) for channel in data_source.channels
+            ]
+
+    def _cache_coords(self) -> None:
+        """Cache the time, x and y coords of `self._data` as NumPy arrays."""
+        self._time_ns = pd.DatetimeIndex(self._data.time.values).asi8
+        self._x_coords = self._data.x.values
+        self._y_coords = self._data.y.values
 
     def _open_data(self) -> xr.DataArray:
-        return open_sat_data(zarr_path=self.zarr_path, consolidated=self.consolidated)
+        return open_sat_data(
+            zarr_path=self.zarr_path,
+            consolidated=self.consolidated,
+            disk_cache_path=self.disk_cache_path,
+            disk_cache_max_gb=self.disk_cache_max_gb,
+            index_path=self.index_path,
+            check_index=not self._index_is_up_to_date,
+        )
 
     @staticmethod
     def get_data_model_for_batch():
@@ -61,7 +164,13 @@ class SatelliteDataSource(ZarrDataSource):
     def _get_time_slice(self, t0_dt: pd.Timestamp) -> xr.DataArray:
         start_dt = self._get_start_dt(t0_dt)
         end_dt = self._get_end_dt(t0_dt)
-        data = self.data.sel(time=slice(start_dt, end_dt))
+        if self._time_ns is None:
+            data = self.data.sel(time=slice(start_dt, end_dt))
+        else:
+            # Equivalent to `sel(time=slice(start_dt, end_dt))`, but without the pandas index
+            # lookups, because `searchsorted` on the cached int64 times is much cheaper.
+            start_idx, end_idx = get_start_and_end_idx(self._time_ns, start_dt, end_dt)
+            data = self.data.isel(time=slice(start_idx, end_idx))
         assert type(data) == xr.DataArray
 
         return data
@@ -86,10 +195,25 @@ class SatelliteDataSource(ZarrDataSource):
         Returns:
             The selected data around the center
         """
-        x_index = (
-            np.searchsorted(data_array.x.values, x_center_osgb) - 1
-        )  # To have the center fall within the pixel
-        y_index = np.searchsorted(data_array.y.values, y_center_osgb) - 1
+        # Slicing `self.data` in time doesn't change x and y, so use the cached coords if we can,
+        # instead of reading the coords of the lazy `data_array`.
+        x_coords = data_array.x.values if self._x_coords is None else self._x_coords
+        y_coords = data_array.y.values if self._y_coords is None else self._y_coords
+        x_slice, y_slice = self._get_spatial_slices(
+            x_coords, y_coords, x_center_osgb=x_center_osgb, y_center_osgb=y_center_osgb
+        )
+        return data_array.isel(x=x_slice, y=y_slice)
+
+    def _get_spatial_slices(
+        self,
+        x_coords: np.ndarray,
+        y_coords: np.ndarray,
+        x_center_osgb: Number,
+        y_center_osgb: Number,
+    ) -> tuple[slice, slice]:
+        """Get the integer x and y slices of the square around the center."""
+        x_index = np.searchsorted(x_coords, x_center_osgb) - 1  # So the center is in the pixel.
+        y_index = np.searchsorted(y_coords, y_center_osgb) - 1
         min_y = y_index - (self._square.size_pixels // 2)
         min_x = x_index - (self._square.size_pixels // 2)
         assert min_y >= 0, (
@@ -100,11 +224,37 @@ class SatelliteDataSource(ZarrDataSource):
             f"X location must be at least {(self._square.size_pixels // 2)}"
             f" pixels from the edge of the area, but is {x_index} for x center of {x_center_osgb}"
         )
-        data_array = data_array.isel(
-            x=slice(min_x, min_x + self._square.size_pixels),
-            y=slice(min_y, min_y + self._square.size_pixels),
+        return (
+            slice(min_x, min_x + self._square.size_pixels),
+            slice(min_y, min_y + self._square.size_pixels),
+        )
+
+    def _get_example_from_chunk_cache(
+        self, t0_dt: pd.Timestamp, x_center_osgb: Number, y_center_osgb: Number
+    ) -> xr.DataArray:
+        """Select the same data as `_get_time_slice()` and then `get_spatial_region_of_interest()`
+        but assemble the values from `self._chunk_cache`."""
+        start_idx, end_idx = get_start_and_end_idx(
+            self._time_ns, self._get_start_dt(t0_dt), self._get_end_dt(t0_dt)
+        )
+        x_slice, y_slice = self._get_spatial_slices(
+            self._x_coords, self._y_coords, x_center_osgb=x_center_osgb, y_center_osgb=y_center_osgb
+        )
+        return self._load_from_chunk_cache(
+            {"time": slice(start_idx, end_idx), "x": x_slice, "y": y_slice}
+        )
+
+    def _load_from_chunk_cache(self, slices: dict[str, slice]) -> xr.DataArray:
+        """Load `self.data.isel(slices)` into memory, from `self._chunk_cache`."""
+        data = self._data_for_chunk_cache
+        values = self._chunk_cache.get_subarray(
+            data.data, tuple(slices.get(dim, slice(None)) for dim in data.dims)
         )
-        return data_array
+        if self._channel_idxs_for_chunk_cache is not None:
+            channels_axis = data.dims.index("channels")
+            values = values.take(self._channel_idxs_for_chunk_cache, axis=channels_axis)
+        # Selecting from the lazy array doesn't load any data, but gets the coords right.
+        return self.data.isel(slices).copy(data=values)
 
     def get_example(
         self, t0_dt: pd.Timestamp, x_meters_center: Number, y_meters_center: Number
@@ -121,30 +271,60 @@ class SatelliteDataSource(ZarrDataSource):
         Returns: Example Data
 
         """
-        selected_data = self._get_time_slice(t0_dt)
-        selected_data = self.get_spatial_region_of_interest(
-            data_array=selected_data,
-            x_center_osgb=x_meters_center,
-            y_center_osgb=y_meters_center,
-        )
+        if self._chunk_cache is None:
+            selected_data = self._get_time_slice(t0_dt)
+            selected_data = self.get_spatial_region_of_interest(
+                data_array=selected_data,
+                x_center_osgb=x_meters_center,
+                y_center_osgb=y_meters_center,
+            )
+        else:
+            selected_data = self._get_example_from_chunk_cache(
+                t0_dt, x_center_osgb=x_meters_center, y_center_osgb=y_meters_center
+            )
 
         if "variable" in list(selected_data.dims):
             selected_data = selected_data.rename({"variable": "channels"})
 
-        selected_data = self._post_process_example(selected_data, t0_dt)
-
-        if selected_data.shape != self._shape_of_example:
-            raise RuntimeError(
-                "Example is wrong shape! "
-                f"x_meters_center={x_meters_center}\n"
-                f"y_meters_center={y_meters_center}\n"
-                f"t0_dt={t0_dt}\n"
-                f"times are {selected_data.time}\n"
-                f"expected shape={self._shape_of_example}\n"
-                f"actual shape {selected_data.shape}"
+        return self._finish_example(selected_data, t0_dt, x_meters_center, y_meters_center)
+
+    def _get_examples_sharing_t0(
+        self, t0_dt: pd.Timestamp, x_locations: np.ndarray, y_locations: np.ndarray
+    ) -> list[xr.Dataset]:
+        """Get the examples for one t0, loading the time window from disk only once.
+
+        Loads the smallest region which contains every example, and then crops each example
+        from that region in memory.
+        """
+        selected_data = self._get_time_slice(t0_dt)
+        x_coords = selected_data.x.values if self._x_coords is None else self._x_coords
+        y_coords = selected_data.y.values if self._y_coords is None else self._y_coords
+        slices = [
+            self._get_spatial_slices(x_coords, y_coords, x_center_osgb=x, y_center_osgb=y)
+            for x, y in zip(x_locations, y_locations)
+        ]
+        x_start = min(x_slice.start for x_slice, _ in slices)
+        y_start = min(y_slice.start for _, y_slice in slices)
+        x_slice_for_all = slice(x_start, max(x_slice.stop for x_slice, _ in slices))
+        y_slice_for_all = slice(y_start, max(y_slice.stop for _, y_slice in slices))
+        if self._chunk_cache is None:
+            selected_data = selected_data.isel(x=x_slice_for_all, y=y_slice_for_all).load()
+        else:
+            start_idx, end_idx = get_start_and_end_idx(
+                self._time_ns, self._get_start_dt(t0_dt), self._get_end_dt(t0_dt)
+            )
+            selected_data = self._load_from_chunk_cache(
+                {"time": slice(start_idx, end_idx), "x": x_slice_for_all, "y": y_slice_for_all}
             )
 
-        return selected_data.load().to_dataset(name="data")
+        examples = []
+        for (x_slice, y_slice), x, y in zip(slices, x_locations, y_locations):
+            example = selected_data.isel(
+                x=slice(x_slice.start - x_start, x_slice.stop - x_start),
+                y=slice(y_slice.start - y_start, y_slice.stop - y_start),
+            )
+            examples.append(self._finish_example(example, t0_dt, x, y))
+        return examples
 
     def datetime_index(self, remove_night: bool = True) -> pd.DatetimeIndex:
         """Returns a complete list of all available datetimes
@@ -173,7 +353,8 @@ class SatelliteDataSource(ZarrDataSource):
                 irradiance (GHI) for the four corners of the satellite imagery,
                 and for all the timesteps in the dataset.  We only use timesteps
                 where the maximum global horizontal irradiance across all four
-                corners is above some threshold.
+                corners is above some threshold.  If `daylight_mask_cache_path`
+                is set then the result is cached on disk.
 
                 The 'clearsky solar irradiance' is the amount of sunlight we'd
                 expect on a clear day at a specific time and location. The SI unit
@@ -197,9 +378,11 @@ class SatelliteDataSource(ZarrDataSource):
         datetime_index = pd.DatetimeIndex(sat_data.time.values)
 
         if remove_night:
-            border_locations = self.geospatial_border()
+            border_locations = self._get_geospatial_border(sat_data)
             datetime_index = nd_time.select_daylight_datetimes(
-                datetimes=datetime_index, locations=border_locations
+                datetimes=datetime_index,
+                locations=border_locations,
+                cache_path=self.daylight_mask_cache_path,
             )
 
         return datetime_index
@@ -213,6 +396,25 @@ class HRVSatelliteDataSource(SatelliteDataSource):
     meters_per_pixel: InitVar[int] = 2_000
 
 
+def get_start_and_end_idx(
+    time_ns: np.ndarray, start_dt: pd.Timestamp, end_dt: pd.Timestamp
+) -> tuple[int, int]:
+    """Get the integer positions of the times in [start_dt, end_dt].
+
+    Args:
+        time_ns: Sorted times, as int64 nanoseconds since the Unix epoch.
+        start_dt: The first datetime to select (inclusive).
+        end_dt: The last datetime to select (inclusive).
+
+    Returns:
+        start_idx, end_idx such that `time_ns[start_idx:end_idx]` are the times in
+        [start_dt, end_dt].
+    """
+    start_idx = np.searchsorted(time_ns, pd.Timestamp(start_dt).value, side="left")
+    end_idx = np.searchsorted(time_ns, pd.Timestamp(end_dt).value, side="right")
+    return int(start_idx), int(end_idx)
+
+
 def remove_acq_time_from_dataset_and_fix_time_coords(dataset: xr.Dataset) -> xr.Dataset:
     """
     Preprocess datasets by dropping `acq_time`, which causes problems otherwise
@@ -221,46 +423,41 @@ def remove_acq_time_from_dataset_and_fix_time_coords(dataset: xr.Dataset) -> xr.
         dataset: xr.Dataset to preprocess
 
     Returns:
-        dataset with acq_time dropped
+        dataset with acq_time dropped, and with the times sorted and de-duplicated
     """
     dataset = dataset.drop_vars("acq_time", errors="ignore")
 
-    # If there are any duplicated init_times then drop the duplicated init_times:
-    data_array = dataset["stacked_eumetsat_data"]
-    times = pd.DatetimeIndex(data_array["time"])
-    if not times.is_unique:
-        n_duplicates = times.duplicated().sum()
-        _LOG.warning(f"Satellite Zarr has {n_duplicates:,d} duplicated times.  Fixing...")
-        data_array = data_array.drop_duplicates(dim="time")
-        times = pd.DatetimeIndex(data_array["time"])
-        dataset = data_array.to_dataset(name="stacked_eumetsat_data")
-
-    # If any init_times are not monotonic_increasing then drop the out-of-order init_times:
-    if not times.is_monotonic_increasing:
-        total_n_out_of_order_times = 0
-        _LOG.warning("Satellite Zarr times is not monotonic_increasing.  Fixing...")
-        while not times.is_monotonic_increasing:
-            diff = np.diff(times.view(int))
-            out_of_order = np.where(diff < 0)[0]
-            total_n_out_of_order_times += len(out_of_order)
-            out_of_order = times[out_of_order]
-            data_array = data_array.drop_sel(time=out_of_order)
-            times = pd.DatetimeIndex(data_array["init_time"])
-        _LOG.info(f"Fixed {total_n_out_of_order_times:,d} out of order init_times.")
-        dataset = data_array.to_dataset(name="stacked_eumetsat_data")
-
-    return dataset
-
-
-def open_sat_data(zarr_path: str, consolidated: bool) -> xr.DataArray:
+    # Sort the times, and drop any duplicated times:
+    return nd_utils.sort_and_drop_duplicates(dataset, dim="time", name="Satellite Zarr")
+
+
+def open_sat_data(
+    zarr_path: str,
+    consolidated: bool,
+    disk_cache_path: Optional[str] = None,
+    disk_cache_max_gb: float = 100,
+    index_path: Optional[str] = None,
+    check_index: bool = True,
+) -> xr.DataArray:
     """Lazily opens the Zarr store.
 
     Adds 1 minute to the 'time' coordinates, so the timestamps
     are at 00, 05, ..., 55 past the hour.
 
+    The data is not decoded: It keeps the dtype it is stored with (int16), and any
+    `scale_factor`, `add_offset` and `_FillValue` are kept as attrs, so they are saved with each
+    batch.  Use `Satellite.decode()` to decode the data.
+
     Args:
       zarr_path: Cloud URL or local path pattern.  If GCP URL, must start with 'gs://'
       consolidated: Whether or not the Zarr metadata is consolidated.
+      disk_cache_path: If set, then cache the Zarr chunks in this local directory.
+      disk_cache_max_gb: The maximum size of the disk cache, in gigabytes.
+      index_path: If set, then open the stores using the persistent index at this path, which
+        is built (or rebuilt, if the stores matching `zarr_path` have changed) if necessary.
+        See `nowcasting_dataset.data_sources.satellite.satellite_index`.
+      check_index: If False then load the index at `index_path` without checking whether the
+        stores have changed.  See `SatelliteDataSource.update_index()`.
     """
     _LOG.debug("Opening satellite data: %s", zarr_path)
 
@@ -273,22 +470,51 @@ def open_sat_data(zarr_path: str, consolidated: bool) -> xr.DataArray:
     # from 8 seconds to 50 seconds!
     dask.config.set(**{"array.slicing.split_large_chunks": False})
 
-    # Open datasets.
-    dataset = xr.open_mfdataset(
-        zarr_path,
-        chunks="auto",  # See issue #456 for why we use "auto".
-        mode="r",
-        engine="zarr",
-        concat_dim="time",
-        preprocess=remove_acq_time_from_dataset_and_fix_time_coords,
-        consolidated=consolidated,
-        combine="nested",
-    )
-
-    data_array = dataset["stacked_eumetsat_data"]
+    if index_path is not None:
+        index = load_or_build_satellite_index(
+            index_path,
+            zarr_path=zarr_path,
+            consolidated=consolidated,
+            data_var_name="stacked_eumetsat_data",
+            preprocess=remove_acq_time_from_dataset_and_fix_time_coords,
+            check_stores=check_index,
+        )
+        data_array = open_data_array_from_index(
+            index,
+            consolidated=consolidated,
+            disk_cache_path=disk_cache_path,
+            disk_cache_max_gb=disk_cache_max_gb,
+        )
+    else:
+        if disk_cache_path is not None:
+            # Expand any wildcards ourselves, because open_mfdataset can't glob a list of stores.
+            zarr_path = [
+                get_zarr_store(store_url, disk_cache_path, disk_cache_max_gb)
+                for store_url in nd_fs_utils.get_sorted_urls(zarr_path)
+            ]
+
+        # Open datasets.
+        dataset = xr.open_mfdataset(
+            zarr_path,
+            chunks="auto",  # See issue #456 for why we use "auto".
+            mode="r",
+            engine="zarr",
+            concat_dim="time",
+            preprocess=remove_acq_time_from_dataset_and_fix_time_coords,
+            consolidated=consolidated,
+            combine="nested",
+            mask_and_scale=False,
+        )
+        data_array = dataset["stacked_eumetsat_data"]
+        del dataset
+
+        # Drop any times duplicated across stores, like the index does.
+        data_array = nd_utils.sort_and_drop_duplicates(
+            data_array, dim="time", name="Satellite Zarr"
+        )
+
     if "stacked_eumetsat_data" == data_array.name:
         data_array.name = "data"
-    del dataset
 
     # Flip coordinates to top-left first
     data_array = data_array.reindex(x=data_array.x[::-1])
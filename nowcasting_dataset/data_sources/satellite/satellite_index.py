@@ -0,0 +1,371 @@
+""" A persistent index of the timesteps in a satellite archive made of many Zarr stores.
+
+Opening the archive with `xr.open_mfdataset()` reads the metadata and the time coords of every
+store, and de-duplicates the times of every store, every time a worker starts.  Instead,
+`build_satellite_index()` does that once, and saves:
+
+- the URL of each store,
+- the combined (unique and sorted) time coords,
+- the store that each timestep comes from, and its position within that store,
+- the x, y and variable coords, and the shape, chunks, dtype and attrs of each store's array.
+
+The data is indexed as it is stored, without decoding `scale_factor`, `add_offset` or
+`_FillValue`.
+
+Where stores overlap, the timestep from the first store (in sorted order of URL) is kept.
+
+`open_data_array_from_index()` then builds a lazy DataArray from the index without touching the
+stores.  Each store is only opened when its data is first loaded.  The index is rebuilt if the
+set of stores matching the path changes, or if the shape of any store changes (for example,
+when timesteps are appended to the current month's store).  Checking that lists the stores and
+reads the metadata of each store, so it's best done once, before starting the worker processes,
+which can then load the index with `check_stores=False`.
+"""
+import json
+import logging
+import threading
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+import dask.array
+import fsspec
+import numpy as np
+import xarray as xr
+import zarr
+from dask.base import tokenize
+
+import nowcasting_dataset.filesystem.utils as nd_fs_utils
+import nowcasting_dataset.utils as nd_utils
+from nowcasting_dataset.filesystem.disk_cache import get_zarr_store
+
+_LOG = logging.getLogger(__name__)
+
+#: Increment whenever the meaning of the saved index changes, so old indexes are rebuilt.
+FORMAT_VERSION = 3
+
+
+def _to_json_compatible(value):
+    """Convert NumPy scalars and arrays in attrs (like an int16 `_FillValue`) for `json.dumps`."""
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+@dataclass
+class SatelliteIndex:
+    """The combined time coords of several Zarr stores, and where to find each timestep."""
+
+    store_urls: list[str]
+    #: The combined time coords, as unique and sorted datetime64[ns].
+    time: np.ndarray
+    #: The index into `store_urls` of the store which holds each timestep.
+    store_idx: np.ndarray
+    #: The position of each timestep along the time dim of its store.
+    position_in_store: np.ndarray
+    #: The coords of every dim apart from time.
+    coords: dict[str, np.ndarray]
+    #: The attrs of every dim's coords, including time.
+    coord_attrs: dict[str, dict]
+    #: The name of the data var, its dims, dtype and attrs.
+    data_var_name: str
+    dims: tuple[str, ...]
+    dtype: np.dtype
+    attrs: dict
+    #: The shape and Zarr chunks of the data var in each store.
+    shapes: list[tuple[int, ...]]
+    chunks: list[tuple[int, ...]]
+    #: The FORMAT_VERSION of the code which built the index.
+    format_version: int = FORMAT_VERSION
+
+    def save(self, index_path: Union[str, Path]) -> None:
+        """Save the index to a `.npz` file on any filesystem.
+
+        Writes to a temporary file and then renames it, so other processes never see a partly
+        written index.
+        """
+        metadata = dict(
+            store_urls=self.store_urls,
+            coord_names=list(self.coords),
+            coord_attrs=self.coord_attrs,
+            data_var_name=self.data_var_name,
+            dims=self.dims,
+            dtype=self.dtype.str,
+            attrs=self.attrs,
+            shapes=self.shapes,
+            chunks=self.chunks,
+            format_version=self.format_version,
+        )
+        arrays = {f"coord_{name}": values for name, values in self.coords.items()}
+        temp_path = f"{index_path}.{uuid.uuid4().hex}.tmp"
+        with fsspec.open(temp_path, mode="wb") as file:
+            np.savez(
+                file,
+                metadata=np.array(json.dumps(metadata, default=_to_json_compatible)),
+                time=self.time.astype("datetime64[ns]").view(np.int64),
+                store_idx=self.store_idx,
+                position_in_store=self.position_in_store,
+                **arrays,
+            )
+        nd_fs_utils.get_filesystem(temp_path).mv(temp_path, str(index_path))
+
+    @classmethod
+    def load(cls, index_path: Union[str, Path]) -> "SatelliteIndex":
+        """Load an index saved by `save()`."""
+        with fsspec.open(str(index_path), mode="rb") as file:
+            npz = np.load(file, allow_pickle=False)
+            metadata = json.loads(str(npz["metadata"]))
+            return cls(
+                store_urls=metadata["store_urls"],
+                time=npz["time"].view("datetime64[ns]"),
+                store_idx=npz["store_idx"],
+                position_in_store=npz["position_in_store"],
+                coords={name: npz[f"coord_{name}"] for name in metadata["coord_names"]},
+                coord_attrs=metadata["coord_attrs"],
+                data_var_name=metadata["data_var_name"],
+                dims=tuple(metadata["dims"]),
+                dtype=np.dtype(metadata["dtype"]),
+                attrs=metadata["attrs"],
+                shapes=[tuple(shape) for shape in metadata["shapes"]],
+                chunks=[tuple(chunks) for chunks in metadata["chunks"]],
+                format_version=metadata.get("format_version", 1),
+            )
+
+
+def build_satellite_index(
+    zarr_path: Union[str, Path],
+    consolidated: bool,
+    data_var_name: str,
+    preprocess: Callable[[xr.Dataset], xr.Dataset],
+) -> SatelliteIndex:
+    """Open every store matching `zarr_path` and index its timesteps.
+
+    Args:
+      zarr_path: Cloud URL or local path pattern of the Zarr stores.
+      consolidated: Whether or not the Zarr metadata is consolidated.
+      data_var_name: The name of the data var to index.  Its first dim must be `time`.
+      preprocess: Applied to each store, like the `preprocess` argument of
+        `xr.open_mfdataset()`.  May drop or reorder (but not change) timesteps.
+    """
+    store_urls = nd_fs_utils.get_sorted_urls(zarr_path)
+    if len(store_urls) == 0:
+        raise FileNotFoundError(f"No Zarr stores match {zarr_path}")
+
+    times = []
+    store_idxs = []
+    positions = []
+    shapes = []
+    chunks = []
+    for store_idx, store_url in enumerate(store_urls):
+        _LOG.debug(f"Indexing {store_url}")
+        dataset = xr.open_dataset(
+            store_url, engine="zarr", consolidated=consolidated, chunks={}, mask_and_scale=False
+        )
+        data_var = dataset[data_var_name]
+        assert data_var.dims[0] == "time", f"The first dim must be time, not {data_var.dims}"
+        shapes.append(data_var.shape)
+        chunks.append(data_var.encoding["chunks"])
+        original_times = dataset["time"].values
+        kept_times = preprocess(dataset)["time"].values
+
+        # Find the position of each kept time.  Where times are duplicated, the preprocessing
+        # keeps the first one.
+        unique_times, first_positions = np.unique(original_times, return_index=True)
+        positions.append(first_positions[np.searchsorted(unique_times, kept_times)])
+        times.append(kept_times)
+        store_idxs.append(np.full(len(kept_times), store_idx, dtype=np.int32))
+
+        if store_idx == 0:
+            coords = {dim: dataset[dim].values for dim in data_var.dims[1:]}
+            coord_attrs = {dim: dataset[dim].attrs for dim in data_var.dims}
+            dims = data_var.dims
+            dtype = data_var.dtype
+            attrs = data_var.attrs
+
+    # Sort the times of all the stores, and drop any times duplicated across stores.
+    locations = xr.Dataset(
+        {
+            "store_idx": ("time", np.concatenate(store_idxs)),
+            "position_in_store": ("time", np.concatenate(positions).astype(np.int64)),
+        },
+        coords={"time": np.concatenate(times).astype("datetime64[ns]")},
+    )
+    locations = nd_utils.sort_and_drop_duplicates(locations, dim="time", name="Satellite Zarr")
+
+    return SatelliteIndex(
+        store_urls=store_urls,
+        time=locations["time"].values,
+        store_idx=locations["store_idx"].values,
+        position_in_store=locations["position_in_store"].values,
+        coords=coords,
+        coord_attrs=coord_attrs,
+        data_var_name=data_var_name,
+        dims=dims,
+        dtype=dtype,
+        attrs=attrs,
+        shapes=shapes,
+        chunks=chunks,
+    )
+
+
+def get_store_shapes(
+    store_urls: list[str], consolidated: bool, data_var_name: str
+) -> list[tuple[int, ...]]:
+    """Get the shape of the data var in each store, from the Zarr metadata alone."""
+    shapes = []
+    for store_url in store_urls:
+        store = fsspec.get_mapper(store_url)
+        if consolidated:
+            group = zarr.open_consolidated(store, mode="r")
+        else:
+            group = zarr.open_group(store, mode="r")
+        shapes.append(tuple(group[data_var_name].shape))
+    return shapes
+
+
+def load_or_build_satellite_index(
+    index_path: Union[str, Path],
+    zarr_path: Union[str, Path],
+    consolidated: bool,
+    data_var_name: str,
+    preprocess: Callable[[xr.Dataset], xr.Dataset],
+    check_stores: bool = True,
+) -> SatelliteIndex:
+    """Load the index from `index_path`.  If the index doesn't exist, or if the stores matching
+    `zarr_path` or their shapes have changed, then build the index and save it to `index_path`.
+
+    See `build_satellite_index()` for the other arguments.
+
+    Args:
+      check_stores: If False then don't check whether the stores have changed.  Set this in
+        worker processes, once the index has been checked by the main process.
+    """
+    index = None
+    filesystem = nd_fs_utils.get_filesystem(index_path)
+    if filesystem.exists(str(index_path)):
+        index = SatelliteIndex.load(index_path)
+        if index.format_version != FORMAT_VERSION:
+            _LOG.info(f"{index_path} is from an older version, so rebuilding it")
+            index = None
+        elif not check_stores:
+            _LOG.debug(f"Loaded {index_path} without checking the stores")
+        elif index.store_urls != nd_fs_utils.get_sorted_urls(zarr_path):
+            _LOG.info(f"The stores matching {zarr_path} have changed, so rebuilding {index_path}")
+            index = None
+        elif index.shapes != get_store_shapes(index.store_urls, consolidated, data_var_name):
+            _LOG.info(
+                f"The stores matching {zarr_path} have changed shape, so rebuilding {index_path}"
+            )
+            index = None
+
+    if index is None:
+        _LOG.info(f"Building the satellite index {index_path}")
+        index = build_satellite_index(
+            zarr_path, consolidated=consolidated, data_var_name=data_var_name, preprocess=preprocess
+        )
+        index.save(index_path)
+    return index
+
+
+class _LazyStoreArray:
+    """The data var of one Zarr store, which is only opened when it's first indexed.
+
+    Has just enough of the NumPy API for `dask.array.from_array()`.
+    """
+
+    def __init__(
+        self,
+        store_url: str,
+        consolidated: bool,
+        index: SatelliteIndex,
+        store_idx: int,
+        disk_cache_path: Optional[str],
+        disk_cache_max_gb: float,
+    ):
+        self.store_url = store_url
+        self.consolidated = consolidated
+        self.data_var_name = index.data_var_name
+        self.shape = index.shapes[store_idx]
+        self.dtype = index.dtype
+        self.ndim = len(self.shape)
+        self.disk_cache_path = disk_cache_path
+        self.disk_cache_max_gb = disk_cache_max_gb
+        self._variable = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        # Each process opens the store for itself.
+        state = self.__dict__.copy()
+        state["_variable"] = None
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key) -> np.ndarray:
+        with self._lock:
+            if self._variable is None:
+                store = get_zarr_store(self.store_url, self.disk_cache_path, self.disk_cache_max_gb)
+                dataset = xr.open_dataset(
+                    store, engine="zarr", consolidated=self.consolidated, mask_and_scale=False
+                )
+                self._variable = dataset[self.data_var_name].variable
+        return self._variable[key].values
+
+
+def open_data_array_from_index(
+    index: SatelliteIndex,
+    consolidated: bool,
+    disk_cache_path: Optional[str] = None,
+    disk_cache_max_gb: float = 100,
+) -> xr.DataArray:
+    """Lazily open the data var of every store in `index`, concatenated along `time`.
+
+    Equivalent to opening the stores with `xr.open_mfdataset(..., chunks="auto")` and the same
+    `preprocess`, and then selecting the data var, but doesn't open any store.
+    """
+    # Open every timestep of every store, and then select the indexed timesteps.
+    arrays = []
+    for store_idx, store_url in enumerate(index.store_urls):
+        lazy_array = _LazyStoreArray(
+            store_url,
+            consolidated=consolidated,
+            index=index,
+            store_idx=store_idx,
+            disk_cache_path=disk_cache_path,
+            disk_cache_max_gb=disk_cache_max_gb,
+        )
+        array = dask.array.from_array(
+            lazy_array,
+            chunks=dask.array.core.normalize_chunks(
+                "auto",
+                shape=lazy_array.shape,
+                dtype=index.dtype,
+                previous_chunks=index.chunks[store_idx],
+            ),
+            name=f"open_satellite_index-{tokenize(store_url, consolidated)}",
+            meta=np.empty((0,) * lazy_array.ndim, dtype=index.dtype),
+        )
+        arrays.append(array)
+    data = dask.array.concatenate(arrays, axis=0)
+
+    # The position of each indexed timestep in `data`.
+    first_position_of_each_store = np.cumsum([0] + [shape[0] for shape in index.shapes[:-1]])
+    positions = first_position_of_each_store[index.store_idx] + index.position_in_store
+    if not np.array_equal(positions, np.arange(data.shape[0])):
+        data = data[positions]
+
+    coords = {
+        dim: xr.Variable(dim, values, attrs=index.coord_attrs[dim])
+        for dim, values in {"time": index.time, **index.coords}.items()
+    }
+    return xr.DataArray(
+        data,
+        dims=index.dims,
+        coords=coords,
+        name=index.data_var_name,
+        attrs=index.attrs,
+    )
@@ -3,6 +3,8 @@ from __future__ import annotations
 
 import logging
 
+import numpy as np
+
 from nowcasting_dataset.data_sources.datasource_output import DataSourceOutput
 
 logger = logging.getLogger(__name__)
@@ -18,15 +20,31 @@ class Satellite(DataSourceOutput):
     @classmethod
     def model_validation(cls, v):
         """Check that all values are non negative"""
-        v.check_nan_and_inf(data=v.data)
         # put this validation back in when issue is done
-        v.check_dataset_not_equal(data=v.data, value=-1, raise_error=False)
+        v.check_data_var(data=v.data, not_equal_value=-1, raise_error_if_equal=False)
         v.check_data_var_dim(
             v.data, ("example", "time_index", "x_index", "y_index", "channels_index")
         )
 
         return v
 
+    def decode(self) -> Satellite:
+        """Decode the data, which is kept as it is stored (e.g. int16), to float32.
+
+        Like `xr.open_dataset()` does by default: Replaces `_FillValue` with NaN, and then
+        multiplies by `scale_factor` and adds `add_offset`.  Any of those attrs which are missing
+        are ignored.  Batches loaded from NetCDF files by `xr.open_dataset()` are already decoded.
+        """
+        attrs = dict(self.data.attrs)
+        fill_value = attrs.pop("_FillValue", None)
+        scale_factor = np.float32(attrs.pop("scale_factor", 1))
+        add_offset = np.float32(attrs.pop("add_offset", 0))
+        decoded = self.data.astype(np.float32)
+        if fill_value is not None:
+            decoded = decoded.where(self.data != fill_value)
+        decoded = decoded * scale_factor + add_offset
+        return self.__class__(self.assign(data=decoded.assign_attrs(attrs)))
+
 
 class HRVSatellite(Satellite):
     """Class to store HRV satellite data as a xr.Dataset with some validation"""
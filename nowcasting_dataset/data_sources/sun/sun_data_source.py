@@ -3,16 +3,18 @@ import logging
 from dataclasses import dataclass
 from numbers import Number
 from pathlib import Path
-from typing import List, Tuple, Union
+from typing import Iterable, List, Optional, Tuple, Union
 
 import numpy as np
 import pandas as pd
 import xarray as xr
 
 import nowcasting_dataset.filesystem.utils as nd_fs_utils
+import nowcasting_dataset.utils as nd_utils
 from nowcasting_dataset.data_sources.data_source import DataSource
 from nowcasting_dataset.data_sources.sun.raw_data_load_save import load_from_zarr, x_y_to_name
 from nowcasting_dataset.data_sources.sun.sun_model import Sun
+from nowcasting_dataset.dataset.xr_utils import make_batch_dataset
 from nowcasting_dataset.geospatial import calculate_azimuth_and_elevation_angle
 
 logger = logging.getLogger(__name__)
@@ -61,9 +63,7 @@ class SunDataSource(DataSource):
 
         # The names of the columns get truncated when saving, therefore we need to look for the
         # name of the columns near the location we are looking for
-        locations = np.array(
-            [[float(z.split(",")[0]), float(z.split(",")[1])] for z in self.azimuth.columns]
-        )
+        locations = self._locations
         location = locations[
             np.isclose(locations[:, 0], x_meters_center)
             & np.isclose(locations[:, 1], y_meters_center)
@@ -89,13 +89,55 @@ class SunDataSource(DataSource):
 
         return sun
 
+    def _get_batch_dataset(
+        self,
+        t0_datetimes: pd.DatetimeIndex,
+        x_locations: Iterable[Number],
+        y_locations: Iterable[Number],
+    ) -> xr.Dataset:
+        """Get the azimuth and elevation for all the examples at once, using NumPy indexing."""
+        t0_datetimes_2019 = pd.DatetimeIndex([t0_dt.replace(year=2019) for t0_dt in t0_datetimes])
+        row_idxs = nd_utils.get_row_idxs_of_windows(
+            index=self.azimuth.index,
+            start_dts=self._get_start_dt(t0_datetimes_2019),
+            end_dts=self._get_end_dt(t0_datetimes_2019),
+        )
+        if row_idxs is None:
+            # Not all examples have the same number of timesteps.
+            return super()._get_batch_dataset(
+                t0_datetimes=t0_datetimes, x_locations=x_locations, y_locations=y_locations
+            )
+
+        # Find the first column near each location, as in `get_example()`.
+        is_close = np.isclose(
+            self._locations[np.newaxis, :, 0], np.asarray(x_locations)[:, np.newaxis]
+        ) & np.isclose(self._locations[np.newaxis, :, 1], np.asarray(y_locations)[:, np.newaxis])
+        assert is_close.any(axis=1).all()
+        col_idxs = is_close.argmax(axis=1)[:, np.newaxis]
+
+        dims = ("example", "time")
+        return make_batch_dataset(
+            {
+                "azimuth": (dims, self.azimuth.values[row_idxs, col_idxs]),
+                "elevation": (dims, self.elevation.values[row_idxs, col_idxs]),
+                "time": (dims, self.azimuth.index.values[row_idxs]),
+            }
+        )
+
     def _load(self):
 
         logger.info(f"Loading Sun data from {self.zarr_path}")
 
         self.azimuth, self.elevation = load_from_zarr(zarr_path=self.zarr_path)
 
-    def get_locations(self, t0_datetimes: pd.DatetimeIndex) -> Tuple[List[Number], List[Number]]:
+        # The (x, y) location of each column, parsed from column names like '22222.555,3333.6666'
+        self._locations = np.array(
+            [[float(z.split(",")[0]), float(z.split(",")[1])] for z in self.azimuth.columns]
+        )
+
+    def get_locations(
+        self, t0_datetimes: pd.DatetimeIndex, rng: Optional[np.random.Generator] = None
+    ) -> Tuple[List[Number], List[Number]]:
         """Sun data should not be used to get batch locations"""
         raise NotImplementedError("Sun data should not be used to get batch locations")
 
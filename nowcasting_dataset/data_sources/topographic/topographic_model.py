@@ -14,7 +14,7 @@ class Topographic(DataSourceOutput):
     def model_validation(cls, v):
         """Check that all values are non NaNs"""
 
-        v.check_nan_and_inf(data=v.data)
+        v.check_data_var(data=v.data)
 
         v.check_data_var_dim(v.data, ("example", "x_index", "y_index"))
 
@@ -0,0 +1,138 @@
+""" Save and load the spatial and temporal locations of each example.
+
+The locations are saved as a NumPy structured array in a `.npy` file, with one row per example
+and these fields:
+
+- t0_datetime_UTC: int64 nanoseconds since the Unix epoch.
+- x_center_OSGB: float32.
+- y_center_OSGB: float32.
+
+Local files are memory-mapped, and only the requested bytes are read from remote files, so each
+worker process only reads the rows it needs.
+"""
+from pathlib import Path
+from typing import Optional, Union
+
+import fsspec
+import numpy as np
+import pandas as pd
+
+from nowcasting_dataset.consts import SPATIAL_AND_TEMPORAL_LOCATIONS_COLUMN_NAMES
+
+LOCATIONS_DTYPE = np.dtype(
+    [
+        ("t0_datetime_UTC", np.int64),
+        ("x_center_OSGB", np.float32),
+        ("y_center_OSGB", np.float32),
+    ]
+)
+
+
+def save_locations(locations: pd.DataFrame, filename: Union[str, Path]) -> None:
+    """Save `locations` to a `.npy` file on any filesystem.
+
+    Args:
+      locations: DataFrame with columns t0_datetime_UTC, x_center_OSGB, y_center_OSGB.
+      filename: The `.npy` file to write.
+    """
+    assert locations.columns.to_list() == list(SPATIAL_AND_TEMPORAL_LOCATIONS_COLUMN_NAMES)
+    array = np.empty(len(locations), dtype=LOCATIONS_DTYPE)
+    array["t0_datetime_UTC"] = pd.DatetimeIndex(locations["t0_datetime_UTC"]).asi8
+    array["x_center_OSGB"] = locations["x_center_OSGB"]
+    array["y_center_OSGB"] = locations["y_center_OSGB"]
+    with fsspec.open(str(filename), mode="wb") as file:
+        np.save(file, array)
+
+
+def load_locations(
+    filename: Union[str, Path], start_row: int = 0, end_row: Optional[int] = None
+) -> pd.DataFrame:
+    """Load rows [start_row, end_row) of a locations file saved by `save_locations()`.
+
+    Args:
+      filename: The `.npy` file to read, on any filesystem.
+      start_row: The first row to read.
+      end_row: One past the last row to read.  If None then read to the end of the file.
+
+    Returns:
+      DataFrame with columns t0_datetime_UTC, x_center_OSGB, y_center_OSGB.  The index holds
+      the row numbers, so the index of the first example of batch `i` is `i * batch_size`.
+    """
+    filesystem, path = fsspec.core.url_to_fs(str(filename))
+    if "file" in filesystem.protocol:
+        array = np.load(path, mmap_mode="r")
+        end_row = len(array) if end_row is None else min(end_row, len(array))
+        array = np.array(array[start_row:end_row])
+    else:
+        with filesystem.open(path, mode="rb") as file:
+            n_rows, header_length = _read_header(file)
+            end_row = n_rows if end_row is None else min(end_row, n_rows)
+            file.seek(header_length + start_row * LOCATIONS_DTYPE.itemsize)
+            buffer = file.read(max(end_row - start_row, 0) * LOCATIONS_DTYPE.itemsize)
+        array = np.frombuffer(buffer, dtype=LOCATIONS_DTYPE)
+
+    return pd.DataFrame(
+        {
+            "t0_datetime_UTC": pd.to_datetime(array["t0_datetime_UTC"], unit="ns"),
+            "x_center_OSGB": array["x_center_OSGB"],
+            "y_center_OSGB": array["y_center_OSGB"],
+        },
+        index=pd.RangeIndex(start_row, start_row + len(array)),
+    )
+
+
+def get_number_of_locations(filename: Union[str, Path]) -> int:
+    """Get the number of rows in a locations file, without reading the rows."""
+    with fsspec.open(str(filename), mode="rb") as file:
+        n_rows, _ = _read_header(file)
+    return n_rows
+
+
+def load_locations_from_csv(filename: Union[str, Path]) -> pd.DataFrame:
+    """Load a CSV file of locations, as written by `pd.DataFrame.to_csv()`."""
+    locations = pd.read_csv(filename, index_col=0)
+    assert locations.columns.to_list() == list(SPATIAL_AND_TEMPORAL_LOCATIONS_COLUMN_NAMES)
+    # Converting to datetimes is much faster using `pd.to_datetime()` than
+    # passing `parse_datetimes` into `pd.read_csv()`.
+    locations["t0_datetime_UTC"] = pd.to_datetime(locations["t0_datetime_UTC"])
+    return locations
+
+
+def sort_locations_within_each_batch(locations: pd.DataFrame, batch_size: int) -> pd.DataFrame:
+    """Sort the examples within each batch by t0_datetime_UTC.
+
+    Examples which are close in time usually share Zarr chunks, so loading them one after the
+    other means each chunk is more likely to be in the chunk cache (see
+    `nowcasting_dataset.data_sources.chunk_cache`).  Each batch of `batch_size` rows keeps exactly
+    the same examples; only the order within each batch changes.
+
+    Args:
+      locations: DataFrame with columns t0_datetime_UTC, x_center_OSGB, y_center_OSGB.
+      batch_size: The number of examples per batch.
+
+    Returns:
+      The sorted locations, with a new RangeIndex.
+    """
+    batch_idx = np.arange(len(locations)) // batch_size
+    t0_datetimes = pd.DatetimeIndex(locations["t0_datetime_UTC"]).asi8
+    # np.lexsort sorts by the last key first.  It's a stable sort, so ties keep their order.
+    order = np.lexsort((t0_datetimes, batch_idx))
+    return locations.iloc[order].reset_index(drop=True)
+
+
+def _read_header(file) -> tuple[int, int]:
+    """Read the header of a `.npy` file.
+
+    Returns:
+      The number of rows, and the length of the header in bytes.
+    """
+    version = np.lib.format.read_magic(file)
+    if version == (1, 0):
+        shape, _, dtype = np.lib.format.read_array_header_1_0(file)
+    elif version == (2, 0):
+        shape, _, dtype = np.lib.format.read_array_header_2_0(file)
+    else:
+        raise ValueError(f"Unsupported .npy file format version {version}!")
+    if dtype != LOCATIONS_DTYPE or len(shape) != 1:
+        raise ValueError(f"Not a locations file!  dtype={dtype}, shape={shape}")
+    return shape[0], file.tell()
@@ -10,7 +10,63 @@ import xarray as xr
 
 
 def join_list_dataset_to_batch_dataset(datasets: list[xr.Dataset]) -> xr.Dataset:
-    """Join a list of data sets to a dataset by expanding dims"""
+    """Join a list of data sets to a dataset by expanding dims.
+
+    If all the datasets have the same layout (the same data vars, with the same dims, shapes and
+    dtypes, and identical coords) then each output array is allocated once and each dataset is
+    copied into its slot.  Otherwise, fall back to `join_list_dataset_to_batch_dataset_with_concat`.
+    """
+    if not _have_same_layout(datasets):
+        return join_list_dataset_to_batch_dataset_with_concat(datasets)
+
+    first_dataset = datasets[0]
+    n_examples = len(datasets)
+    data_vars = {}
+    for name, variable in first_dataset.data_vars.items():
+        array = np.empty((n_examples,) + variable.shape, dtype=variable.dtype)
+        for i, dataset in enumerate(datasets):
+            array[i] = dataset[name].values
+        data_vars[name] = xr.Variable(
+            ("example",) + variable.dims,
+            array,
+            attrs=variable.attrs,
+            encoding=variable.encoding,
+        )
+
+    coords = {name: coord.variable for name, coord in first_dataset.coords.items()}
+    coords["example"] = np.arange(n_examples)
+    return xr.Dataset(data_vars, coords=coords, attrs=first_dataset.attrs)
+
+
+def _have_same_layout(datasets: list[xr.Dataset]) -> bool:
+    """Return True if all datasets have the same data vars (names, dims, shapes and dtypes) and
+    identical coords."""
+    if len(datasets) == 0:
+        return False
+    first_dataset = datasets[0]
+    if "example" in first_dataset.dims or "example" in first_dataset.variables:
+        return False
+    for dataset in datasets[1:]:
+        if list(dataset.data_vars) != list(first_dataset.data_vars):
+            return False
+        for name, variable in first_dataset.data_vars.items():
+            other_variable = dataset[name].variable
+            if (
+                other_variable.dims != variable.dims
+                or other_variable.shape != variable.shape
+                or other_variable.dtype != variable.dtype
+            ):
+                return False
+        if list(dataset.coords) != list(first_dataset.coords):
+            return False
+        for name, coord in first_dataset.coords.items():
+            if not coord.variable.equals(dataset.coords[name].variable):
+                return False
+    return True
+
+
+def join_list_dataset_to_batch_dataset_with_concat(datasets: list[xr.Dataset]) -> xr.Dataset:
+    """Join a list of data sets to a dataset by expanding dims, and concatenating."""
 
     new_datasets = []
     for i, dataset in enumerate(datasets):
@@ -20,6 +76,31 @@ def join_list_dataset_to_batch_dataset(datasets: list[xr.Dataset]) -> xr.Dataset
     return xr.concat(new_datasets, dim="example")
 
 
+def make_batch_dataset(data_vars: dict[str, tuple[tuple[str, ...], np.ndarray]]) -> xr.Dataset:
+    """Make a batch directly from arrays which already have an `example` dimension.
+
+    The batch has the same layout as a batch made by
+    `convert_coordinates_to_indexes_for_list_datasets()` and then
+    `join_list_dataset_to_batch_dataset()`: Each dim (apart from `example`) is renamed to
+    `<dim>_index`, and every dim has the coords 0, 1, ..., len(dim) - 1.
+
+    Args:
+        data_vars: Maps from the name of each data var to (dims, array), where dims are the
+            original dim names, starting with "example".  e.g. ("example", "time").
+    """
+    batch_data_vars = {}
+    dim_lengths = {}
+    for name, (dims, array) in data_vars.items():
+        assert dims[0] == "example", f"The first dim of {name} must be 'example', not {dims[0]}"
+        assert len(dims) == array.ndim, f"{name} has {array.ndim} dims, but {dims=}"
+        batch_dims = ["example"] + [f"{dim}_index" for dim in dims[1:]]
+        batch_data_vars[name] = (batch_dims, array)
+        dim_lengths.update(zip(batch_dims, array.shape))
+
+    coords = {dim: np.arange(length) for dim, length in dim_lengths.items()}
+    return xr.Dataset(batch_data_vars, coords=coords)
+
+
 def convert_coordinates_to_indexes_for_list_datasets(
     examples: List[xr.Dataset],
 ) -> List[xr.Dataset]:
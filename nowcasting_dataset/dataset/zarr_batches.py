@@ -0,0 +1,138 @@
+""" Save and load batches in a Zarr store, instead of one NetCDF file per batch.
+
+Each DataSource has one Zarr store per split.  The batches are stacked along a new outer `batch`
+dimension, and each Zarr chunk holds one batch.  The store's length along the `batch` dimension
+is the number of complete batches, so resuming doesn't need to list thousands of files.
+
+Rewriting the consolidated metadata after every batch would read and write the metadata of every
+array, so `BackgroundZarrWriter` only consolidates the metadata once it has written all its
+batches.  So the consolidated metadata never lists a partially-written batch, although it may
+list fewer batches than the store holds (and resuming then re-writes those batches).
+"""
+import logging
+from pathlib import Path
+from typing import Union
+
+import fsspec
+import xarray as xr
+import zarr
+
+_LOG = logging.getLogger(__name__)
+
+BATCH_DIM_NAME = "batch"
+
+
+def get_number_of_batches_in_zarr(zarr_path: Union[str, Path]) -> int:
+    """Get the number of complete batches in a Zarr store.  Returns 0 if the store doesn't exist.
+
+    If writing a batch was interrupted, then some arrays may be longer than others, so this
+    returns the length of the shortest array.  The lengths are read from the consolidated
+    metadata (a single request on object stores), which is only updated after each batch has
+    been completely written.
+    """
+    mapper = fsspec.get_mapper(str(zarr_path))
+    try:
+        group = zarr.open_consolidated(mapper, mode="r")
+    except KeyError:
+        # There's no consolidated metadata.
+        try:
+            group = zarr.open_group(mapper, mode="r")
+        except zarr.errors.GroupNotFoundError:
+            return 0
+    lengths = [array.shape[0] for array in _get_arrays_with_batch_dim(group)]
+    return min(lengths) if lengths else 0
+
+
+def append_batch_to_zarr(
+    batch: xr.Dataset,
+    zarr_path: Union[str, Path],
+    batch_idx: int,
+    truncate: bool = True,
+    consolidate: bool = True,
+) -> None:
+    """Write `batch` as batch number `batch_idx` of the Zarr store at `zarr_path`.
+
+    Batches must be written in order: If `batch_idx` is 0 then the store is overwritten.
+    Otherwise `batch_idx` must be at most the number of batches in the store, and (if
+    `truncate`) any batches from `batch_idx` onwards are removed before `batch` is appended.
+
+    Set `truncate` to False to append straight away, without reading the store's metadata,
+    when the store is known to hold exactly `batch_idx` batches (e.g. because this process
+    has just written batch `batch_idx - 1`).
+
+    Set `consolidate` to False to skip updating the consolidated metadata, and call
+    `consolidate_zarr_metadata()` after appending the last batch.  The first batch always
+    writes the consolidated metadata.  `truncate` reads the number of batches from the
+    consolidated metadata, so set it to False when appending after an unconsolidated batch.
+    """
+    mapper = fsspec.get_mapper(str(zarr_path))
+    # Data vars which keep their stored dtype (e.g. satellite int16) have `scale_factor`,
+    # `add_offset` and `_FillValue` attrs.  When appending, xarray encodes each data var using
+    # the encoding of the existing array, so move those attrs into the encoding (by decoding).
+    # The data is encoded back to exactly the same values.
+    batch = xr.decode_cf(
+        xr.Dataset(batch),
+        decode_times=False,
+        decode_coords=False,
+        decode_timedelta=False,
+        concat_characters=False,
+    )
+    batch = batch.expand_dims(BATCH_DIM_NAME).assign_coords({BATCH_DIM_NAME: [batch_idx]})
+
+    if batch_idx == 0:
+        # Each chunk holds one whole batch of each variable.  Set the chunks in the encoding of
+        # each variable (instead of passing `encoding` to `to_zarr()`), to keep the dtype and
+        # scale_factor set above.
+        for name, variable in batch.variables.items():
+            if variable.dims[:1] == (BATCH_DIM_NAME,) and name != BATCH_DIM_NAME:
+                variable.encoding = {**variable.encoding, "chunks": (1, *variable.shape[1:])}
+        batch.to_zarr(mapper, mode="w", consolidated=True)
+        return
+
+    if truncate:
+        _check_and_truncate_zarr(zarr_path, batch_idx=batch_idx)
+    batch.to_zarr(mapper, append_dim=BATCH_DIM_NAME, consolidated=consolidate)
+
+
+def consolidate_zarr_metadata(zarr_path: Union[str, Path]) -> None:
+    """Update the consolidated metadata of the Zarr store at `zarr_path`."""
+    zarr.consolidate_metadata(fsspec.get_mapper(str(zarr_path)))
+
+
+def _check_and_truncate_zarr(zarr_path: Union[str, Path], batch_idx: int) -> None:
+    """Check batch `batch_idx` can be appended, and remove any batches from `batch_idx` onwards."""
+    n_batches = get_number_of_batches_in_zarr(zarr_path)
+    if batch_idx > n_batches:
+        raise ValueError(
+            f"Cannot write batch {batch_idx} to {zarr_path} which only has {n_batches} batches!"
+        )
+    _truncate_zarr(zarr_path, n_batches=batch_idx)
+
+
+def load_batch_from_zarr(zarr_path: Union[str, Path], batch_idx: int) -> xr.Dataset:
+    """Load batch number `batch_idx` from the Zarr store at `zarr_path` into memory."""
+    with xr.open_zarr(fsspec.get_mapper(str(zarr_path)), consolidated=True) as dataset:
+        batch = dataset.isel({BATCH_DIM_NAME: batch_idx}).drop_vars(BATCH_DIM_NAME)
+        return batch.load()
+
+
+def _truncate_zarr(zarr_path: Union[str, Path], n_batches: int) -> None:
+    """Remove all batches from `n_batches` onwards from the Zarr store at `zarr_path`."""
+    mapper = fsspec.get_mapper(str(zarr_path))
+    group = zarr.open_group(mapper, mode="r+")
+    arrays_to_truncate = [
+        array for array in _get_arrays_with_batch_dim(group) if array.shape[0] > n_batches
+    ]
+    if arrays_to_truncate:
+        _LOG.warning(f"Removing batches {n_batches} onwards from {zarr_path}")
+        for array in arrays_to_truncate:
+            array.resize((n_batches,) + array.shape[1:])
+        zarr.consolidate_metadata(mapper)
+
+
+def _get_arrays_with_batch_dim(group: zarr.Group) -> list[zarr.Array]:
+    return [
+        array
+        for _, array in group.arrays()
+        if array.attrs.get("_ARRAY_DIMENSIONS", [None])[0] == BATCH_DIM_NAME
+    ]
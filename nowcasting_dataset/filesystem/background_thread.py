@@ -0,0 +1,89 @@
+""" Process a queue of items in a background thread """
+import logging
+import queue
+import threading
+from typing import Any, Optional
+
+_LOG = logging.getLogger("nowcasting_dataset")
+
+
+class BackgroundThread:
+    """Process items from a bounded queue in a background thread.
+
+    Subclasses implement `_process()`, and call `_put()` to queue each item.
+
+    `_put()` blocks when the queue is full.  If `_process()` raises an exception then the
+    exception is raised in the calling thread (wrapped in a RuntimeError) by the next call to
+    `_put()` or `close()`.
+
+    Use as a context manager, so `close()` waits for all the queued items to be processed.  If
+    the `with` block raises an exception, then that exception is raised, not the exception from
+    `_process()`.
+    """
+
+    def __init__(self, max_items_in_queue: int):
+        """Start the background thread.
+
+        Args:
+          max_items_in_queue: The maximum number of items waiting to be processed.
+        """
+        assert max_items_in_queue > 0
+        self._queue: queue.Queue[Optional[Any]] = queue.Queue(maxsize=max_items_in_queue)
+        self._exception: Optional[Exception] = None
+        self._thread = threading.Thread(target=self._process_items_from_queue, daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        """Wait for all the queued items to be processed, and stop the background thread."""
+        self._queue.put(None)
+        self._thread.join()
+        self._raise_exception_from_thread_if_necessary()
+
+    def __enter__(self):  # noqa: D105
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):  # noqa: D105
+        if exc_type is None:
+            self.close()
+            return
+        # Don't mask the exception raised in the `with` block with an exception from the
+        # background thread.  `_process_items_from_queue()` has already logged the latter.
+        try:
+            self.close()
+        except RuntimeError:
+            _LOG.error(f"{self._get_error_message()}  Raising the earlier exception instead.")
+
+    def _put(self, item: Any) -> None:
+        """Queue `item` to be processed.  Blocks if the queue is full."""
+        self._raise_exception_from_thread_if_necessary()
+        self._queue.put(item)
+
+    def _process(self, item: Any) -> None:
+        """Process one item.  Runs in the background thread."""
+        raise NotImplementedError()
+
+    def _describe(self, item: Any) -> str:
+        """Describe `item` in log messages."""
+        return str(item)
+
+    def _get_error_message(self) -> str:
+        """The message of the RuntimeError raised if `_process()` fails."""
+        return f"Exception in {self.__class__.__name__}!"
+
+    def _raise_exception_from_thread_if_necessary(self) -> None:
+        if self._exception is not None:
+            raise RuntimeError(self._get_error_message()) from self._exception
+
+    def _process_items_from_queue(self) -> None:
+        while (item := self._queue.get()) is not None:
+            # After an exception, keep emptying the queue so `_put()` never blocks forever.
+            if self._exception is not None:
+                continue
+            try:
+                self._process(item)
+            except Exception as e:
+                _LOG.exception(
+                    f"Exception in {self.__class__.__name__} whilst processing"
+                    f" {self._describe(item)}!"
+                )
+                self._exception = e
@@ -0,0 +1,55 @@
+""" Upload files in a background thread """
+import logging
+from pathlib import Path
+from typing import Union
+
+from nowcasting_dataset.filesystem import utils as nd_fs_utils
+from nowcasting_dataset.filesystem.background_thread import BackgroundThread
+
+_LOG = logging.getLogger("nowcasting_dataset")
+
+
+class BackgroundUploader(BackgroundThread):
+    """Upload local files to `dst_path` in a background thread.
+
+    Each local file is deleted as soon as it has been uploaded.  This lets the caller
+    create the next batch whilst the previous batches are being uploaded.
+
+    The queue of files waiting to be uploaded holds at most `max_files_in_queue` files.
+    `upload()` blocks when the queue is full, so the local temporary directory never
+    holds more than `max_files_in_queue` + 2 files (the files in the queue, the file being
+    uploaded, and the file being written).
+
+    If an upload fails then the exception is raised in the calling thread by the next call to
+    `upload()` or `close()`.
+
+    Use as a context manager:
+
+        with BackgroundUploader(dst_path, max_files_in_queue=16) as uploader:
+            uploader.upload(local_filename)
+    """
+
+    def __init__(self, dst_path: Union[str, Path], max_files_in_queue: int):
+        """Start the background thread.
+
+        Args:
+          dst_path: The remote directory to upload files to.
+          max_files_in_queue: The maximum number of local files waiting to be uploaded.
+        """
+        self.dst_path = dst_path
+        super().__init__(max_items_in_queue=max_files_in_queue)
+
+    def upload(self, local_filename: Union[str, Path]) -> None:
+        """Queue `local_filename` to be uploaded and then deleted.  Blocks if the queue is full."""
+        self._put(Path(local_filename))
+
+    def _get_error_message(self) -> str:
+        return f"Failed to upload to {self.dst_path}!"
+
+    def _process(self, local_filename: Path) -> None:
+        remote_filename = f"{self.dst_path}/{local_filename.name}"
+        _LOG.debug(f"Uploading {local_filename} to {remote_filename}")
+        nd_fs_utils.upload_one_file(
+            remote_filename=remote_filename, local_filename=str(local_filename)
+        )
+        local_filename.unlink()
@@ -0,0 +1,133 @@
+""" Write batches to disk in a background thread """
+import logging
+from pathlib import Path
+from typing import Optional, Union
+
+import xarray as xr
+
+from nowcasting_dataset.config.model import BatchFileEncoding
+from nowcasting_dataset.data_sources.datasource_output import get_netcdf_encoding
+from nowcasting_dataset.dataset.zarr_batches import (
+    append_batch_to_zarr,
+    consolidate_zarr_metadata,
+)
+from nowcasting_dataset.filesystem.background_thread import BackgroundThread
+from nowcasting_dataset.filesystem.background_uploader import BackgroundUploader
+from nowcasting_dataset.utils import get_netcdf_filename
+
+_LOG = logging.getLogger("nowcasting_dataset")
+
+
+class BackgroundWriter(BackgroundThread):
+    """Write batches to NetCDF files in a background thread.
+
+    This lets the caller compute the next batch whilst HDF5 compresses and writes the previous
+    batch.  The queue holds at most `max_batches_in_queue` batches, so at most
+    `max_batches_in_queue` + 2 batches are in memory (the batches in the queue, the batch being
+    written, and the batch being computed).
+
+    If writing fails then the exception is raised in the calling thread by the next call to
+    `write()` or `close()`.
+
+    Use as a context manager:
+
+        with BackgroundWriter(path, max_batches_in_queue=1) as writer:
+            writer.write(batch, batch_idx)
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        batch_file_encoding: Optional[BatchFileEncoding] = None,
+        max_batches_in_queue: int = 1,
+        uploader: Optional[BackgroundUploader] = None,
+    ):
+        """Start the background thread.
+
+        Args:
+          path: The directory to write the NetCDF files to.
+          batch_file_encoding: How to compress and chunk the NetCDF files.
+          max_batches_in_queue: The maximum number of batches waiting to be written.
+          uploader: If set, then pass each file to `uploader` once it has been written.
+        """
+        self.path = Path(path)
+        self.batch_file_encoding = batch_file_encoding
+        self.uploader = uploader
+        super().__init__(max_items_in_queue=max_batches_in_queue)
+
+    def write(self, batch: xr.Dataset, batch_idx: int) -> None:
+        """Queue `batch` to be written as batch number `batch_idx`.  Blocks if the queue is full."""
+        self._put((batch, batch_idx))
+
+    def _describe(self, item: tuple) -> str:
+        _, batch_idx = item
+        return f"batch {batch_idx}"
+
+    def _get_error_message(self) -> str:
+        return f"Failed to write batch to {self.path}!"
+
+    def _process(self, item: tuple) -> None:
+        batch, batch_idx = item
+        filename = self.path / get_netcdf_filename(batch_idx)
+        _LOG.debug(f"Writing {filename}")
+        batch.to_netcdf(
+            filename,
+            engine="h5netcdf",
+            encoding=get_netcdf_encoding(batch, self.batch_file_encoding),
+        )
+        if self.uploader is not None:
+            self.uploader.upload(filename)
+
+
+class BackgroundZarrWriter(BackgroundThread):
+    """Append batches to a Zarr store in a background thread.
+
+    Batches must be written in order.  See `nowcasting_dataset.dataset.zarr_batches`.  The
+    store is only checked (and truncated, if necessary) when a batch doesn't directly follow the
+    previous batch written by this writer, i.e. for the first batch when resuming.  The
+    consolidated metadata is only updated by `close()`, once every batch has been written.
+    """
+
+    def __init__(self, zarr_path: Union[str, Path], max_batches_in_queue: int = 1):
+        """Start the background thread.
+
+        Args:
+          zarr_path: The Zarr store to append batches to.
+          max_batches_in_queue: The maximum number of batches waiting to be written.
+        """
+        self.zarr_path = zarr_path
+        self._next_batch_idx = None  # The batch which directly follows the last batch written.
+        super().__init__(max_items_in_queue=max_batches_in_queue)
+
+    def write(self, batch: xr.Dataset, batch_idx: int) -> None:
+        """Queue `batch` to be written as batch number `batch_idx`.  Blocks if the queue is full."""
+        self._put((batch, batch_idx))
+
+    def close(self) -> None:
+        """Wait for all the queued batches to be written, and then consolidate the metadata.
+
+        If writing failed then the metadata isn't consolidated, so it never lists a
+        partially-written batch.
+        """
+        super().close()
+        if self._next_batch_idx is not None:
+            consolidate_zarr_metadata(self.zarr_path)
+
+    def _describe(self, item: tuple) -> str:
+        _, batch_idx = item
+        return f"batch {batch_idx}"
+
+    def _get_error_message(self) -> str:
+        return f"Failed to write batch to {self.zarr_path}!"
+
+    def _process(self, item: tuple) -> None:
+        batch, batch_idx = item
+        _LOG.debug(f"Writing batch {batch_idx} to {self.zarr_path}")
+        append_batch_to_zarr(
+            batch,
+            self.zarr_path,
+            batch_idx=batch_idx,
+            truncate=batch_idx != self._next_batch_idx,
+            consolidate=False,
+        )
+        self._next_batch_idx = batch_idx + 1
@@ -0,0 +1,185 @@
+""" A read-through cache of Zarr chunks on local disk, for remote Zarr stores.
+
+Without a cache, every worker process downloads the same compressed chunks from `gs://` on
+every run.  `DiskCacheStore` wraps a read-only Zarr store, and saves each value it reads
+(compressed, exactly as it is stored) to:
+
+    <cache_path>/<hash of the store's URL>/<key>
+
+The total size of the cache is capped.  When the cap is exceeded, the least recently used
+files are deleted.  Files are written to a temporary file and then atomically renamed, so
+several worker processes on one machine can safely share one cache directory.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+from collections.abc import MutableMapping
+from pathlib import Path
+from typing import Iterator, Union
+
+import fsspec
+
+_LOG = logging.getLogger(__name__)
+
+#: Evict files once this process has written this fraction of `max_bytes` since the last check.
+_FRACTION_OF_MAX_BYTES_BETWEEN_EVICTIONS = 0.05
+
+#: When evicting, delete files until the cache is at most this fraction of `max_bytes`.
+_FRACTION_OF_MAX_BYTES_AFTER_EVICTION = 0.9
+
+
+class DiskCacheStore(MutableMapping):
+    """A read-only Zarr store which caches the values of another store on local disk.
+
+    Writing to the store, or deleting from it, raises a PermissionError.
+    """
+
+    def __init__(self, url: str, cache_path: Union[str, Path], max_bytes: int):
+        """Open the store.
+
+        Args:
+          url: The URL (or local path) of the Zarr store to cache.  e.g. gs://bucket/data.zarr
+          cache_path: The local directory which holds the cache.  Can be shared by several
+            DiskCacheStores, and by several processes.
+          max_bytes: The maximum total size of the files in `cache_path`.
+        """
+        assert max_bytes > 0, f"max_bytes must be positive, not {max_bytes}"
+        self.url = str(url)
+        self.cache_path = Path(cache_path).expanduser()
+        self.max_bytes = max_bytes
+        self._store = fsspec.get_mapper(self.url)
+        url_hash = hashlib.sha1(self.url.encode()).hexdigest()[:16]
+        self._path_for_store = self.cache_path / url_hash
+        self._n_bytes_written_since_last_eviction = 0
+
+    def __getstate__(self) -> dict:
+        # Don't pickle the fsspec mapper.  Each process opens its own.
+        state = self.__dict__.copy()
+        del state["_store"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._store = fsspec.get_mapper(self.url)
+
+    def __getitem__(self, key: str) -> bytes:
+        filename = self._path_for_store / key
+        try:
+            with open(filename, mode="rb") as file:
+                value = file.read()
+        except FileNotFoundError:
+            # Raises a KeyError if the key isn't in the remote store, which Zarr expects.
+            value = self._store[key]
+            self._save(filename, value)
+        else:
+            # Mark the file as recently used.  Another process may have just evicted it.
+            try:
+                os.utime(filename)
+            except FileNotFoundError:
+                pass
+        return value
+
+    def __contains__(self, key: str) -> bool:
+        return (self._path_for_store / key).exists() or key in self._store
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._store)
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def __setitem__(self, key: str, value: bytes) -> None:
+        raise PermissionError(f"DiskCacheStore is read-only.  Can't write {key} to {self.url}")
+
+    def __delitem__(self, key: str) -> None:
+        raise PermissionError(f"DiskCacheStore is read-only.  Can't delete {key} from {self.url}")
+
+    def _save(self, filename: Path, value: bytes) -> None:
+        """Atomically save `value` to `filename`, and evict old files if necessary."""
+        filename.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file in the same directory, and then rename, so other processes
+        # never see a partly-written file.
+        file_descriptor, temp_filename = tempfile.mkstemp(dir=filename.parent, suffix=".tmp")
+        try:
+            with os.fdopen(file_descriptor, mode="wb") as file:
+                file.write(value)
+            os.replace(temp_filename, filename)
+        except BaseException:
+            Path(temp_filename).unlink(missing_ok=True)
+            raise
+
+        self._n_bytes_written_since_last_eviction += len(value)
+        if (
+            self._n_bytes_written_since_last_eviction
+            >= self.max_bytes * _FRACTION_OF_MAX_BYTES_BETWEEN_EVICTIONS
+        ):
+            self._n_bytes_written_since_last_eviction = 0
+            evict_least_recently_used_files(
+                self.cache_path,
+                max_bytes=self.max_bytes,
+                target_bytes=int(self.max_bytes * _FRACTION_OF_MAX_BYTES_AFTER_EVICTION),
+            )
+
+
+def evict_least_recently_used_files(
+    cache_path: Union[str, Path], max_bytes: int, target_bytes: int
+) -> int:
+    """If the files in `cache_path` total more than `max_bytes`, then delete the least recently
+    used files until they total at most `target_bytes`.
+
+    Files which another process deletes whilst we're evicting are ignored.
+
+    Returns:
+      The number of files deleted.
+    """
+    files = []
+    total_bytes = 0
+    for dirpath, _, filenames in os.walk(cache_path):
+        for filename in filenames:
+            if filename.endswith(".tmp"):
+                continue  # Still being written by another process.
+            filename = os.path.join(dirpath, filename)
+            try:
+                stat = os.stat(filename)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, filename))
+            total_bytes += stat.st_size
+
+    if total_bytes <= max_bytes:
+        return 0
+
+    n_deleted = 0
+    for _, size, filename in sorted(files):
+        if total_bytes <= target_bytes:
+            break
+        try:
+            os.remove(filename)
+        except FileNotFoundError:
+            pass
+        else:
+            n_deleted += 1
+        total_bytes -= size
+    _LOG.debug(f"Evicted {n_deleted:,d} files from {cache_path}")
+    return n_deleted
+
+
+def get_zarr_store(
+    zarr_path: Union[str, Path], disk_cache_path: Union[None, str, Path], disk_cache_max_gb: float
+) -> Union[str, DiskCacheStore]:
+    """Get the Zarr store to open `zarr_path`, cached on disk if `disk_cache_path` is set.
+
+    Args:
+      zarr_path: The URL (or local path) of one Zarr store.
+      disk_cache_path: The local directory for the disk cache.  If None then don't cache.
+      disk_cache_max_gb: The maximum size of the disk cache, in gigabytes.
+
+    Returns:
+      `zarr_path` if `disk_cache_path` is None, else a DiskCacheStore.
+    """
+    if disk_cache_path is None:
+        return zarr_path
+    return DiskCacheStore(
+        zarr_path, cache_path=disk_cache_path, max_bytes=int(disk_cache_max_gb * 1e9)
+    )
@@ -31,6 +31,15 @@ def get_filesystem(path: Union[str, Path]) -> fsspec.AbstractFileSystem:
     return fsspec.open(path.parent).fs
 
 
+def get_sorted_urls(path: Union[str, Path]) -> List[str]:
+    """Get the full URL of every file or directory matching `path`, in sorted order.
+
+    `path` may include wildcards.  Local paths are returned as `file://` URLs.
+    """
+    filesystem, path = fsspec.core.url_to_fs(str(path))
+    return [filesystem.unstrip_protocol(p) for p in sorted(filesystem.glob(path))]
+
+
 def get_maximum_batch_id(path: Pathy) -> int:
     """
     Get the last batch ID. Works with GCS, AWS, and local.
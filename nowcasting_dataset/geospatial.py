@@ -124,6 +124,50 @@ def calculate_azimuth_and_elevation_angle(
     return solpos[["elevation", "azimuth"]]
 
 
+def calculate_solar_elevation(
+    datetimes: pd.DatetimeIndex, latitudes: np.ndarray, longitudes: np.ndarray
+) -> np.ndarray:
+    """
+    Calculate the solar elevation angle for every datetime at every location, in one go.
+
+    Uses the low-precision algorithm from the Astronomical Almanac, which is accurate to about
+    0.01 degrees between 1950 and 2050, and ignores atmospheric refraction.  This is much
+    faster than calling `pvlib.solarposition.get_solarposition()` for each location.
+
+    Args:
+        datetimes: The datetimes, in UTC.
+        latitudes: The latitude of each location, in degrees.
+        longitudes: The longitude of each location, in degrees.
+
+    Returns: Array of shape (len(datetimes), number of locations) of solar elevation angles,
+    in degrees.
+    """
+    # Days since 2000-01-01 12:00 UTC (J2000.0), shape (n_datetimes, 1).
+    days = (pd.DatetimeIndex(datetimes).asi8 / 86_400e9 - 10_957.5)[:, np.newaxis]
+    latitudes = np.radians(np.asarray(latitudes, dtype=np.float64))[np.newaxis, :]
+    longitudes = np.radians(np.asarray(longitudes, dtype=np.float64))[np.newaxis, :]
+
+    # The Sun's position on the celestial sphere.
+    mean_anomaly = np.radians((357.529 + 0.98560028 * days) % 360)
+    mean_longitude = (280.459 + 0.98564736 * days) % 360
+    ecliptic_longitude = np.radians(
+        mean_longitude + 1.915 * np.sin(mean_anomaly) + 0.020 * np.sin(2 * mean_anomaly)
+    )
+    obliquity = np.radians(23.439 - 0.00000036 * days)
+    right_ascension = np.arctan2(
+        np.cos(obliquity) * np.sin(ecliptic_longitude), np.cos(ecliptic_longitude)
+    )
+    declination = np.arcsin(np.sin(obliquity) * np.sin(ecliptic_longitude))
+
+    # The Sun's position relative to each location.
+    greenwich_mean_sidereal_time = np.radians(((18.697374558 + 24.06570982441908 * days) % 24) * 15)
+    hour_angle = greenwich_mean_sidereal_time + longitudes - right_ascension
+    sin_elevation = np.sin(latitudes) * np.sin(declination) + np.cos(latitudes) * np.cos(
+        declination
+    ) * np.cos(hour_angle)
+    return np.degrees(np.arcsin(np.clip(sin_elevation, -1, 1)))
+
+
 def get_osgb_center_from_list_of_x_and_y_osgb(
     x_osgb: Union[xr.DataArray, List[float], np.ndarray],
     y_osgb: Union[xr.DataArray, List[float], np.ndarray],
@@ -1,9 +1,16 @@
 """Manager class."""
 
+import collections
+import contextlib
+import itertools
 import logging
 import multiprocessing
+import multiprocessing.pool
+import os
+import time
+from numbers import Number
 from pathlib import Path
-from typing import Optional, Union
+from typing import Iterator, Optional, Union
 
 import numpy as np
 import pandas as pd
@@ -12,16 +19,164 @@ import pandas as pd
 import nowcasting_dataset.time as nd_time
 import nowcasting_dataset.utils as nd_utils
 from nowcasting_dataset import config
+from nowcasting_dataset.config.model import BatchFileFormat
 from nowcasting_dataset.consts import (
-    SPATIAL_AND_TEMPORAL_LOCATIONS_COLUMN_NAMES,
+    SPATIAL_AND_TEMPORAL_LOCATIONS_OF_EACH_EXAMPLE_CSV_FILENAME,
     SPATIAL_AND_TEMPORAL_LOCATIONS_OF_EACH_EXAMPLE_FILENAME,
 )
 from nowcasting_dataset.data_sources import ALL_DATA_SOURCE_NAMES, MAP_DATA_SOURCE_NAME_TO_CLASS
+from nowcasting_dataset.data_sources.data_source import (
+    BatchOutput,
+    DataSource,
+    ZarrDataSource,
+    should_validate_batch,
+)
+from nowcasting_dataset.data_sources.satellite.satellite_data_source import SatelliteDataSource
+from nowcasting_dataset.dataset import locations as nd_locations
+from nowcasting_dataset.dataset.batch import Batch
 from nowcasting_dataset.dataset.split import split
+from nowcasting_dataset.dataset.zarr_batches import get_number_of_batches_in_zarr
 from nowcasting_dataset.filesystem import utils as nd_fs_utils
 
 logger = logging.getLogger(__name__)
 
+# The number of examples in each chunk when sampling the locations of each example.
+# This must stay constant so that the locations sampled for a given seed don't change.
+N_EXAMPLES_PER_LOCATIONS_CHUNK = 4096
+
+# The DataSources opened by `_initialise_worker()` in each worker process.
+_data_sources_for_worker: dict[str, DataSource] = {}
+
+# The exception raised whilst opening the DataSources in `_initialise_worker()`, if any.
+_error_initialising_worker: Optional[Exception] = None
+
+
+def _initialise_worker(
+    data_sources: dict[str, DataSource],
+    data_sources_sharing_reads: Optional[dict[str, list[str]]] = None,
+) -> None:
+    """Open `data_sources` once, when each worker process starts.
+
+    The opened DataSources are kept in this worker process until the pool is closed, so they are
+    re-used by every task (across all splits) which runs in this worker process.
+
+    If opening fails then the exception is kept, and raised by every task which runs in this
+    worker process (see `_get_data_sources_for_worker()`).  Raising the exception here instead
+    would kill the worker process, and the pool would keep on replacing it forever.
+
+    Args:
+      data_sources: The DataSources to open.
+      data_sources_sharing_reads: Maps the name of a DataSource to the names of the DataSources
+        which share its reads.  See `Manager._get_data_sources_sharing_reads()`.
+    """
+    global _data_sources_for_worker, _error_initialising_worker
+    start_time = time.time()
+    try:
+        for data_source in data_sources.values():
+            data_source.open()
+        if data_sources_sharing_reads is not None:
+            for data_source_name, other_names in data_sources_sharing_reads.items():
+                if data_source_name not in data_sources:
+                    continue
+                for other_name in other_names:
+                    data_sources[data_source_name].share_reads_with(data_sources[other_name])
+    except Exception as error:
+        logger.exception(f"Worker process {os.getpid()} failed to open the DataSources!")
+        _error_initialising_worker = error
+        return
+    _error_initialising_worker = None
+    _data_sources_for_worker = data_sources
+    logger.info(
+        f"Worker process {os.getpid()} opened {list(data_sources.keys())} in"
+        f" {time.time() - start_time:.1f} seconds."
+    )
+
+
+def _get_data_sources_for_worker() -> dict[str, DataSource]:
+    """Get the DataSources opened by `_initialise_worker()`, or raise its exception."""
+    if _error_initialising_worker is not None:
+        raise _error_initialising_worker
+    return _data_sources_for_worker
+
+
+def _get_locations_in_worker(
+    data_source_name: str, t0_datetimes: pd.DatetimeIndex, seed_sequence: np.random.SeedSequence
+) -> tuple[list[Number], list[Number]]:
+    """Call `get_locations()` on a DataSource opened by `_initialise_worker()`."""
+    return _get_data_sources_for_worker()[data_source_name].get_locations(
+        t0_datetimes, rng=np.random.default_rng(seed_sequence)
+    )
+
+
+def _create_batches_in_worker(
+    data_source_name: str,
+    locations_filename: Path,
+    idx_of_first_example: int,
+    idx_of_last_example: int,
+    other_outputs: Optional[dict[str, dict]] = None,
+    **kwargs,
+) -> None:
+    """Call `create_batches()` on a DataSource opened by `_initialise_worker()`.
+
+    Only reads rows [idx_of_first_example, idx_of_last_example) of the locations file.
+
+    `other_outputs` maps the name of each other DataSource (opened by `_initialise_worker()`)
+    to the rest of the arguments for its `BatchOutput`.
+    """
+    data_sources = _get_data_sources_for_worker()
+    locations = nd_locations.load_locations(
+        locations_filename, start_row=idx_of_first_example, end_row=idx_of_last_example
+    )
+    other_outputs = [
+        BatchOutput(data_source=data_sources[other_name], **output_kwargs)
+        for other_name, output_kwargs in (other_outputs or {}).items()
+    ]
+    data_sources[data_source_name].create_batches(
+        spatial_and_temporal_locations_of_each_example=locations,
+        open_data_source=False,
+        other_outputs=other_outputs,
+        **kwargs,
+    )
+
+
+def _get_batch_in_worker(locations: pd.DataFrame, validate: bool = True) -> Batch:
+    """Get one Batch from all the DataSources opened by `_initialise_worker()`."""
+    batch = {
+        data_source_name: data_source.get_batch(
+            t0_datetimes=locations.t0_datetime_UTC,
+            x_locations=locations.x_center_OSGB,
+            y_locations=locations.y_center_OSGB,
+            validate=validate,
+        )
+        for data_source_name, data_source in _get_data_sources_for_worker().items()
+    }
+    return Batch(batch_size=len(locations), **batch)
+
+
+def _get_worker_pids(pool: multiprocessing.pool.Pool) -> set[int]:
+    """Get the process IDs of the worker processes of `pool`."""
+    return {process.pid for process in pool._pool}
+
+
+def _wait_for_async_results(
+    async_results: list[multiprocessing.pool.AsyncResult],
+    pools: dict[str, multiprocessing.pool.Pool],
+    poll_seconds: float = 10,
+) -> None:
+    """Wait for every result, raising a RuntimeError if any worker process dies.
+
+    The pools never replace healthy workers.  If a worker dies (e.g. it's killed by the OOM
+    killer) then the pool replaces it, but the task it was running is lost, and waiting for
+    that task's result would block forever.
+    """
+    worker_pids = {name: _get_worker_pids(pool) for name, pool in pools.items()}
+    for async_result in async_results:
+        while not async_result.ready():
+            async_result.wait(timeout=poll_seconds)
+            for name, pool in pools.items():
+                if _get_worker_pids(pool) != worker_pids[name]:
+                    raise RuntimeError(f"A worker process for {name} died whilst creating batches!")
+
 
 class Manager:
     """The Manager initialises and manage a dict of DataSource objects.
@@ -116,6 +271,9 @@ class Manager:
             )
 
             data_source_class = MAP_DATA_SOURCE_NAME_TO_CLASS[data_source_name]
+            if issubclass(data_source_class, ZarrDataSource):
+                load_each_t0_once = self.config.process.group_examples_by_t0
+                config_for_data_source["load_each_t0_once"] = load_each_t0_once
             try:
                 data_source = data_source_class(**config_for_data_source)
             except Exception:
@@ -123,6 +281,10 @@ class Manager:
                 raise
             self.data_sources[data_source_name] = data_source
 
+            # Check the satellite index once, here, instead of in every worker process.
+            if isinstance(data_source, SatelliteDataSource):
+                data_source.update_index()
+
         # Set data_source_which_defines_geospatial_locations:
         try:
             self.data_source_which_defines_geospatial_locations = self.data_sources[
@@ -147,17 +309,20 @@ class Manager:
     def create_files_specifying_spatial_and_temporal_locations_of_each_example_if_necessary(
         self,
     ) -> None:
-        """Creates CSV files specifying the locations of each example if those files don't exist yet.
+        """Creates files specifying the locations of each example if those files don't exist yet.
 
         Creates one file per split, in this location:
 
-        `<output_data.filepath> / <split_name> / spatial_and_temporal_locations_of_each_example.csv`
+        `<output_data.filepath> / <split_name> / spatial_and_temporal_locations_of_each_example.npy`
+
+        See `nowcasting_dataset.dataset.locations` for the file format.  If
+        `config.process.export_locations_csv` is True then also saves the locations as a CSV file.
 
         Creates the output directory if it does not exist.
 
         Works on any compute environment.
         """
-        if self._locations_csv_file_exists():
+        if self._locations_file_exists():
             logger.info(
                 f"{SPATIAL_AND_TEMPORAL_LOCATIONS_OF_EACH_EXAMPLE_FILENAME} already exists!"
             )
@@ -166,21 +331,11 @@ class Manager:
             f"{SPATIAL_AND_TEMPORAL_LOCATIONS_OF_EACH_EXAMPLE_FILENAME} does not exist so"
             " will create..."
         )
-        t0_datetimes = self.get_t0_datetimes_across_all_data_sources(
-            freq=self.config.process.t0_datetime_frequency
-        )
-        # TODO: move hard code values to config file #426
-        split_t0_datetimes = split.split_data(
-            datetimes=t0_datetimes,
-            method=self.config.process.split_method,
-            train_test_validation_split=(3, 0, 1),
-            train_validation_test_datetime_split=[
-                pd.Timestamp("2020-01-01"),
-                pd.Timestamp("2021-01-01"),
-            ],
-        )
-        for split_name, datetimes_for_split in split_t0_datetimes._asdict().items():
-            path_for_csv = self.config.output_data.filepath / split_name
+        split_t0_datetimes = self._get_t0_datetimes_for_each_split()
+        for split_number, (split_name, datetimes_for_split) in enumerate(
+            split_t0_datetimes._asdict().items()
+        ):
+            path_for_split = self.config.output_data.filepath / split_name
             n_batches_requested = self._get_n_batches_requested_for_split_name(split_name)
             if (n_batches_requested == 0 and len(datetimes_for_split) != 0) or (
                 len(datetimes_for_split) == 0 and n_batches_requested != 0
@@ -196,7 +351,9 @@ class Manager:
                 logger.error(msg)
                 raise RuntimeError(msg)
             if n_batches_requested == 0:
-                logger.info(f"0 batches requested for {split_name} so won't create {path_for_csv}")
+                logger.info(
+                    f"0 batches requested for {split_name} so won't create {path_for_split}"
+                )
                 continue
             n_examples = n_batches_requested * self.config.process.batch_size
             logger.debug(
@@ -204,35 +361,97 @@ class Manager:
                 f" examples per batch = {n_examples:,d} examples for {split_name}."
             )
             df_of_locations = self.sample_spatial_and_temporal_locations_for_examples(
-                t0_datetimes=datetimes_for_split, n_examples=n_examples
+                t0_datetimes=datetimes_for_split,
+                n_examples=n_examples,
+                seed=[self.config.process.seed, split_number],
+                n_workers=self.config.process.n_workers_for_sampling_locations,
             )
-            output_filename = self._filename_of_locations_csv_file(split_name)
-            logger.info(f"Making {path_for_csv} if it does not exist.")
-            nd_fs_utils.makedirs(path_for_csv, exist_ok=True)
+            if self._sort_examples_within_each_batch:
+                df_of_locations = nd_locations.sort_locations_within_each_batch(
+                    df_of_locations, batch_size=self.config.process.batch_size
+                )
+            output_filename = self._filename_of_locations_file(split_name)
+            logger.info(f"Making {path_for_split} if it does not exist.")
+            nd_fs_utils.makedirs(path_for_split, exist_ok=True)
             logger.debug(f"Writing {output_filename}")
-            df_of_locations.to_csv(output_filename)
+            nd_locations.save_locations(df_of_locations, output_filename)
+            if self.config.process.export_locations_csv:
+                output_filename = self._filename_of_locations_csv_file(split_name)
+                logger.debug(f"Writing {output_filename}")
+                df_of_locations.to_csv(output_filename)
+
+    @property
+    def _sort_examples_within_each_batch(self) -> bool:
+        return (
+            self.config.process.sort_examples_within_each_batch
+            or self.config.process.group_examples_by_t0
+        )
+
+    def _get_t0_datetimes_for_each_split(self) -> split.SplitDateTimes:
+        """Get the t0 datetimes available across all DataSources, for each split."""
+        t0_datetimes = self.get_t0_datetimes_across_all_data_sources(
+            freq=self.config.process.t0_datetime_frequency
+        )
+        # TODO: move hard code values to config file #426
+        return split.split_data(
+            datetimes=t0_datetimes,
+            method=self.config.process.split_method,
+            train_test_validation_split=(3, 0, 1),
+            train_validation_test_datetime_split=[
+                pd.Timestamp("2020-01-01"),
+                pd.Timestamp("2021-01-01"),
+            ],
+        )
 
     def _get_n_batches_requested_for_split_name(self, split_name: str) -> int:
         return getattr(self.config.process, f"n_{split_name}_batches")
 
-    def _filename_of_locations_csv_file(self, split_name: str) -> Path:
+    def _filename_of_locations_file(self, split_name: str) -> Path:
         return (
             self.config.output_data.filepath
             / split_name
             / SPATIAL_AND_TEMPORAL_LOCATIONS_OF_EACH_EXAMPLE_FILENAME
         )
 
-    def _locations_csv_file_exists(self) -> bool:
-        """Check if filepath/train/spatial_and_temporal_locations_of_each_example.csv exists."""
-        filename = self._filename_of_locations_csv_file(split_name=split.SplitName.TRAIN.value)
+    def _filename_of_locations_csv_file(self, split_name: str) -> Path:
+        return (
+            self.config.output_data.filepath
+            / split_name
+            / SPATIAL_AND_TEMPORAL_LOCATIONS_OF_EACH_EXAMPLE_CSV_FILENAME
+        )
+
+    def _locations_file_exists(self) -> bool:
+        """Check if filepath/train/spatial_and_temporal_locations_of_each_example.npy exists.
+
+        Also returns True if only the CSV file exists (from older versions of
+        nowcasting_dataset).
+        """
+        for filename in (
+            self._filename_of_locations_file(split_name=split.SplitName.TRAIN.value),
+            self._filename_of_locations_csv_file(split_name=split.SplitName.TRAIN.value),
+        ):
+            try:
+                nd_fs_utils.check_path_exists(filename)
+            except FileNotFoundError:
+                logging.info(f"{filename} does not exist!")
+            else:
+                logger.info(f"{filename} exists!")
+                return True
+        return False
+
+    def _convert_locations_csv_file_if_necessary(self, split_name: str) -> None:
+        """Convert the locations CSV file to a .npy file, if only the CSV file exists.
+
+        Older versions of nowcasting_dataset only saved the locations of each example as CSV.
+        """
+        filename = self._filename_of_locations_file(split_name)
         try:
             nd_fs_utils.check_path_exists(filename)
         except FileNotFoundError:
-            logging.info(f"{filename} does not exist!")
-            return False
-        else:
-            logger.info(f"{filename} exists!")
-            return True
+            csv_filename = self._filename_of_locations_csv_file(split_name)
+            logger.info(f"{filename} does not exist, so converting {csv_filename}.")
+            locations = nd_locations.load_locations_from_csv(csv_filename)
+            nd_locations.save_locations(locations, filename)
 
     def get_t0_datetimes_across_all_data_sources(
         self, freq: Union[str, pd.Timedelta]
@@ -286,7 +505,11 @@ class Manager:
         return t0_datetimes
 
     def sample_spatial_and_temporal_locations_for_examples(
-        self, t0_datetimes: pd.DatetimeIndex, n_examples: int
+        self,
+        t0_datetimes: pd.DatetimeIndex,
+        n_examples: int,
+        seed: Optional[Union[int, list[int]]] = None,
+        n_workers: int = 1,
     ) -> pd.DataFrame:
         """
         Computes the geospatial and temporal locations for each training example.
@@ -294,24 +517,59 @@ class Manager:
         The first data_source in this DataSourceList defines the geospatial locations of
         each example.
 
+        The examples are sampled in chunks of `N_EXAMPLES_PER_LOCATIONS_CHUNK`.  Each chunk
+        gets its own random number generator, spawned from `seed`, so the output for a given
+        `seed` is identical, whatever the value of `n_workers`.
+
         Args:
             t0_datetimes: All available t0 datetimes.  Can be computed with
                 `DataSourceList.get_t0_datetimes_across_all_data_sources()`
             n_examples: The number of examples requested.
+            seed: The seed for the random number generators.  If None then the output will be
+                different every time.
+            n_workers: The number of processes used to compute the locations of each chunk.
 
         Returns:
             Each row of each the DataFrame specifies the position of each example, using
             columns: 't0_datetime_UTC', 'x_center_OSGB', 'y_center_OSGB'.
         """
         assert len(t0_datetimes) > 0
-        shuffled_t0_datetimes = np.random.choice(t0_datetimes, size=n_examples)
-        # TODO: Issue #304. Speed this up by splitting the shuffled_t0_datetimes across
-        # multiple processors.  Currently takes about half an hour for 25,000 batches.
-        # But wait until we've implemented issue #305, as that is likely to be sufficient!
-        (
-            x_locations,
-            y_locations,
-        ) = self.data_source_which_defines_geospatial_locations.get_locations(shuffled_t0_datetimes)
+        seed_sequence = np.random.SeedSequence(seed)
+        rng = np.random.default_rng(seed_sequence)
+        shuffled_t0_datetimes = pd.DatetimeIndex(rng.choice(t0_datetimes, size=n_examples))
+
+        # Split the examples into chunks, each with its own random number generator.
+        chunk_start_idxs = range(0, n_examples, N_EXAMPLES_PER_LOCATIONS_CHUNK)
+        args_for_each_chunk = zip(
+            [
+                shuffled_t0_datetimes[i : i + N_EXAMPLES_PER_LOCATIONS_CHUNK]
+                for i in chunk_start_idxs
+            ],
+            seed_sequence.spawn(len(chunk_start_idxs)),
+        )
+
+        data_source = self.data_source_which_defines_geospatial_locations
+        if n_workers > 1:
+            nd_utils.set_fsspec_for_multiprocess()
+            with multiprocessing.Pool(
+                processes=n_workers,
+                initializer=_initialise_worker,
+                initargs=({"geospatial_locations": data_source},),
+            ) as pool:
+                locations_for_each_chunk = pool.starmap(
+                    _get_locations_in_worker,
+                    [("geospatial_locations", *args) for args in args_for_each_chunk],
+                )
+        else:
+            locations_for_each_chunk = [
+                data_source.get_locations(
+                    t0_datetimes_for_chunk, rng=np.random.default_rng(seed_sequence_for_chunk)
+                )
+                for t0_datetimes_for_chunk, seed_sequence_for_chunk in args_for_each_chunk
+            ]
+
+        x_locations = list(itertools.chain(*[x for x, _ in locations_for_each_chunk]))
+        y_locations = list(itertools.chain(*[y for _, y in locations_for_each_chunk]))
         return pd.DataFrame(
             {
                 "t0_datetime_UTC": shuffled_t0_datetimes,
@@ -341,17 +599,27 @@ class Manager:
         # If we're not overwriting batches then find the last batch on disk.
         for split_name in split.SplitName:
             for data_source_name in self.data_sources:
-                path = (
-                    self.config.output_data.filepath / split_name.value / data_source_name / "*.nc"
-                )
+                dst_path = self._get_dst_path(split_name, data_source_name)
+                if self.config.output_data.batch_file_format == BatchFileFormat.ZARR:
+                    # The length of the Zarr store is the number of complete batches.
+                    n_batches_on_disk = get_number_of_batches_in_zarr(dst_path)
+                    first_batches_to_create[split_name][data_source_name] = n_batches_on_disk
+                    continue
                 try:
-                    max_batch_id_on_disk = nd_fs_utils.get_maximum_batch_id(path)
+                    max_batch_id_on_disk = nd_fs_utils.get_maximum_batch_id(dst_path / "*.nc")
                 except FileNotFoundError:
                     max_batch_id_on_disk = -1
                 first_batches_to_create[split_name][data_source_name] = max_batch_id_on_disk + 1
 
         return first_batches_to_create
 
+    def _get_dst_path(self, split_name: split.SplitName, data_source_name: str) -> Path:
+        """Get the directory (or, for Zarr, the store) to save the batches to."""
+        path = self.config.output_data.filepath / split_name.value
+        if self.config.output_data.batch_file_format == BatchFileFormat.ZARR:
+            return path / f"{data_source_name}.zarr"
+        return path / data_source_name
+
     def _check_if_more_batches_are_required_for_split(
         self,
         split_name: split.SplitName,
@@ -388,6 +656,16 @@ class Manager:
             previously been written to disk. If False then check which batches have previously been
             written to disk, and only create any batches which have not yet been written to disk.
         """
+        if (
+            self.config.output_data.batch_file_format == BatchFileFormat.ZARR
+            and self.config.process.upload_every_n_batches > 0
+        ):
+            raise ValueError(
+                "Batches are appended directly to the Zarr stores in output_data.filepath, so"
+                " Zarr output needs process.upload_every_n_batches to be 0, not"
+                f" {self.config.process.upload_every_n_batches}"
+            )
+
         first_batches_to_create = self._get_first_batches_to_create(overwrite_batches)
 
         # Check if there's any work to do.
@@ -405,93 +683,301 @@ class Manager:
                 logger.info("All batches have already been created!  No work to do!")
                 return
 
-        # Load locations for each example off disk.
-        locations_for_each_example_of_each_split: dict[split.SplitName, pd.DataFrame] = {}
+        # Find the number of examples in each split.  The workers will each load the rows
+        # they need from the locations file.
+        n_examples_for_each_split: dict[split.SplitName, int] = {}
         for split_name in splits_which_need_more_batches:
-            filename = self._filename_of_locations_csv_file(split_name.value)
-            logger.info(f"Loading {filename}.")
-            locations_for_each_example = pd.read_csv(filename, index_col=0)
-            assert locations_for_each_example.columns.to_list() == list(
-                SPATIAL_AND_TEMPORAL_LOCATIONS_COLUMN_NAMES
-            )
-            # Converting to datetimes is much faster using `pd.to_datetime()` than
-            # passing `parse_datetimes` into `pd.read_csv()`.
-            locations_for_each_example["t0_datetime_UTC"] = pd.to_datetime(
-                locations_for_each_example["t0_datetime_UTC"]
-            )
-            if len(locations_for_each_example) > 0:
-                locations_for_each_example_of_each_split[split_name] = locations_for_each_example
-
-        # Fire up a separate process for each DataSource, and pass it a list of batches to
-        # create, and whether to utils.upload_and_delete_local_files().
+            self._convert_locations_csv_file_if_necessary(split_name.value)
+            filename = self._filename_of_locations_file(split_name.value)
+            n_examples = nd_locations.get_number_of_locations(filename)
+            logger.info(f"{filename} has {n_examples:,d} examples.")
+            if n_examples > 0:
+                n_examples_for_each_split[split_name] = n_examples
+
+        # Fire up a pool of `n_workers` processes for each DataSource.  The pools live for
+        # the whole of this method, so each worker process opens its DataSource once, and
+        # then creates batches for every split.  The workers for each DataSource claim batch
+        # IDs from a shared queue, so the workers for each DataSource keep going until all
+        # the batches for that DataSource have been created.
+        # DataSources which share the reads of another DataSource don't get their own pool.
+        # Instead, the workers for the other DataSource create their batches too.
         # TODO: Issue 321: Split this up into separate functions!!!
-        n_data_sources = len(self.data_sources)
+        n_workers_per_data_source = self._get_n_workers_per_data_source()
+        data_sources_sharing_reads = self._get_data_sources_sharing_reads()
+        names_of_data_sources_sharing_reads = list(
+            itertools.chain.from_iterable(data_sources_sharing_reads.values())
+        )
+        save_batches_as_zarr = self.config.output_data.batch_file_format == BatchFileFormat.ZARR
+        if save_batches_as_zarr and max(n_workers_per_data_source.values()) > 1:
+            raise ValueError(
+                "Batches are appended to Zarr stores in order, so Zarr output needs one worker"
+                f" per DataSource, not {n_workers_per_data_source}"
+            )
         nd_utils.set_fsspec_for_multiprocess()
-        for split_name, locations_for_split in locations_for_each_example_of_each_split.items():
-            with multiprocessing.Pool(processes=n_data_sources) as pool:
-                async_results_from_create_batches = []
-                for worker_id, (data_source_name, data_source) in enumerate(
-                    self.data_sources.items()
-                ):
-
-                    # Get indexes of first batch and example. And subset locations_for_split.
-                    idx_of_first_batch = first_batches_to_create[split_name][data_source_name]
-                    idx_of_first_example = idx_of_first_batch * self.config.process.batch_size
-                    locations = locations_for_split.loc[idx_of_first_example:]
-
-                    # Get paths.
-                    dst_path = (
-                        self.config.output_data.filepath / split_name.value / data_source_name
+        with multiprocessing.Manager() as sync_manager, contextlib.ExitStack() as stack:
+            pools = {
+                data_source_name: stack.enter_context(
+                    multiprocessing.Pool(
+                        processes=n_workers_per_data_source[data_source_name],
+                        initializer=_initialise_worker,
+                        initargs=(
+                            {
+                                name: self.data_sources[name]
+                                for name in [
+                                    data_source_name,
+                                    *data_sources_sharing_reads.get(data_source_name, []),
+                                ]
+                            },
+                            data_sources_sharing_reads,
+                        ),
                     )
+                )
+                for data_source_name in self.data_sources
+                if data_source_name not in names_of_data_sources_sharing_reads
+            }
 
-                    # TODO: Issue 455: Guarantee that local temp path is unique and empty.
-                    local_temp_path = (
-                        self.local_temp_path
-                        / split_name.value
-                        / data_source_name
-                        / f"worker_{worker_id}"
+            async_results_from_create_batches = []
+            # Keep a reference to every queue until all the batches have been created.  The
+            # sync manager frees each queue as soon as its last proxy in this process is
+            # deleted, which can be before the workers have received their tasks.
+            batch_idx_queues = []
+            for split_name, n_examples in n_examples_for_each_split.items():
+                locations_filename = self._filename_of_locations_file(split_name.value)
+                for data_source_name, pool in pools.items():
+                    other_names = data_sources_sharing_reads.get(data_source_name, [])
+
+                    # Get indexes of first batch and example.  DataSources which share reads
+                    # create the same batches, so start from the first batch that any of them
+                    # is missing.
+                    idx_of_first_batch = min(
+                        first_batches_to_create[split_name][name]
+                        for name in [data_source_name, *other_names]
                     )
+                    idx_of_first_example = idx_of_first_batch * self.config.process.batch_size
+                    n_examples_to_create = n_examples - idx_of_first_example
+                    n_batches = n_examples_to_create // self.config.process.batch_size
 
-                    # Make folders.
-                    nd_fs_utils.makedirs(dst_path, exist_ok=True)
-                    if self.save_batches_locally_and_upload:
-                        nd_fs_utils.makedirs(local_temp_path, exist_ok=True)
-
-                    # Key word arguments to be passed into data_source.create_batches():
-                    kwargs_for_create_batches = dict(
-                        spatial_and_temporal_locations_of_each_example=locations,
-                        idx_of_first_batch=idx_of_first_batch,
-                        batch_size=self.config.process.batch_size,
-                        dst_path=dst_path,
-                        local_temp_path=local_temp_path,
-                        upload_every_n_batches=self.config.process.upload_every_n_batches,
-                    )
+                    # Fill the queue of batch IDs which the workers will claim.
+                    batch_idx_queue = sync_manager.Queue()
+                    batch_idx_queues.append(batch_idx_queue)
+                    for batch_idx in range(idx_of_first_batch, idx_of_first_batch + n_batches):
+                        batch_idx_queue.put(batch_idx)
 
-                    # Logger messages for callbacks:
-                    callback_msg = (
-                        f"{data_source_name} has finished created batches for {split_name}!"
-                    )
-                    error_callback_msg = (
-                        f"Exception raised by {data_source_name} whilst creating batches for"
-                        f" {split_name}:\n"
-                    )
+                    # Get paths.
+                    dst_path = self._get_dst_path(split_name, data_source_name)
+                    if not save_batches_as_zarr:
+                        nd_fs_utils.makedirs(dst_path, exist_ok=True)
+                        for other_name in other_names:
+                            nd_fs_utils.makedirs(
+                                self._get_dst_path(split_name, other_name), exist_ok=True
+                            )
+
+                    for worker_id in range(n_workers_per_data_source[data_source_name]):
+                        # TODO: Issue 455: Guarantee that local temp path is unique and empty.
+                        local_temp_path = (
+                            self.local_temp_path
+                            / split_name.value
+                            / data_source_name
+                            / f"worker_{worker_id}"
+                        )
+                        if self.save_batches_locally_and_upload:
+                            nd_fs_utils.makedirs(local_temp_path, exist_ok=True)
+
+                        # The DataSources which share this DataSource's reads write their
+                        # batches alongside its batches.
+                        other_outputs = {}
+                        for other_name in other_names:
+                            other_local_temp_path = (
+                                self.local_temp_path
+                                / split_name.value
+                                / other_name
+                                / f"worker_{worker_id}"
+                            )
+                            if self.save_batches_locally_and_upload:
+                                nd_fs_utils.makedirs(other_local_temp_path, exist_ok=True)
+                            other_outputs[other_name] = dict(
+                                dst_path=self._get_dst_path(split_name, other_name),
+                                local_temp_path=other_local_temp_path,
+                                batch_file_encoding=(
+                                    self.config.output_data.batch_file_encoding.get(other_name)
+                                ),
+                            )
+
+                        # Key word arguments to be passed into data_source.create_batches():
+                        kwargs_for_create_batches = dict(
+                            data_source_name=data_source_name,
+                            locations_filename=locations_filename,
+                            idx_of_first_example=idx_of_first_example,
+                            idx_of_last_example=(
+                                idx_of_first_example + n_batches * self.config.process.batch_size
+                            ),
+                            idx_of_first_batch=idx_of_first_batch,
+                            batch_size=self.config.process.batch_size,
+                            dst_path=dst_path,
+                            local_temp_path=local_temp_path,
+                            upload_every_n_batches=self.config.process.upload_every_n_batches,
+                            max_batches_waiting_to_be_written=(
+                                self.config.process.max_batches_waiting_to_be_written
+                            ),
+                            batch_idx_queue=batch_idx_queue,
+                            validation_level=self.config.process.validation_level,
+                            validate_every_n_batches=self.config.process.validate_every_n_batches,
+                            batch_file_encoding=(
+                                self.config.output_data.batch_file_encoding.get(data_source_name)
+                            ),
+                            batch_file_format=self.config.output_data.batch_file_format,
+                            other_outputs=other_outputs,
+                        )
+
+                        # Logger messages for callbacks:
+                        callback_msg = (
+                            f"{data_source_name} worker {worker_id} has finished creating"
+                            f" batches for {split_name}!"
+                        )
+                        error_callback_msg = (
+                            f"Exception raised by {data_source_name} worker {worker_id} whilst"
+                            f" creating batches for {split_name}:\n"
+                        )
+
+                        # Submit data_source.create_batches task to the worker process.
+                        logger.debug(
+                            f"About to submit create_batches task for {data_source_name},"
+                            f" worker {worker_id}, {split_name}"
+                        )
+                        async_result = pool.apply_async(
+                            _create_batches_in_worker,
+                            kwds=kwargs_for_create_batches,
+                            callback=lambda result, msg=callback_msg: logger.info(msg),
+                            error_callback=lambda exception, msg=error_callback_msg: (
+                                logger.error(msg + str(exception))
+                            ),
+                        )
+                        async_results_from_create_batches.append(async_result)
+
+            # Wait for all async_results to finish:
+            _wait_for_async_results(async_results_from_create_batches, pools)
+
+            logger.info("Finished creating batches!")
+
+    def generate_batches(
+        self,
+        split_name: split.SplitName = split.SplitName.TRAIN,
+        n_batches: Optional[int] = None,
+        n_workers: int = 1,
+        n_batches_to_prefetch: Optional[int] = None,
+        seed: Optional[int] = None,
+    ) -> Iterator[Batch]:
+        """Yield freshly sampled Batches, straight from the DataSources, without saving to disk.
+
+        Useful for quick experiments.  Each worker process opens every DataSource once, and
+        then calls `get_batch()` on each DataSource.  The locations of the examples in each
+        batch are sampled using `sample_spatial_and_temporal_locations_for_examples()`.
 
-                    # Submit data_source.create_batches task to the worker process.
-                    logger.debug(
-                        f"About to submit create_batches task for {data_source_name}, {split_name}"
-                    )
-                    async_result = pool.apply_async(
-                        data_source.create_batches,
-                        kwds=kwargs_for_create_batches,
-                        callback=lambda result: logger.info(callback_msg),
-                        error_callback=lambda exception: logger.error(
-                            error_callback_msg + str(exception)
+        Args:
+          split_name: The split to sample t0 datetimes from.
+          n_batches: The number of batches to yield.  If None then yield batches forever.
+          n_workers: The number of worker processes creating batches in parallel.
+          n_batches_to_prefetch: The maximum number of batches which are being created (or are
+            waiting to be yielded) at any one time.  Defaults to 2 x n_workers.
+          seed: The seed for sampling the locations of the examples.  If None then the batches
+            will be different every time.
+
+        Yields:
+          Batch objects, in the order they were requested.
+        """
+        assert n_workers > 0
+        if n_batches_to_prefetch is None:
+            n_batches_to_prefetch = 2 * n_workers
+        assert n_batches_to_prefetch > 0
+
+        t0_datetimes = getattr(self._get_t0_datetimes_for_each_split(), split_name.value)
+        if len(t0_datetimes) == 0:
+            raise RuntimeError(f"There are no t0 datetimes in {split_name}!")
+        batch_idxs = itertools.count() if n_batches is None else range(n_batches)
+
+        def _sample_locations_for_batch(batch_idx: int) -> pd.DataFrame:
+            locations = self.sample_spatial_and_temporal_locations_for_examples(
+                t0_datetimes=t0_datetimes,
+                n_examples=self.config.process.batch_size,
+                seed=None if seed is None else [seed, batch_idx],
+            )
+            if self._sort_examples_within_each_batch:
+                locations = nd_locations.sort_locations_within_each_batch(
+                    locations, batch_size=self.config.process.batch_size
+                )
+            return locations
+
+        nd_utils.set_fsspec_for_multiprocess()
+        with multiprocessing.Pool(
+            processes=n_workers,
+            initializer=_initialise_worker,
+            initargs=(self.data_sources, self._get_data_sources_sharing_reads()),
+        ) as pool:
+            # Keep the queue of prefetched batches topped up, and yield batches in order.
+            async_results = collections.deque()
+            for batch_idx in batch_idxs:
+                async_results.append(
+                    pool.apply_async(
+                        _get_batch_in_worker,
+                        args=(
+                            _sample_locations_for_batch(batch_idx),
+                            should_validate_batch(
+                                batch_idx,
+                                self.config.process.validation_level,
+                                self.config.process.validate_every_n_batches,
+                            ),
                         ),
                     )
-                    async_results_from_create_batches.append(async_result)
+                )
+                if len(async_results) >= n_batches_to_prefetch:
+                    yield async_results.popleft().get()
+            while async_results:
+                yield async_results.popleft().get()
 
-                # Wait for all async_results to finish:
-                for async_result in async_results_from_create_batches:
-                    async_result.wait()
+    def _get_n_workers_per_data_source(self) -> dict[str, int]:
+        """Get the number of worker processes to use for each DataSource.
 
-                logger.info(f"Finished creating batches for {split_name}!")
+        DataSources which are not listed in `config.process.n_workers_per_data_source` get one
+        worker.
+        """
+        n_workers_per_data_source = self.config.process.n_workers_per_data_source
+        unknown_data_source_names = set(n_workers_per_data_source) - set(self.data_sources)
+        if unknown_data_source_names:
+            logger.warning(
+                "process.n_workers_per_data_source includes DataSources which are not being used:"
+                f" {unknown_data_source_names}"
+            )
+        return {
+            data_source_name: n_workers_per_data_source.get(data_source_name, 1)
+            for data_source_name in self.data_sources
+        }
+
+    def _get_data_sources_sharing_reads(self) -> dict[str, list[str]]:
+        """Map the name of each DataSource whose reads are shared to the names of the
+        DataSources which share them.  See `config.process.share_satellite_reads`.
+
+        Raises:
+          ValueError: If `share_satellite_reads` is set, but the satellite DataSources can't
+            share reads.
+        """
+        if not self.config.process.share_satellite_reads:
+            return {}
+        if "satellite" not in self.data_sources or "hrvsatellite" not in self.data_sources:
+            logger.warning(
+                "process.share_satellite_reads is set, but the satellite and hrvsatellite"
+                " DataSources are not both being used, so their reads will not be shared."
+            )
+            return {}
+        satellite = self.data_sources["satellite"]
+        hrvsatellite = self.data_sources["hrvsatellite"]
+        if satellite.zarr_path != hrvsatellite.zarr_path:
+            raise ValueError(
+                "process.share_satellite_reads requires the satellite and hrvsatellite"
+                f" DataSources to read the same Zarr store, not {satellite.zarr_path} and"
+                f" {hrvsatellite.zarr_path}"
+            )
+        if satellite.max_chunks_in_cache == 0:
+            raise ValueError(
+                "process.share_satellite_reads requires satellite_max_chunks_in_cache > 0"
+            )
+        return {"satellite": ["hrvsatellite"]}
@@ -1,13 +1,17 @@
 """ Time functions """
+import hashlib
 import logging
+import os
 import random
 import warnings
 from typing import Dict, Iterable, List, Optional, Tuple
 
+import fsspec
 import numpy as np
 import pandas as pd
 import pvlib
 
+import nowcasting_dataset.filesystem.utils as nd_fs_utils
 from nowcasting_dataset import geospatial, utils
 
 logger = logging.getLogger(__name__)
@@ -19,7 +23,10 @@ ONE_HOUR = pd.Timedelta("1 hour")
 
 
 def select_daylight_datetimes(
-    datetimes: pd.DatetimeIndex, locations: Iterable[Tuple[float, float]], ghi_threshold: float = 10
+    datetimes: pd.DatetimeIndex,
+    locations: Iterable[Tuple[float, float]],
+    ghi_threshold: float = 10,
+    cache_path: Optional[str] = None,
 ) -> pd.DatetimeIndex:
     """
     Select only the day time datetimes
@@ -28,33 +35,132 @@ def select_daylight_datetimes(
         datetimes: DatetimeIndex to filter.
         locations: List of Tuples of x, y coordinates in OSGB projection.
         For example, use the four corners of the satellite imagery.
-        ghi_threshold: Global horizontal irradiance threshold.
-          (Watts per square meter?)
+        ghi_threshold: Global horizontal irradiance threshold, in watts per square meter.
+        cache_path: If set, then save the daylight mask in this directory, and load it from
+          there next time.  See `load_or_compute_daylight_mask()`.
 
-    Returns: datetimes for which the global horizontal irradiance (GHI) is above ghi_threshold
-    across all locations.
+    Returns: datetimes for which the clear-sky global horizontal irradiance (GHI) is above
+    ghi_threshold for at least one location.
 
     """
-    ghi_for_all_locations = []
-    for x, y in locations:
-        lat, lon = geospatial.osgb_to_lat_lon(x, y)
-        location = pvlib.location.Location(latitude=lat, longitude=lon)
-        with warnings.catch_warnings():
-            # PyTables triggers a DeprecationWarning in Numpy >= 1.20:
-            # "tables/array.py:241: DeprecationWarning: `np.object` is a
-            # deprecated alias for the builtin `object`."
-            # See https://github.com/PyTables/PyTables/issues/898
-            warnings.filterwarnings("ignore", category=DeprecationWarning)
-            clearsky = location.get_clearsky(datetimes)
-        ghi = clearsky["ghi"]
-        ghi_for_all_locations.append(ghi)
-
-    ghi_for_all_locations = pd.concat(ghi_for_all_locations, axis="columns")
-    max_ghi = ghi_for_all_locations.max(axis="columns")
-    mask = max_ghi > ghi_threshold
+    if cache_path is None:
+        mask = compute_daylight_mask(datetimes, locations, ghi_threshold=ghi_threshold)
+    else:
+        mask = load_or_compute_daylight_mask(
+            datetimes, locations, ghi_threshold=ghi_threshold, cache_path=cache_path
+        )
     return datetimes[mask]
 
 
+def compute_daylight_mask(
+    datetimes: pd.DatetimeIndex, locations: Iterable[Tuple[float, float]], ghi_threshold: float
+) -> np.ndarray:
+    """
+    Compute a boolean mask which is True where it's daylight at any of the locations.
+
+    The clear-sky GHI is computed with pvlib's Ineichen model (the default model of
+    `pvlib.location.Location.get_clearsky()`), but for all datetimes and locations at once, using
+    the solar elevation from `geospatial.calculate_solar_elevation()`.
+
+    Args:
+        datetimes: DatetimeIndex to compute the mask for.
+        locations: List of Tuples of x, y coordinates in OSGB projection.
+        ghi_threshold: Global horizontal irradiance threshold, in watts per square meter.
+
+    Returns: Boolean array with one element per datetime.
+    """
+    datetimes = pd.DatetimeIndex(datetimes)
+    x_osgb, y_osgb = np.asarray(list(locations), dtype=np.float64).T
+    latitudes, longitudes = geospatial.osgb_to_lat_lon(x_osgb, y_osgb)
+    elevation = geospatial.calculate_solar_elevation(datetimes, latitudes, longitudes)
+    apparent_zenith = 90 - (elevation + _get_atmospheric_refraction(elevation))
+
+    # The defaults of `pvlib.location.Location.get_clearsky()`, at sea level.
+    with np.errstate(invalid="ignore"):
+        airmass_relative = pvlib.atmosphere.get_relative_airmass(apparent_zenith)
+    airmass_absolute = pvlib.atmosphere.get_absolute_airmass(
+        airmass_relative, pressure=pvlib.atmosphere.alt2pres(0)
+    )
+    with warnings.catch_warnings():
+        # PyTables triggers a DeprecationWarning in Numpy >= 1.20:
+        # "tables/array.py:241: DeprecationWarning: `np.object` is a
+        # deprecated alias for the builtin `object`."
+        # See https://github.com/PyTables/PyTables/issues/898
+        warnings.filterwarnings("ignore", category=DeprecationWarning)
+        linke_turbidity = np.stack(
+            [
+                pvlib.clearsky.lookup_linke_turbidity(datetimes, latitude, longitude).values
+                for latitude, longitude in zip(latitudes, longitudes)
+            ],
+            axis=1,
+        )
+    dni_extra = pvlib.irradiance.get_extra_radiation(datetimes).values[:, np.newaxis]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        clearsky = pvlib.clearsky.ineichen(
+            apparent_zenith, airmass_absolute, linke_turbidity, dni_extra=dni_extra
+        )
+    max_ghi = np.nan_to_num(clearsky["ghi"]).max(axis=1)
+    return max_ghi > ghi_threshold
+
+
+def _get_atmospheric_refraction(elevation: np.ndarray) -> np.ndarray:
+    """Get the atmospheric refraction of the Sun, in degrees, as computed by pvlib's SPA.
+
+    Uses pvlib's default pressure (101325 Pa) and temperature (12 degrees C).
+
+    Args:
+        elevation: Solar elevation angles, without refraction, in degrees.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        refraction = (
+            (1013.25 / 1010) * (283 / (273 + 12)) * 1.02
+            / (60 * np.tan(np.radians(elevation + 10.3 / (elevation + 5.11))))
+        )
+    # No refraction once the Sun's upper limb is below the horizon.
+    return np.where(elevation >= -(0.26667 + 0.5667), refraction, 0)
+
+
+def load_or_compute_daylight_mask(
+    datetimes: pd.DatetimeIndex,
+    locations: Iterable[Tuple[float, float]],
+    ghi_threshold: float,
+    cache_path: str,
+) -> np.ndarray:
+    """
+    Load the daylight mask from `cache_path`, or compute it and save it to `cache_path`.
+
+    The mask is saved in a `.npy` file whose name is a hash of the datetimes, the locations and
+    ghi_threshold, so it is recomputed whenever any of those change.
+
+    Args:
+        datetimes: DatetimeIndex to compute the mask for.
+        locations: List of Tuples of x, y coordinates in OSGB projection.
+        ghi_threshold: Global horizontal irradiance threshold, in watts per square meter.
+        cache_path: The directory (on any filesystem) which holds the cached masks.
+
+    Returns: Boolean array with one element per datetime.
+    """
+    locations = list(locations)
+    key = hashlib.sha1()
+    key.update(pd.DatetimeIndex(datetimes).asi8.tobytes())
+    key.update(np.asarray(locations, dtype=np.float64).tobytes())
+    key.update(np.float64(ghi_threshold).tobytes())
+    filename = os.path.join(str(cache_path), f"daylight_mask_{key.hexdigest()[:16]}.npy")
+
+    filesystem = nd_fs_utils.get_filesystem(filename)
+    if filesystem.exists(filename):
+        logger.debug(f"Loading daylight mask from {filename}")
+        with fsspec.open(filename, mode="rb") as file:
+            return np.load(file)
+
+    mask = compute_daylight_mask(datetimes, locations, ghi_threshold=ghi_threshold)
+    logger.info(f"Saving daylight mask to {filename}")
+    nd_fs_utils.makedirs(str(cache_path), exist_ok=True)
+    with fsspec.open(filename, mode="wb") as file:
+        np.save(file, mask)
+    return mask
+
+
 def single_period_to_datetime_index(period: pd.Series, freq: str) -> pd.DatetimeIndex:
     """Return a DatetimeIndex from period['start_dt'] to period['end_dt'] at frequency freq.
 
@@ -211,6 +317,42 @@ def get_contiguous_time_periods(
     return pd.DataFrame(periods)
 
 
+def merge_time_periods(
+    start_dts: pd.DatetimeIndex, end_dts: pd.DatetimeIndex, max_gap_duration: pd.Timedelta
+) -> pd.DataFrame:
+    """Merge time periods which overlap, or which are at most `max_gap_duration` apart.
+
+    Args:
+      start_dts: The start of each time period.  Needn't be sorted.
+      end_dts: The end of each time period.
+      max_gap_duration: Time periods separated by at most this duration are merged.
+
+    Returns:
+      pd.DataFrame where each row represents a single merged time period, sorted by time.  The
+          pd.DataFrame has two columns: `start_dt` and `end_dt`.
+    """
+    assert len(start_dts) == len(end_dts) > 0
+    start_ns = pd.DatetimeIndex(start_dts).asi8
+    end_ns = pd.DatetimeIndex(end_dts).asi8
+    order = np.argsort(start_ns, kind="stable")
+    start_ns = start_ns[order]
+    latest_end_ns = np.maximum.accumulate(end_ns[order])
+
+    # A new period starts wherever a period starts more than max_gap_duration after the end of
+    # every earlier period.
+    is_new_period = np.concatenate(
+        ([True], start_ns[1:] - latest_end_ns[:-1] > pd.Timedelta(max_gap_duration).value)
+    )
+    first_idxs = np.flatnonzero(is_new_period)
+    last_idxs = np.concatenate((first_idxs[1:] - 1, [len(start_ns) - 1]))
+    return pd.DataFrame(
+        {
+            "start_dt": pd.DatetimeIndex(start_ns[first_idxs]),
+            "end_dt": pd.DatetimeIndex(latest_end_ns[last_idxs]),
+        }
+    )
+
+
 def make_random_time_vectors(
     batch_size,
     seq_length_5_minutes,
@@ -4,6 +4,7 @@ import os
 import re
 import tempfile
 from functools import wraps
+from typing import Optional, Union
 
 import fsspec.asyn
 import gcsfs
@@ -61,6 +62,37 @@ def scale_to_0_to_1(a: Array) -> Array:
     return a
 
 
+def sort_and_drop_duplicates(
+    data: Union[xr.Dataset, xr.DataArray], dim: str, name: str
+) -> Union[xr.Dataset, xr.DataArray]:
+    """Sort `data` by the coords of `dim`, and drop duplicated coords, in one `isel()`.
+
+    Where coords are duplicated, keep the first.  Logs a warning with the number of duplicated
+    and out-of-order coords, if there are any.
+
+    Args:
+      data: The Dataset or DataArray to fix.
+      dim: The dim to sort and de-duplicate.  e.g. "time".
+      name: The name of `data` to use in the warnings.  e.g. "Satellite Zarr".
+
+    Returns:
+      `data` itself if the coords are already unique and sorted, otherwise the fixed `data`.
+    """
+    coords = data[dim].values
+    # `np.unique()` sorts with a stable sort, so `idx_of_first` is the first of each duplicate.
+    unique_coords, idx_of_first = np.unique(coords, return_index=True)
+    n_duplicates = len(coords) - len(unique_coords)
+    in_original_order = coords[np.sort(idx_of_first)]
+    n_out_of_order = np.count_nonzero(in_original_order[1:] < in_original_order[:-1])
+    if n_duplicates == 0 and n_out_of_order == 0:
+        return data
+    if n_duplicates > 0:
+        logger.warning(f"{name} has {n_duplicates:,d} duplicated {dim}s.  Dropping duplicates.")
+    if n_out_of_order > 0:
+        logger.warning(f"{name} has {n_out_of_order:,d} out of order {dim}s.  Sorting.")
+    return data.isel({dim: idx_of_first})
+
+
 def get_netcdf_filename(batch_idx: int) -> str:
     """Generate full filename, excluding path."""
     assert 0 <= batch_idx < 1e6
@@ -133,6 +165,105 @@ def remove_regex_pattern_from_keys(d: dict, pattern_to_remove: str, **regex_comp
     return new_dict
 
 
+def get_cumulative_nan_count(df: pd.DataFrame) -> np.ndarray:
+    """Count the NaNs in each column of `df`, cumulatively.
+
+    Returns:
+      int32 array of shape (len(df) + 1, len(df.columns)).  Row i holds the number of NaNs in
+      rows [0, i) of `df`, so the number of NaNs in rows [a, b) is `count[b] - count[a]`.
+    """
+    cumulative_nan_count = np.zeros((len(df) + 1, len(df.columns)), dtype=np.int32)
+    np.cumsum(df.isna().values, axis=0, out=cumulative_nan_count[1:])
+    return cumulative_nan_count
+
+
+def get_columns_without_nans_in_windows(
+    df: pd.DataFrame,
+    start_dts: pd.DatetimeIndex,
+    end_dts: pd.DatetimeIndex,
+    max_rows_per_chunk: int = 4096,
+) -> np.ndarray:
+    """Find the columns of a DataFrame which have no NaNs within each time window.
+
+    Equivalent to `df.loc[start_dt:end_dt].notna().all()` for each window, but vectorised.
+
+    The windows are sorted by their start, and the NaNs are counted (using
+    `get_cumulative_nan_count()`) for the rows spanned by about `max_rows_per_chunk` rows of
+    window starts at a time.  So the memory used doesn't grow with `len(df)`.
+
+    Args:
+      df: DataFrame with a sorted DatetimeIndex.
+      start_dts: The start of each window (inclusive).
+      end_dts: The end of each window (inclusive).
+      max_rows_per_chunk: The number of rows of `df` in which each chunk of windows starts.
+
+    Returns:
+      Boolean array of shape (n_windows, n_columns).
+    """
+    start_idxs = df.index.searchsorted(start_dts, side="left")
+    end_idxs = df.index.searchsorted(end_dts, side="right")
+    mask = np.empty((len(start_idxs), len(df.columns)), dtype=bool)
+    order = np.argsort(start_idxs, kind="stable")
+    sorted_start_idxs = start_idxs[order]
+    chunk_start = 0
+    while chunk_start < len(order):
+        first_row = sorted_start_idxs[chunk_start]
+        chunk_end = np.searchsorted(sorted_start_idxs, first_row + max_rows_per_chunk)
+        window_idxs = order[chunk_start:chunk_end]
+        last_row = max(end_idxs[window_idxs].max(), first_row)
+        cumulative_nan_count = get_cumulative_nan_count(df.iloc[first_row:last_row])
+        n_nans = (
+            cumulative_nan_count[end_idxs[window_idxs] - first_row]
+            - cumulative_nan_count[start_idxs[window_idxs] - first_row]
+        )
+        mask[window_idxs] = n_nans == 0
+        chunk_start = chunk_end
+    return mask
+
+
+def get_row_idxs_of_windows(
+    index: pd.DatetimeIndex, start_dts: pd.DatetimeIndex, end_dts: pd.DatetimeIndex
+) -> Optional[np.ndarray]:
+    """Find the rows of a DataFrame within each time window.
+
+    Equivalent to the rows selected by `df.loc[start_dt:end_dt]` for each window, but vectorised.
+
+    Args:
+      index: The sorted DatetimeIndex of the DataFrame.
+      start_dts: The start of each window (inclusive).
+      end_dts: The end of each window (inclusive).
+
+    Returns:
+      int array of shape (n_windows, n_rows_per_window), or None if the windows do not all
+      contain the same number of rows.
+    """
+    start_idxs = index.searchsorted(start_dts, side="left")
+    end_idxs = index.searchsorted(end_dts, side="right")
+    n_rows_per_window = end_idxs - start_idxs
+    if len(n_rows_per_window) == 0 or (n_rows_per_window != n_rows_per_window[0]).any():
+        return None
+    return start_idxs[:, np.newaxis] + np.arange(n_rows_per_window[0])
+
+
+def choose_random_true_element_in_each_row(
+    mask: np.ndarray, rng: np.random.Generator
+) -> np.ndarray:
+    """Choose the index of one True element, uniformly at random, from each row of `mask`.
+
+    Draws exactly one random number per row, so the result only depends on the state of `rng`
+    and the contents of `mask`.
+
+    Raises:
+      ValueError if any row of `mask` has no True elements.
+    """
+    n_true_per_row = mask.sum(axis=1)
+    if (n_true_per_row == 0).any():
+        raise ValueError(f"{(n_true_per_row == 0).sum()} rows have no True elements to choose!")
+    nth_true_element = (rng.random(len(mask)) * n_true_per_row).astype(np.int64)
+    # The index of the first element where the running count of True elements exceeds n:
+    return np.argmax(np.cumsum(mask, axis=1) > nth_true_element[:, np.newaxis], axis=1)
+
+
 def get_config_with_test_paths(config_filename: str) -> model.Configuration:
     """Sets the base paths to point to the testing data in this repository."""
     local_path = os.path.join(os.path.dirname(nowcasting_dataset.__file__), "../")
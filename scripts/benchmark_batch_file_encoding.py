@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+"""Benchmark different encodings of the NetCDF batch files.
+
+For each encoding, reports the time to write a batch, the time to read the batch back into
+memory, and the size of the file.  Use this to choose `output_data.batch_file_encoding`.
+
+Please run `./benchmark_batch_file_encoding.py --help` for full details!
+"""
+import os
+import tempfile
+import time
+
+import click
+import xarray as xr
+
+from nowcasting_dataset.config.load import load_yaml_configuration
+from nowcasting_dataset.config.model import BatchFileEncoding
+from nowcasting_dataset.data_sources.datasource_output import get_netcdf_encoding
+from nowcasting_dataset.data_sources.fake import (
+    gsp_fake,
+    nwp_fake,
+    pv_fake,
+    satellite_fake,
+    sun_fake,
+    topographic_fake,
+)
+
+FAKE_BATCH_FUNCTIONS = {
+    "gsp": lambda batch_size: gsp_fake(batch_size, seq_length_30=4, n_gsp_per_batch=32),
+    "nwp": lambda batch_size: nwp_fake(
+        batch_size, seq_length_60=4, image_size_pixels=64, number_nwp_channels=10
+    ),
+    "pv": lambda batch_size: pv_fake(batch_size, seq_length_5=19, n_pv_systems_per_batch=128),
+    "satellite": lambda batch_size: satellite_fake(
+        batch_size, seq_length_5=19, satellite_image_size_pixels=64, number_satellite_channels=11
+    ),
+    "sun": lambda batch_size: sun_fake(batch_size, seq_length_5=19),
+    "topographic": lambda batch_size: topographic_fake(batch_size, image_size_pixels=64),
+}
+
+DEFAULT_ENCODINGS = {
+    "none": None,
+    "lzf": BatchFileEncoding(compression="lzf"),
+    "gzip 1": BatchFileEncoding(compression="gzip", compression_level=1),
+    "gzip 4 + shuffle": BatchFileEncoding(compression="gzip", compression_level=4, shuffle=True),
+    "float32 + gzip 4 + shuffle": BatchFileEncoding(
+        compression="gzip", compression_level=4, shuffle=True, dtype="float32"
+    ),
+    "float32 + lzf + shuffle, 1 example per chunk": BatchFileEncoding(
+        compression="lzf", shuffle=True, dtype="float32", chunks={"example": 1}
+    ),
+}
+
+
+def benchmark_encoding(
+    batch: xr.Dataset, batch_file_encoding: BatchFileEncoding, n_repeats: int
+) -> tuple[float, float, int]:
+    """Get the fastest time to write and read `batch`, and the size of the file."""
+    encoding = get_netcdf_encoding(batch, batch_file_encoding)
+    write_seconds = []
+    read_seconds = []
+    with tempfile.TemporaryDirectory() as tmp_path:
+        filename = os.path.join(tmp_path, "batch.nc")
+        for _ in range(n_repeats):
+            start_time = time.perf_counter()
+            batch.to_netcdf(filename, engine="h5netcdf", mode="w", encoding=encoding)
+            write_seconds.append(time.perf_counter() - start_time)
+
+            start_time = time.perf_counter()
+            with xr.open_dataset(filename, engine="h5netcdf") as dataset:
+                dataset.load()
+            read_seconds.append(time.perf_counter() - start_time)
+        file_size_bytes = os.path.getsize(filename)
+    return min(write_seconds), min(read_seconds), file_size_bytes
+
+
+@click.command()
+@click.option(
+    "--data_source",
+    multiple=True,
+    default=list(FAKE_BATCH_FUNCTIONS),
+    type=click.Choice(list(FAKE_BATCH_FUNCTIONS)),
+    help="The DataSources to benchmark.  Use --data_source multiple times for several.",
+)
+@click.option(
+    "--batch_filename",
+    default=None,
+    help=(
+        "A NetCDF batch file for one DataSource, to benchmark instead of a fake batch."
+        "  If set then --data_source is only used to look up the encoding in --config_filename."
+    ),
+)
+@click.option(
+    "--config_filename",
+    default=None,
+    help="Also benchmark the `output_data.batch_file_encoding` in this YAML configuration file.",
+)
+@click.option("--batch_size", default=32, type=int, help="The batch size of fake batches.")
+@click.option("--n_repeats", default=3, type=int, help="The number of times to write and read.")
+def main(
+    data_source: list[str],
+    batch_filename: str,
+    config_filename: str,
+    batch_size: int,
+    n_repeats: int,
+):
+    """Report the write time, read time and file size for different batch file encodings."""
+    encodings_from_config = {}
+    if config_filename is not None:
+        configuration = load_yaml_configuration(config_filename)
+        encodings_from_config = configuration.output_data.batch_file_encoding
+
+    for data_source_name in data_source:
+        if batch_filename is None:
+            batch = FAKE_BATCH_FUNCTIONS[data_source_name](batch_size)
+        else:
+            batch = xr.load_dataset(batch_filename, engine="h5netcdf")
+
+        encodings = dict(DEFAULT_ENCODINGS)
+        if data_source_name in encodings_from_config:
+            encodings["from config"] = encodings_from_config[data_source_name]
+
+        print(f"\n{data_source_name}: {batch.nbytes / 1e6:,.1f} MB in memory")
+        print(f"{'encoding':<46} {'write ms':>9} {'read ms':>9} {'file MB':>9}")
+        for encoding_name, batch_file_encoding in encodings.items():
+            write_seconds, read_seconds, file_size_bytes = benchmark_encoding(
+                batch, batch_file_encoding, n_repeats=n_repeats
+            )
+            print(
+                f"{encoding_name:<46} {write_seconds * 1000:9.1f} {read_seconds * 1000:9.1f}"
+                f" {file_size_bytes / 1e6:9.2f}"
+            )
+
+        if batch_filename is not None:
+            break
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+"""Benchmark joining examples into a batch.
+
+Compares `join_list_dataset_to_batch_dataset` (which preallocates the batch) with
+`join_list_dataset_to_batch_dataset_with_concat`.
+
+Please run `./benchmark_join_batch.py --help` for full details!
+"""
+import timeit
+
+import click
+
+from nowcasting_dataset.data_sources.fake import create_gsp_pv_dataset, create_image_array
+from nowcasting_dataset.dataset.xr_utils import (
+    convert_coordinates_to_indexes_for_list_datasets,
+    join_list_dataset_to_batch_dataset,
+    join_list_dataset_to_batch_dataset_with_concat,
+)
+
+
+def make_examples(data_source: str, batch_size: int, image_size_pixels: int) -> list:
+    """Make fake examples, with their coords converted to indexes."""
+    if data_source == "satellite":
+        examples = [
+            create_image_array(seq_length=19, image_size_pixels=image_size_pixels).to_dataset()
+            for _ in range(batch_size)
+        ]
+    else:
+        examples = [
+            create_gsp_pv_dataset(seq_length=19, number_of_systems=128) for _ in range(batch_size)
+        ]
+    return convert_coordinates_to_indexes_for_list_datasets(examples)
+
+
+@click.command()
+@click.option(
+    "--batch_size",
+    multiple=True,
+    default=(32, 256),
+    type=int,
+    help="The batch sizes to benchmark.  Use --batch_size multiple times for several sizes.",
+)
+@click.option(
+    "--image_size_pixels",
+    default=64,
+    type=int,
+    help="The width and height of each fake satellite image.",
+)
+@click.option("--n_repeats", default=5, type=int, help="The number of times to join each batch.")
+def main(batch_size: list[int], image_size_pixels: int, n_repeats: int):
+    """Time joining fake satellite and PV examples into batches."""
+    for data_source in ("satellite", "pv"):
+        for size in batch_size:
+            examples = make_examples(data_source, size, image_size_pixels)
+            for join_func in (
+                join_list_dataset_to_batch_dataset_with_concat,
+                join_list_dataset_to_batch_dataset,
+            ):
+                seconds = min(
+                    timeit.repeat(lambda: join_func(examples), number=1, repeat=n_repeats)
+                )
+                print(
+                    f"{data_source:>9}  batch_size={size:<4d}  {join_func.__name__:<48}"
+                    f"  {seconds * 1000:8.1f} ms"
+                )
+
+
+if __name__ == "__main__":
+    main()
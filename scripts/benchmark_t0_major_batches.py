@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+"""Benchmark 't0-major' batches, where each distinct t0 in a batch is loaded only once.
+
+For each mode, creates the same satellite batches (in which several examples share each t0)
+and reports the number of (compressed) bytes read from the Zarr store, and the time taken.
+Every chunk that is read is also decompressed.
+Use this to decide whether to set `process.group_examples_by_t0`.
+
+Please run `./benchmark_t0_major_batches.py --help` for full details!
+"""
+import os
+import threading
+import time
+from collections.abc import MutableMapping
+
+import click
+import fsspec
+import numpy as np
+import pandas as pd
+
+import nowcasting_dataset
+from nowcasting_dataset.data_sources.satellite.satellite_data_source import (
+    SatelliteDataSource,
+    open_sat_data,
+)
+
+DEFAULT_SAT_ZARR_PATH = os.path.join(
+    os.path.dirname(nowcasting_dataset.__file__), "..", "tests", "data", "sat_data.zarr"
+)
+
+
+class ByteCountingStore(MutableMapping):
+    """A read-only Zarr store which counts the bytes read from `zarr_path`."""
+
+    def __init__(self, zarr_path: str):  # noqa: D107
+        self.n_bytes = 0
+        self._store = fsspec.get_mapper(zarr_path)
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key: str) -> bytes:
+        value = self._store[key]
+        with self._lock:
+            self.n_bytes += len(value)
+        return value
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._store
+
+    def __iter__(self):
+        return iter(self._store)
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def __setitem__(self, key: str, value: bytes) -> None:
+        raise PermissionError("ByteCountingStore is read-only")
+
+    def __delitem__(self, key: str) -> None:
+        raise PermissionError("ByteCountingStore is read-only")
+
+
+class ByteCountingSatelliteDataSource(SatelliteDataSource):
+    """A SatelliteDataSource which reads `zarr_path` through a ByteCountingStore."""
+
+    def _open_data(self):
+        self.store = ByteCountingStore(self.zarr_path)
+        # Pass a list, so `open_mfdataset()` doesn't try to expand the store like a path.
+        return open_sat_data(zarr_path=[self.store], consolidated=self.consolidated)
+
+
+@click.command()
+@click.option("--zarr_path", default=DEFAULT_SAT_ZARR_PATH, help="The satellite Zarr store.")
+@click.option("--batch_size", default=32, type=int, help="The number of examples per batch.")
+@click.option(
+    "--n_t0s_per_batch", default=4, type=int, help="The number of distinct t0s in each batch."
+)
+@click.option("--n_batches", default=4, type=int, help="The number of batches to create.")
+@click.option("--image_size_pixels", default=24, type=int, help="The size of each example.")
+@click.option("--seed", default=0, type=int, help="The seed for sampling the locations.")
+def main(
+    zarr_path: str,
+    batch_size: int,
+    n_t0s_per_batch: int,
+    n_batches: int,
+    image_size_pixels: int,
+    seed: int,
+):
+    """Report the bytes read, and the time taken, with and without t0-major batches."""
+    data_sources = {
+        load_each_t0_once: ByteCountingSatelliteDataSource(
+            zarr_path=zarr_path,
+            channels=("IR_016",),
+            image_size_pixels=image_size_pixels,
+            meters_per_pixel=6000,
+            history_minutes=30,
+            forecast_minutes=60,
+            load_each_t0_once=load_each_t0_once,
+        )
+        for load_each_t0_once in (False, True)
+    }
+    for data_source in data_sources.values():
+        data_source.open()
+
+    # Sample locations far enough from the edges of the satellite imagery.
+    data_source = data_sources[False]
+    rng = np.random.default_rng(seed)
+    t0_datetimes = data_source.datetime_index(remove_night=False)[
+        data_source.history_length + 1 : -data_source.forecast_length - 1
+    ]
+    margin = image_size_pixels
+    x_coords = data_source.data.x.values[margin:-margin]
+    y_coords = data_source.data.y.values[margin:-margin]
+    locations_for_each_batch = [
+        (
+            pd.DatetimeIndex(
+                np.sort(rng.choice(rng.choice(t0_datetimes, n_t0s_per_batch), batch_size))
+            ),
+            rng.choice(x_coords, batch_size),
+            rng.choice(y_coords, batch_size),
+        )
+        for _ in range(n_batches)
+    ]
+
+    print(f"{n_batches} batches x {batch_size} examples, {n_t0s_per_batch} t0s per batch")
+    print(f"{'load_each_t0_once':<18} {'MB read':>10} {'seconds':>9}")
+    for load_each_t0_once, data_source in data_sources.items():
+        store = data_source.store
+        store.n_bytes = 0  # Ignore the bytes read by `open()` and `datetime_index()`.
+        start_time = time.perf_counter()
+        for t0s, x_locations, y_locations in locations_for_each_batch:
+            data_source.get_batch(t0s, x_locations, y_locations)
+        seconds = time.perf_counter() - start_time
+        print(f"{str(load_each_t0_once):<18} {store.n_bytes / 1e6:10,.1f} {seconds:9.2f}")
+
+
+if __name__ == "__main__":
+    main()
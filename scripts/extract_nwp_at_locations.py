@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+"""Extract the NWP forecasts around every GSP centroid and PV system into an NWP point store.
+
+Set `input_data.nwp.nwp_point_store_path` to the output path to read NWP examples centred on
+those locations from the point store.  Re-run this script whenever the NWP Zarr, the GSP or PV
+metadata, or the NWP `image_size_pixels` or `meters_per_pixel` change.
+
+Please run `./extract_nwp_at_locations.py --help` for full details!
+"""
+import logging
+
+import click
+import numpy as np
+from pathy import Pathy
+
+import nowcasting_dataset
+from nowcasting_dataset import utils
+from nowcasting_dataset.consts import LOG_LEVELS
+from nowcasting_dataset.data_sources.nwp.nwp_point_store import write_nwp_point_store
+from nowcasting_dataset.manager import Manager
+
+logger = logging.getLogger(__name__)
+
+default_config_filename = Pathy(nowcasting_dataset.__file__).parent / "config" / "on_premises.yaml"
+
+
+@click.command()
+@click.option(
+    "--config_filename",
+    default=default_config_filename,
+    help="The filename of the YAML configuration file.",
+)
+@click.option(
+    "--output_path",
+    default=None,
+    help="The path of the new point store.  Defaults to input_data.nwp.nwp_point_store_path.",
+)
+@click.option(
+    "--init_times_per_chunk", default=1, type=int, help="The number of init times per chunk."
+)
+@click.option(
+    "--locations_per_chunk", default=64, type=int, help="The number of locations per chunk."
+)
+@click.option(
+    "--log_level",
+    default="DEBUG",
+    type=click.Choice(LOG_LEVELS),
+    help=("The log level represented as a string.  Defaults to DEBUG."),
+)
+@utils.arg_logger
+def main(
+    config_filename: str,
+    output_path: str,
+    init_times_per_chunk: int,
+    locations_per_chunk: int,
+    log_level: str,
+):
+    """Extract the NWP forecasts around every GSP centroid and PV system."""
+    manager = Manager()
+    manager.load_yaml_configuration(config_filename)
+    manager.configure_loggers(log_level=log_level, names_of_selected_data_sources=["nwp"])
+    manager.initialise_data_sources(names_of_selected_data_sources=["nwp", "gsp", "pv"])
+    if output_path is None:
+        output_path = manager.config.input_data.nwp.nwp_point_store_path
+    if output_path is None:
+        raise click.UsageError("Please set --output_path or input_data.nwp.nwp_point_store_path")
+
+    x_locations = []
+    y_locations = []
+    if "gsp" in manager.data_sources:
+        metadata = manager.data_sources["gsp"].metadata
+        x_locations.append(metadata.location_x.values)
+        y_locations.append(metadata.location_y.values)
+    if "pv" in manager.data_sources:
+        metadata = manager.data_sources["pv"].pv_metadata
+        x_locations.append(metadata.location_x.values)
+        y_locations.append(metadata.location_y.values)
+
+    # Read the NWP Zarr directly: The point store is created from it.
+    nwp = manager.data_sources["nwp"]
+    nwp.point_store_path = None
+    nwp.open()
+    write_nwp_point_store(
+        nwp,
+        x_locations=np.concatenate(x_locations),
+        y_locations=np.concatenate(y_locations),
+        output_path=output_path,
+        init_times_per_chunk=init_times_per_chunk,
+        locations_per_chunk=locations_per_chunk,
+    )
+    logger.info("Done!")
+
+
+if __name__ == "__main__":
+    main()
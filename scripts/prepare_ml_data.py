@@ -38,7 +38,7 @@ default_config_filename = Pathy(nowcasting_dataset.__file__).parent / "config" /
         " --data_source nwp --data_source satellite.  Note that only these DataSources"
         " always be used when computing the available datetime periods across all the"
         " DataSources, so be very careful about setting --data_source when creating the"
-        " spatial_and_temporal_locations_of_each_example.csv files!"
+        " spatial_and_temporal_locations_of_each_example.npy files!"
     ),
 )
 @click.option(
@@ -2,7 +2,9 @@
 import os
 from datetime import datetime
 
+import numpy as np
 import pandas as pd
+import xarray as xr
 
 import nowcasting_dataset
 from nowcasting_dataset.data_sources.gsp.gsp_data_source import GSPDataSource
@@ -53,6 +55,30 @@ def test_gsp_pv_data_source_get_locations():
     assert -90 < lon[0] < 90  # this makes sure it is in lat/lon
 
 
+def test_gsp_pv_data_source_get_locations_with_nans():
+    """Test GSP locations only come from GSPs without NaNs"""
+    local_path = os.path.dirname(nowcasting_dataset.__file__) + "/.."
+
+    gsp = GSPDataSource(
+        zarr_path=f"{local_path}/tests/data/gsp/test.zarr",
+        start_dt=datetime(2020, 4, 1),
+        end_dt=datetime(2020, 4, 2),
+        history_minutes=30,
+        forecast_minutes=60,
+        image_size_pixels=64,
+        meters_per_pixel=2000,
+    )
+
+    # Only leave the last GSP without NaNs.
+    gsp.gsp_power.iloc[:, :-1] = np.NaN
+    gsp_id = gsp.gsp_power.columns[-1]
+
+    locations_x, locations_y = gsp.get_locations(t0_datetimes=gsp.gsp_power.index[0:10])
+
+    assert (np.array(locations_x) == gsp.metadata.loc[gsp_id].location_x).all()
+    assert (np.array(locations_y) == gsp.metadata.loc[gsp_id].location_y).all()
+
+
 def test_gsp_pv_data_source_get_example():
     """Test GSP example"""
     local_path = os.path.dirname(nowcasting_dataset.__file__) + "/.."
@@ -111,3 +137,27 @@ def test_gsp_pv_data_source_get_batch():
     assert len(batch.x_coords[1]) == len(batch.y_coords[1])
     assert len(batch.x_coords[2]) > 0
     # assert T0_DT in batch[3].keys()
+
+
+def test_gsp_pv_data_source_get_batch_same_as_examples():
+    """Test the batch is the same as joining the examples together"""
+    local_path = os.path.dirname(nowcasting_dataset.__file__) + "/.."
+
+    gsp = GSPDataSource(
+        zarr_path=f"{local_path}/tests/data/gsp/test.zarr",
+        start_dt=datetime(2020, 4, 1),
+        end_dt=datetime(2020, 4, 2),
+        history_minutes=30,
+        forecast_minutes=60,
+        image_size_pixels=64,
+        meters_per_pixel=2000,
+        n_gsp_per_example=3,
+    )
+
+    t0_datetimes = gsp.gsp_power.index[2:10]
+    x_locations, y_locations = gsp.get_locations(t0_datetimes, rng=np.random.default_rng(42))
+    kwargs = dict(t0_datetimes=t0_datetimes, x_locations=x_locations, y_locations=y_locations)
+
+    xr.testing.assert_identical(
+        gsp._get_batch_dataset(**kwargs), gsp._get_batch_dataset_from_examples(**kwargs)
+    )
@@ -2,6 +2,14 @@
 import numpy as np
 import pandas as pd
 import pytest
+import xarray as xr
+
+from nowcasting_dataset.data_sources.data_source import BatchOutput
+from nowcasting_dataset.data_sources.satellite.satellite_data_source import (
+    HRVSatelliteDataSource,
+    SatelliteDataSource,
+    get_start_and_end_idx,
+)
 
 
 def test_satellite_data_source_init(sat_data_source):  # noqa: D103
@@ -25,6 +33,22 @@ def test_datetime_index(sat_data_source):  # noqa: D103
     assert np.all(np.diff(datetimes.view(int)) > 0)
 
 
+def test_datetime_index_with_daylight_mask_cache(sat_filename, tmp_path):  # noqa: D103
+    sat = SatelliteDataSource(
+        image_size_pixels=pytest.IMAGE_SIZE_PIXELS,
+        zarr_path=sat_filename,
+        history_minutes=0,
+        forecast_minutes=15,
+        channels=("IR_016",),
+        meters_per_pixel=6000,
+        daylight_mask_cache_path=str(tmp_path),
+    )
+    datetimes = sat.datetime_index()
+    assert len(list(tmp_path.glob("daylight_mask_*.npy"))) == 1
+    sat.open()
+    pd.testing.assert_index_equal(sat.datetime_index(), datetimes)
+
+
 @pytest.mark.parametrize(
     "x, y, left, right, top, bottom",
     [
@@ -120,3 +144,195 @@ def test_geospatial_border(sat_data_source):  # noqa: D103
         [1147550.338664, 862710.688863],
     ]
     np.testing.assert_array_almost_equal(border, correct_border)
+
+
+def test_get_time_slice_matches_sel(sat_data_source):  # noqa: D103
+    sat_data_source.open()
+    for t0_dt in sat_data_source.datetime_index(remove_night=False)[[0, 5, -1]]:
+        start_dt = sat_data_source._get_start_dt(t0_dt)
+        end_dt = sat_data_source._get_end_dt(t0_dt)
+        expected = sat_data_source.data.sel(time=slice(start_dt, end_dt))
+        actual = sat_data_source._get_time_slice(t0_dt)
+        np.testing.assert_array_equal(actual.time.values, expected.time.values)
+
+
+def test_get_start_and_end_idx():  # noqa: D103
+    times = pd.date_range("2020-01-01 00:00", periods=12, freq="5T")
+    start_idx, end_idx = get_start_and_end_idx(
+        times.asi8, start_dt=pd.Timestamp("2020-01-01 00:07"), end_dt=times[6]
+    )
+    assert (start_idx, end_idx) == (2, 7)
+
+
+def test_get_example_from_chunk_cache(sat_filename):  # noqa: D103
+    kwargs = dict(
+        image_size_pixels=pytest.IMAGE_SIZE_PIXELS,
+        zarr_path=sat_filename,
+        history_minutes=30,
+        forecast_minutes=60,
+        channels=("IR_016",),
+        meters_per_pixel=6000,
+    )
+    sat_data_source = SatelliteDataSource(**kwargs)
+    cached_sat_data_source = SatelliteDataSource(max_chunks_in_cache=2, **kwargs)
+    sat_data_source.open()
+    cached_sat_data_source.open()
+    t0_dt = pd.Timestamp("2020-04-01 13:00")
+    for x, y in [(0, 0), (10001, 10001)]:
+        expected = sat_data_source.get_example(t0_dt=t0_dt, x_meters_center=x, y_meters_center=y)
+        actual = cached_sat_data_source.get_example(
+            t0_dt=t0_dt, x_meters_center=x, y_meters_center=y
+        )
+        xr.testing.assert_identical(actual, expected)
+    assert cached_sat_data_source._chunk_cache.n_hits > 0
+
+
+def test_get_batch_load_each_t0_once(sat_filename):  # noqa: D103
+    kwargs = dict(
+        image_size_pixels=pytest.IMAGE_SIZE_PIXELS,
+        zarr_path=sat_filename,
+        history_minutes=30,
+        forecast_minutes=60,
+        channels=("IR_016",),
+        meters_per_pixel=6000,
+    )
+    sat_data_source = SatelliteDataSource(**kwargs)
+    t0_major_sat_data_source = SatelliteDataSource(load_each_t0_once=True, **kwargs)
+    sat_data_source.open()
+    t0_major_sat_data_source.open()
+
+    # Three examples share the first t0.
+    t0_datetimes = pd.DatetimeIndex(["2020-04-01 13:00"] * 3 + ["2020-04-01 14:00"])
+    x_locations = [0, 10001, 2000, 0]
+    y_locations = [0, 10001, 1000, 0]
+    batch = sat_data_source.get_batch(t0_datetimes, x_locations, y_locations)
+    t0_major_batch = t0_major_sat_data_source.get_batch(t0_datetimes, x_locations, y_locations)
+    xr.testing.assert_identical(xr.Dataset(t0_major_batch), xr.Dataset(batch))
+
+
+def test_share_reads_with(sat_filename):  # noqa: D103
+    kwargs = dict(zarr_path=sat_filename, channels=("IR_016",), meters_per_pixel=6000)
+    sat_kwargs = dict(image_size_pixels=16, history_minutes=30, forecast_minutes=60, **kwargs)
+    hrv_kwargs = dict(image_size_pixels=8, history_minutes=0, forecast_minutes=30, **kwargs)
+    sat_data_source = SatelliteDataSource(max_chunks_in_cache=16, **sat_kwargs)
+    hrv_sat_data_source = HRVSatelliteDataSource(**hrv_kwargs)
+    sat_data_source.open()
+    hrv_sat_data_source.open()
+    sat_data_source.share_reads_with(hrv_sat_data_source)
+    assert hrv_sat_data_source._chunk_cache is sat_data_source._chunk_cache
+
+    t0_datetimes = pd.DatetimeIndex(["2020-04-01 13:00", "2020-04-01 13:00", "2020-04-01 14:00"])
+    x_locations = [0, 10001, 0]
+    y_locations = [0, 10001, 0]
+    sat_batch = sat_data_source.get_batch(t0_datetimes, x_locations, y_locations)
+    n_misses = sat_data_source._chunk_cache.n_misses
+    hrv_sat_batch = hrv_sat_data_source.get_batch(t0_datetimes, x_locations, y_locations)
+    # Every chunk for the HRV batch was read for the satellite batch.
+    assert sat_data_source._chunk_cache.n_misses == n_misses
+
+    for data_source_class, data_source_kwargs, batch in [
+        (SatelliteDataSource, sat_kwargs, sat_batch),
+        (HRVSatelliteDataSource, hrv_kwargs, hrv_sat_batch),
+    ]:
+        data_source = data_source_class(**data_source_kwargs)
+        data_source.open()
+        expected = data_source.get_batch(t0_datetimes, x_locations, y_locations)
+        xr.testing.assert_identical(xr.Dataset(batch), xr.Dataset(expected))
+
+
+def test_share_reads_with_different_zarr_paths(sat_filename, hrv_sat_filename):  # noqa: D103
+    sat_data_source = SatelliteDataSource(
+        zarr_path=sat_filename,
+        history_minutes=0,
+        forecast_minutes=5,
+        channels=("IR_016",),
+        max_chunks_in_cache=16,
+    )
+    hrv_sat_data_source = HRVSatelliteDataSource(
+        zarr_path=hrv_sat_filename, history_minutes=0, forecast_minutes=5, channels=("HRV",)
+    )
+    with pytest.raises(ValueError):
+        sat_data_source.share_reads_with(hrv_sat_data_source)
+
+
+def test_create_batches_with_other_outputs(sat_filename, tmp_path):  # noqa: D103
+    kwargs = dict(
+        zarr_path=sat_filename,
+        channels=("IR_016",),
+        meters_per_pixel=6000,
+        history_minutes=30,
+        forecast_minutes=60,
+    )
+    sat_data_source = SatelliteDataSource(image_size_pixels=16, max_chunks_in_cache=16, **kwargs)
+    hrv_sat_data_source = HRVSatelliteDataSource(image_size_pixels=8, **kwargs)
+    sat_data_source.open()
+    hrv_sat_data_source.open()
+    sat_data_source.share_reads_with(hrv_sat_data_source)
+
+    locations = pd.DataFrame(
+        dict(
+            t0_datetime_UTC=pd.DatetimeIndex(["2020-04-01 13:00"] * 2 + ["2020-04-01 14:00"] * 2),
+            x_center_OSGB=[0, 10001, 0, 2000],
+            y_center_OSGB=[0, 10001, 0, 1000],
+        )
+    )
+    for name in ("sat", "hrvsat"):
+        (tmp_path / name).mkdir()
+    sat_data_source.create_batches(
+        spatial_and_temporal_locations_of_each_example=locations,
+        idx_of_first_batch=0,
+        batch_size=2,
+        dst_path=tmp_path / "sat",
+        local_temp_path=tmp_path,
+        upload_every_n_batches=0,
+        open_data_source=False,
+        other_outputs=[
+            BatchOutput(
+                data_source=hrv_sat_data_source,
+                dst_path=tmp_path / "hrvsat",
+                local_temp_path=tmp_path,
+            )
+        ],
+    )
+    for name in ("sat", "hrvsat"):
+        assert sorted(path.name for path in (tmp_path / name).iterdir()) == [
+            "000000.nc",
+            "000001.nc",
+        ]
+
+
+def test_get_batch_keeps_int16(sat_filename, tmp_path):  # noqa: D103
+    # Make a copy of the test data which is scaled, like the real satellite data.
+    dataset = xr.open_zarr(sat_filename).drop_vars("acq_time").isel(time=slice(0, 40)).load()
+    for variable in dataset.variables.values():
+        variable.encoding = {}
+    data = dataset["stacked_eumetsat_data"]
+    dataset["stacked_eumetsat_data"] = data.where(data > 100, -1).astype(np.int16)
+    dataset["stacked_eumetsat_data"].attrs.update(scale_factor=0.25, add_offset=1.0, _FillValue=-1)
+    zarr_path = tmp_path / "sat_data.zarr"
+    dataset.to_zarr(zarr_path, consolidated=True)
+
+    sat_data_source = SatelliteDataSource(
+        image_size_pixels=pytest.IMAGE_SIZE_PIXELS,
+        zarr_path=zarr_path,
+        history_minutes=30,
+        forecast_minutes=60,
+        channels=("IR_016",),
+        meters_per_pixel=6000,
+    )
+    sat_data_source.open()
+    batch = sat_data_source.get_batch(
+        pd.DatetimeIndex(["2020-04-01 13:00", "2020-04-01 13:30"]), [0, 10001], [0, 10001]
+    )
+    assert batch.data.dtype == np.int16
+    assert batch.data.attrs["scale_factor"] == 0.25
+
+    # Decoding the batch gives the same values as decoding the store.
+    decoded_data = xr.open_zarr(zarr_path)["stacked_eumetsat_data"]
+    decoded_data = decoded_data.reindex(x=decoded_data.x[::-1])
+    for example_idx, t0_dt in enumerate(batch.time.values[:, sat_data_source.history_length]):
+        start_dt = pd.Timestamp(t0_dt) - sat_data_source.history_duration
+        end_dt = pd.Timestamp(t0_dt) + sat_data_source.forecast_duration
+        expected = decoded_data.sel(time=slice(start_dt, end_dt), x=batch.x[example_idx])
+        expected = expected.sel(y=batch.y[example_idx]).values
+        np.testing.assert_array_equal(batch.decode().data[example_idx].values, expected)
@@ -0,0 +1,164 @@
+"""Test the persistent index of satellite Zarr stores."""
+import os
+import pickle
+import tempfile
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+import nowcasting_dataset.filesystem.utils as nd_fs_utils
+from nowcasting_dataset.data_sources.satellite.satellite_data_source import (
+    SatelliteDataSource,
+    open_sat_data,
+)
+from nowcasting_dataset.data_sources.satellite.satellite_index import SatelliteIndex
+
+
+def _save_fake_store(zarr_path: str, times: pd.DatetimeIndex, encoding: dict = None) -> None:
+    shape = (len(times), 6, 4, 1)
+    data = np.arange(np.prod(shape), dtype=np.int16).reshape(shape)
+    dataset = xr.Dataset(
+        {"stacked_eumetsat_data": (("time", "x", "y", "variable"), data)},
+        coords={
+            "time": times,
+            "x": np.arange(6, dtype=np.float64),
+            "y": np.arange(4, dtype=np.float64),
+            "variable": ["IR_016"],
+        },
+    )
+    encoding = {"stacked_eumetsat_data": encoding} if encoding else None
+    dataset.chunk({"time": 1}).to_zarr(zarr_path, consolidated=True, encoding=encoding)
+
+
+@pytest.fixture
+def zarr_path():
+    """Two monthly stores, the second of which has a duplicated time."""
+    with tempfile.TemporaryDirectory() as tmp_path:
+        _save_fake_store(
+            os.path.join(tmp_path, "2020_01.zarr"),
+            pd.date_range("2020-01-31 23:40", periods=4, freq="5T"),
+        )
+        _save_fake_store(
+            os.path.join(tmp_path, "2020_02.zarr"),
+            pd.DatetimeIndex(["2020-02-01 00:00", "2020-02-01 00:05", "2020-02-01 00:05"]),
+        )
+        yield os.path.join(tmp_path, "*.zarr")
+
+
+def test_open_sat_data_from_index(zarr_path):  # noqa: D103
+    index_path = os.path.join(os.path.dirname(zarr_path), "index.npz")
+    expected = open_sat_data(zarr_path, consolidated=True)
+    data = open_sat_data(zarr_path, consolidated=True, index_path=index_path)
+    assert os.path.exists(index_path)
+    xr.testing.assert_identical(data.load(), expected.load())
+    assert len(data.time) == 6
+
+    # Open again, from the saved index.
+    data = open_sat_data(zarr_path, consolidated=True, index_path=index_path)
+    xr.testing.assert_identical(data.load(), expected.load())
+
+
+def test_index_is_rebuilt_when_stores_change(zarr_path):  # noqa: D103
+    index_path = os.path.join(os.path.dirname(zarr_path), "index.npz")
+    open_sat_data(zarr_path, consolidated=True, index_path=index_path)
+    assert len(SatelliteIndex.load(index_path).store_urls) == 2
+
+    _save_fake_store(
+        os.path.join(os.path.dirname(zarr_path), "2020_03.zarr"),
+        pd.date_range("2020-03-01 00:00", periods=2, freq="5T"),
+    )
+    data = open_sat_data(zarr_path, consolidated=True, index_path=index_path)
+    assert len(SatelliteIndex.load(index_path).store_urls) == 3
+    assert len(data.time) == 8
+    assert not any(filename.endswith(".tmp") for filename in os.listdir(os.path.dirname(zarr_path)))
+
+
+def test_index_is_rebuilt_when_a_store_grows(zarr_path):  # noqa: D103
+    index_path = os.path.join(os.path.dirname(zarr_path), "index.npz")
+    open_sat_data(zarr_path, consolidated=True, index_path=index_path)
+
+    # Append timesteps to the last store, in place.
+    store_path = os.path.join(os.path.dirname(zarr_path), "2020_02.zarr")
+    new_data = xr.open_zarr(store_path).isel(time=[0, 1])
+    new_data = new_data.assign_coords(time=pd.date_range("2020-02-01 00:10", periods=2, freq="5T"))
+    new_data.to_zarr(store_path, append_dim="time", consolidated=True)
+
+    expected = open_sat_data(zarr_path, consolidated=True)
+    data = open_sat_data(zarr_path, consolidated=True, index_path=index_path)
+    assert len(data.time) == 8
+    xr.testing.assert_identical(data.load(), expected.load())
+
+
+def test_open_sat_data_from_index_with_encoded_int16(zarr_path):  # noqa: D103
+    # A store whose int16 data has an encoded `_FillValue` and `scale_factor`.
+    zarr_path = os.path.join(os.path.dirname(zarr_path), "encoded", "*.zarr")
+    _save_fake_store(
+        zarr_path.replace("*", "2020_03"),
+        pd.date_range("2020-03-01 00:00", periods=2, freq="5T"),
+        encoding={"_FillValue": np.int16(-1), "scale_factor": 0.25, "dtype": "int16"},
+    )
+    index_path = os.path.join(os.path.dirname(zarr_path), "index.npz")
+    expected = open_sat_data(zarr_path, consolidated=True)
+    assert isinstance(expected.attrs["_FillValue"], np.int16)
+    data = open_sat_data(zarr_path, consolidated=True, index_path=index_path)
+    xr.testing.assert_identical(data.load(), expected.load())
+    assert data.dtype == np.int16
+
+    # Open again, from the saved index.
+    data = open_sat_data(zarr_path, consolidated=True, index_path=index_path)
+    xr.testing.assert_identical(data.load(), expected.load())
+
+
+def test_open_sat_data_from_index_with_overlapping_stores(zarr_path):  # noqa: D103
+    # A store which overlaps both of the other stores, and ends after them.
+    _save_fake_store(
+        os.path.join(os.path.dirname(zarr_path), "2020_01_overlap.zarr"),
+        pd.DatetimeIndex(["2020-01-31 23:55", "2020-02-01 00:00", "2020-02-01 00:10"]),
+    )
+    index_path = os.path.join(os.path.dirname(zarr_path), "index.npz")
+    expected = open_sat_data(zarr_path, consolidated=True)
+    data = open_sat_data(zarr_path, consolidated=True, index_path=index_path)
+    assert len(data.time) == 7
+    xr.testing.assert_identical(data.load(), expected.load())
+
+    # Each duplicated time comes from the first store which holds it.
+    index = SatelliteIndex.load(index_path)
+    np.testing.assert_array_equal(index.store_idx, [0, 0, 0, 0, 1, 2, 1])
+    np.testing.assert_array_equal(index.position_in_store, [0, 1, 2, 3, 1, 1, 2])
+
+
+def test_open_sat_data_from_index_without_checking_the_stores(zarr_path):  # noqa: D103
+    index_path = os.path.join(os.path.dirname(zarr_path), "index.npz")
+    open_sat_data(zarr_path, consolidated=True, index_path=index_path)
+    _save_fake_store(
+        os.path.join(os.path.dirname(zarr_path), "2020_03.zarr"),
+        pd.date_range("2020-03-01 00:00", periods=2, freq="5T"),
+    )
+    data = open_sat_data(zarr_path, consolidated=True, index_path=index_path, check_index=False)
+    assert len(data.time) == 6
+    data = open_sat_data(zarr_path, consolidated=True, index_path=index_path)
+    assert len(data.time) == 8
+
+
+def test_update_index(zarr_path):  # noqa: D103
+    index_path = os.path.join(os.path.dirname(zarr_path), "index.npz")
+    data_source = SatelliteDataSource(
+        zarr_path=zarr_path,
+        index_path=index_path,
+        channels=("IR_016",),
+        history_minutes=0,
+        forecast_minutes=5,
+        image_size_pixels=2,
+        meters_per_pixel=1,
+    )
+    data_source.update_index()
+    assert os.path.exists(index_path)
+
+    # The copies in the worker processes don't check the stores again.
+    data_source = pickle.loads(pickle.dumps(data_source))
+    with mock.patch.object(nd_fs_utils, "get_sorted_urls", side_effect=AssertionError):
+        data_source.open()
+    assert len(data_source.data.time) == 6
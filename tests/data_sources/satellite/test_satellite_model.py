@@ -4,6 +4,7 @@ import tempfile
 
 import numpy as np
 import pytest
+import xarray as xr
 
 from nowcasting_dataset.data_sources.fake import satellite_fake
 from nowcasting_dataset.data_sources.satellite.satellite_model import Satellite
@@ -29,3 +30,34 @@ def test_satellite_save():  # noqa: D103
         satellite_fake().save_netcdf(path=dirpath, batch_i=0)
 
         assert os.path.exists(f"{dirpath}/satellite/000000.nc")
+
+
+def _encode_as_int16(sat: Satellite) -> Satellite:
+    data = (sat.data.fillna(-1) * 100).astype(np.int16)
+    data = data.assign_attrs(scale_factor=0.01, add_offset=0.0, _FillValue=-1)
+    return Satellite(sat.assign(data=data))
+
+
+def test_satellite_decode():  # noqa: D103
+    sat = _encode_as_int16(satellite_fake())
+    sat.data[0, 0, 0, 0, 0] = -1
+
+    decoded = sat.decode()
+    assert isinstance(decoded, Satellite)
+    assert decoded.data.dtype == np.float32
+    assert "scale_factor" not in decoded.data.attrs
+    assert np.isnan(decoded.data[0, 0, 0, 0, 0])
+    np.testing.assert_allclose(decoded.data[1], sat.data[1] / 100, rtol=1e-6)
+
+
+def test_satellite_save_int16():  # noqa: D103
+    sat = _encode_as_int16(satellite_fake())
+    with tempfile.TemporaryDirectory() as dirpath:
+        sat.save_netcdf(path=dirpath, batch_i=0)
+        filename = f"{dirpath}/satellite/000000.nc"
+
+        raw = xr.load_dataset(filename, mask_and_scale=False)
+        assert raw.data.dtype == np.int16
+        np.testing.assert_array_equal(raw.data, sat.data)
+        # By default, xarray decodes the data when loading.
+        xr.testing.assert_allclose(xr.load_dataset(filename).data, sat.decode().data)
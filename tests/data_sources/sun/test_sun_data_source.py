@@ -1,4 +1,5 @@
 import pandas as pd
+import xarray as xr
 
 from nowcasting_dataset.data_sources.sun.sun_data_source import SunDataSource
 
@@ -37,3 +38,19 @@ def test_get_example_different_year(test_data_folder):
 
     assert len(example.elevation) == 19
     assert len(example.azimuth) == 19
+
+
+def test_get_batch_same_as_examples(test_data_folder):
+    zarr_path = test_data_folder + "/sun/test.zarr"
+
+    sun_data_source = SunDataSource(zarr_path=zarr_path, history_minutes=30, forecast_minutes=60)
+
+    t0_datetimes = pd.DatetimeIndex(["2020-04-01 12:00", "2021-04-01 13:05", "2019-04-01 06:30"])
+    x_locations = sun_data_source._locations[:3, 0]
+    y_locations = sun_data_source._locations[:3, 1]
+    kwargs = dict(t0_datetimes=t0_datetimes, x_locations=x_locations, y_locations=y_locations)
+
+    xr.testing.assert_identical(
+        sun_data_source._get_batch_dataset(**kwargs),
+        sun_data_source._get_batch_dataset_from_examples(**kwargs),
+    )
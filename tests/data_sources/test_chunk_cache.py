@@ -0,0 +1,92 @@
+"""Test LRUChunkCache."""
+import threading
+import time
+from concurrent import futures
+
+import dask
+import dask.array
+import numpy as np
+import pytest
+
+from nowcasting_dataset.data_sources.chunk_cache import LRUChunkCache
+
+
+@pytest.mark.parametrize(
+    "slices",
+    [
+        (slice(1, 6), slice(3, 9), slice(None)),
+        (slice(0, 1), slice(0, 1), slice(2, 3)),
+        (slice(6, 7), slice(8, 9), slice(0, 5)),
+        (slice(3, 3), slice(0, 9), slice(0, 5)),
+    ],
+)
+def test_get_subarray(slices):  # noqa: D103
+    array = np.arange(7 * 9 * 5).reshape(7, 9, 5)
+    chunk_cache = LRUChunkCache(max_chunks=3)
+    subarray = chunk_cache.get_subarray(dask.array.from_array(array, chunks=(2, 4, 5)), slices)
+    np.testing.assert_array_equal(subarray, array[slices])
+
+
+def test_least_recently_used_chunk_is_evicted():  # noqa: D103
+    dask_array = dask.array.arange(10, chunks=2)
+    chunk_cache = LRUChunkCache(max_chunks=2)
+    for chunk_idx in [0, 1, 0, 2, 0, 1]:
+        chunk_cache.get_chunk(dask_array, (chunk_idx,))
+    # Loading chunk 2 evicts chunk 1, and then reloading chunk 1 evicts chunk 2.
+    assert (chunk_cache.n_hits, chunk_cache.n_misses) == (2, 4)
+    assert len(chunk_cache) == 2
+
+
+def _make_dask_array(load_chunk, n_chunks: int) -> dask.array.Array:
+    """Make a 1D dask array whose chunk `i` is `load_chunk(i)`, of 2 elements."""
+    return dask.array.concatenate(
+        [
+            dask.array.from_delayed(dask.delayed(load_chunk)(i), shape=(2,), dtype=int)
+            for i in range(n_chunks)
+        ]
+    )
+
+
+def test_different_chunks_are_loaded_in_parallel():  # noqa: D103
+    # Each chunk only loads once both chunks are being loaded at the same time.
+    barrier = threading.Barrier(2, timeout=10)
+
+    def load_chunk(i):
+        barrier.wait()
+        return np.full(2, i)
+
+    dask_array = _make_dask_array(load_chunk, n_chunks=2)
+    chunk_cache = LRUChunkCache(max_chunks=2)
+    with futures.ThreadPoolExecutor(max_workers=2) as executor:
+        chunks = list(executor.map(lambda i: chunk_cache.get_chunk(dask_array, (i,)), range(2)))
+    np.testing.assert_array_equal(chunks, [[0, 0], [1, 1]])
+    assert chunk_cache.n_misses == 2
+
+
+def test_each_chunk_is_loaded_once_by_concurrent_threads():  # noqa: D103
+    n_loads = []
+
+    def load_chunk(i):
+        n_loads.append(i)
+        time.sleep(0.1)
+        return np.full(2, i)
+
+    dask_array = _make_dask_array(load_chunk, n_chunks=1)
+    chunk_cache = LRUChunkCache(max_chunks=1)
+    with futures.ThreadPoolExecutor(max_workers=4) as executor:
+        chunks = list(executor.map(lambda _: chunk_cache.get_chunk(dask_array, (0,)), range(4)))
+    np.testing.assert_array_equal(chunks, [[0, 0]] * 4)
+    assert n_loads == [0]
+    assert (chunk_cache.n_hits, chunk_cache.n_misses) == (3, 1)
+
+
+def test_failed_load_is_not_cached():  # noqa: D103
+    def load_chunk(i):
+        raise OSError("Can't read chunk")
+
+    chunk_cache = LRUChunkCache(max_chunks=1)
+    dask_array = _make_dask_array(load_chunk, n_chunks=1)
+    for _ in range(2):
+        with pytest.raises(OSError):
+            chunk_cache.get_chunk(dask_array, (0,))
+    assert len(chunk_cache) == 0
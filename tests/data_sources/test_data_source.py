@@ -1,4 +1,5 @@
-from nowcasting_dataset.data_sources.data_source import ImageDataSource
+from nowcasting_dataset.config.model import ValidationLevel
+from nowcasting_dataset.data_sources.data_source import ImageDataSource, should_validate_batch
 
 
 def test_image_data_source():
@@ -8,3 +9,18 @@ def test_image_data_source():
         history_minutes=30,
         forecast_minutes=60,
     )
+
+
+def test_should_validate_batch():  # noqa: D103
+    batch_idxs = range(10)
+    for validation_level, correct in [
+        (ValidationLevel.FULL, list(batch_idxs)),
+        (ValidationLevel.SAMPLED, [0, 4, 8]),
+        (ValidationLevel.OFF, []),
+    ]:
+        validated_batch_idxs = [
+            batch_idx
+            for batch_idx in batch_idxs
+            if should_validate_batch(batch_idx, validation_level, validate_every_n_batches=4)
+        ]
+        assert validated_batch_idxs == correct
@@ -1,4 +1,13 @@
 """ Tests for data_sources """
+import os
+import tempfile
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from nowcasting_dataset.config.model import BatchFileEncoding
+from nowcasting_dataset.data_sources.datasource_output import get_min_and_max, get_netcdf_encoding
 from nowcasting_dataset.data_sources.fake import (
     gsp_fake,
     nwp_fake,
@@ -26,6 +35,17 @@ def test_nwp():
     )
 
 
+@pytest.mark.parametrize("value", [np.NaN, np.inf])
+def test_nwp_validation(value):
+    """Test that NWP validation rejects NaNs and infinite values"""
+    nwp = nwp_fake(batch_size=2, seq_length_60=2, image_size_pixels=4, number_nwp_channels=2)
+    nwp.model_validation(nwp)
+
+    nwp.data[0, 0, 0, 0, 0] = value
+    with pytest.raises(Exception):
+        nwp.model_validation(nwp)
+
+
 def test_pv():
     """Test pv fake"""
     _ = pv_fake(batch_size=4, seq_length_5=13, n_pv_systems_per_batch=128)
@@ -54,3 +74,61 @@ def test_topo():
         batch_size=4,
         image_size_pixels=64,
     )
+
+
+def test_get_min_and_max():
+    """Test getting the min and max in blocks"""
+    array = np.random.default_rng(42).normal(size=(10, 11, 12))
+    assert get_min_and_max(array, n_elements_per_block=100) == (array.min(), array.max())
+
+    array[3, 4, 5] = np.NaN
+    assert np.isnan(get_min_and_max(array, n_elements_per_block=100)).all()
+
+
+@pytest.mark.parametrize(
+    "value,kwargs",
+    [(np.NaN, {}), (np.inf, {}), (-1, dict(min_value=0)), (361, dict(max_value=360))],
+)
+def test_check_data_var(value, kwargs):
+    """Test checking NaNs, infinite values, min and max values in one sweep"""
+    sun = sun_fake(batch_size=4, seq_length_5=13)
+    azimuth = sun.azimuth.astype(np.float64)
+    sun.check_data_var(azimuth, min_value=0, max_value=360)
+
+    azimuth[1, 2] = value
+    with pytest.raises(Exception):
+        sun.check_data_var(azimuth, **kwargs)
+
+
+def test_check_data_var_not_equal():
+    """Test checking for values close to a certain value"""
+    sun = sun_fake(batch_size=4, seq_length_5=13)
+    azimuth = sun.azimuth.astype(np.float64)
+    sun.check_data_var(azimuth, not_equal_value=-1)
+
+    azimuth[1, 2] = -1
+    sun.check_data_var(azimuth, not_equal_value=-1, raise_error_if_equal=False)
+    with pytest.raises(Exception):
+        sun.check_data_var(azimuth, not_equal_value=-1)
+
+
+def test_get_netcdf_encoding():
+    """Test saving a batch with compression, chunks and a different dtype"""
+    pv = pv_fake(batch_size=4, seq_length_5=13, n_pv_systems_per_batch=8)
+    batch_file_encoding = BatchFileEncoding(
+        compression="gzip", compression_level=4, shuffle=True, dtype="float32", chunks={"example": 1}
+    )
+    encoding = get_netcdf_encoding(pv, batch_file_encoding)
+
+    with tempfile.TemporaryDirectory() as tmp_path:
+        filename = os.path.join(tmp_path, "batch.nc")
+        pv.to_netcdf(filename, engine="h5netcdf", encoding=encoding)
+        with xr.open_dataset(filename, engine="h5netcdf") as loaded_pv:
+            assert loaded_pv.power_mw.dtype == np.float32
+            assert loaded_pv.power_mw.encoding["zlib"]
+            assert loaded_pv.power_mw.encoding["complevel"] == 4
+            assert loaded_pv.power_mw.encoding["chunksizes"] == (1, 13, 8)
+            assert loaded_pv.time.dtype == pv.time.dtype
+            np.testing.assert_allclose(loaded_pv.power_mw, pv.power_mw, rtol=1e-6)
+
+    assert get_netcdf_encoding(pv, None) == {}
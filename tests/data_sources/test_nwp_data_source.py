@@ -1,10 +1,15 @@
 # noqa: D100
 import os
+import tempfile
 
+import numpy as np
 import pandas as pd
+import pytest
+import xarray as xr
 
 import nowcasting_dataset
 from nowcasting_dataset.data_sources.nwp.nwp_data_source import NWPDataSource
+from nowcasting_dataset.data_sources.nwp.nwp_point_store import write_nwp_point_store
 
 PATH = os.path.dirname(nowcasting_dataset.__file__)
 
@@ -77,6 +82,24 @@ def test_nwp_data_source_batch_not_on_hour():  # noqa: D103
     assert batch.data.shape == (1, 1, 3, 2, 2)
 
 
+@pytest.mark.parametrize("validate", [False, True])
+def test_nwp_data_source_batch_fills_nans(validate):  # noqa: D103
+    nwp = NWPDataSource(
+        zarr_path=NWP_ZARR_PATH, history_minutes=60, forecast_minutes=60, channels=["t"]
+    )
+    nwp.open()
+    nwp._data = nwp.data.where(nwp.data.x != nwp.data.x[0])
+
+    t0_datetimes = [pd.Timestamp(t) for t in nwp.data.init_time[2:4].values]
+    x = nwp.data.x[0:2].values
+    y = nwp.data.y[0:2].values
+    batch = nwp.get_batch(
+        t0_datetimes=t0_datetimes, x_locations=x, y_locations=y, validate=validate
+    )
+    assert not batch.data.isnull().any()
+    assert (batch.data.isel(example=0, x_index=0) == 0).all()
+
+
 def test_nwp_get_contiguous_time_periods():  # noqa: D103
     nwp = NWPDataSource(
         zarr_path=NWP_ZARR_PATH,
@@ -105,3 +128,201 @@ def test_nwp_get_contiguous_t0_time_periods():  # noqa: D103
         [{"start_dt": pd.Timestamp("2020-04-01 01:00"), "end_dt": pd.Timestamp("2020-04-02 03:00")}]
     )
     pd.testing.assert_frame_equal(contiguous_time_periods, correct_time_periods)
+
+
+def test_nwp_datetime_index_with_gaps():  # noqa: D103
+    nwp = NWPDataSource(
+        zarr_path=NWP_ZARR_PATH, history_minutes=60, forecast_minutes=60, channels=["t"]
+    )
+    nwp.open()
+    pd.testing.assert_index_equal(nwp.datetime_index(), nwp._get_target_times())
+
+    # Leave out some init times, so there are gaps between the forecasts.
+    nwp._init_time_ns = nwp._init_time_ns[[0, 1, 4, 5, 6, 8]]
+    nwp._target_time_periods = None
+    pd.testing.assert_index_equal(nwp.datetime_index(), nwp._get_target_times())
+    contiguous_time_periods = nwp.get_contiguous_time_periods()
+    start_dts = ["2020-04-01 00:00", "2020-04-01 12:00", "2020-04-02 00:00"]
+    end_dts = ["2020-04-01 07:00", "2020-04-01 22:00", "2020-04-02 04:00"]
+    correct_time_periods = pd.DataFrame(
+        {"start_dt": pd.to_datetime(start_dts), "end_dt": pd.to_datetime(end_dts)}
+    )
+    pd.testing.assert_frame_equal(contiguous_time_periods, correct_time_periods)
+
+
+def test_nwp_data_source_batch_load_each_t0_once():  # noqa: D103
+    kwargs = dict(zarr_path=NWP_ZARR_PATH, history_minutes=60, forecast_minutes=60, channels=["t"])
+    nwp = NWPDataSource(**kwargs)
+    nwp_t0_major = NWPDataSource(load_each_t0_once=True, **kwargs)
+    nwp.open()
+    nwp_t0_major.open()
+
+    # Two examples share each t0.
+    t0_datetimes = [pd.Timestamp(t) for t in nwp._data.init_time[[2, 3, 2, 3]].values]
+    x = nwp._data.x[[0, 1, 4, 5]].values
+    y = nwp._data.y[[0, 1, 4, 5]].values
+
+    batch = nwp.get_batch(t0_datetimes=t0_datetimes, x_locations=x, y_locations=y)
+    batch_t0_major = nwp_t0_major.get_batch(
+        t0_datetimes=t0_datetimes, x_locations=x, y_locations=y
+    )
+    xr.testing.assert_identical(xr.Dataset(batch_t0_major), xr.Dataset(batch))
+
+
+@pytest.mark.parametrize("load_each_t0_once", [False, True])
+def test_nwp_data_source_batch_from_chunk_cache(load_each_t0_once):  # noqa: D103
+    kwargs = dict(
+        zarr_path=NWP_ZARR_PATH,
+        history_minutes=60,
+        forecast_minutes=60,
+        channels=["t"],
+        load_each_t0_once=load_each_t0_once,
+    )
+    nwp = NWPDataSource(**kwargs)
+    cached_nwp = NWPDataSource(max_chunks_in_cache=8, **kwargs)
+    nwp.open()
+    cached_nwp.open()
+
+    # Sites which aren't on the NWP grid, and which share chunks.
+    t0_datetimes = pd.DatetimeIndex(["2020-04-01 06:30", "2020-04-01 06:30", "2020-04-01 12:00"])
+    x = nwp.data.x.values[[10, 20, 300]] + 500.5
+    y = nwp.data.y.values[[10, 20, 400]] - 300.25
+    batch = nwp.get_batch(t0_datetimes=t0_datetimes, x_locations=x, y_locations=y)
+    cached_batch = cached_nwp.get_batch(t0_datetimes=t0_datetimes, x_locations=x, y_locations=y)
+    xr.testing.assert_identical(xr.Dataset(cached_batch), xr.Dataset(batch))
+    assert cached_nwp._chunk_cache.n_hits > 0
+
+
+def test_nwp_init_time_lookup_table():  # noqa: D103
+    nwp = NWPDataSource(
+        zarr_path=NWP_ZARR_PATH, history_minutes=60, forecast_minutes=120, channels=["t"]
+    )
+    nwp.open()
+
+    for t0_dt in pd.date_range("2020-04-01 01:00", "2020-04-02 02:00", freq="25T"):
+        start_hourly = nwp._get_start_dt(t0_dt).floor("H")
+        end_hourly = nwp._get_end_dt(t0_dt).ceil("H")
+        init_time = nwp.data.init_time.sel(init_time=start_hourly, method="ffill").values
+        expected = nwp.data.sel(
+            init_time=init_time, step=slice(start_hourly - init_time, end_hourly - init_time)
+        )
+        expected = expected.swap_dims({"step": "target_time"})
+        expected["target_time"] = init_time + expected.step
+        xr.testing.assert_identical(nwp._get_time_slice(t0_dt), expected)
+
+
+def test_nwp_init_time_policy_closest_to_t0():  # noqa: D103
+    nwp = NWPDataSource(
+        zarr_path=NWP_ZARR_PATH,
+        history_minutes=60,
+        forecast_minutes=120,
+        channels=["t"],
+        init_time_policy="closest_to_t0",
+    )
+    nwp.open()
+
+    # The init times are 3-hourly.  The history uses the most recent init time at each target
+    # time, and the forecast uses the most recent init time at t0.
+    selected = nwp._get_time_slice(pd.Timestamp("2020-04-01 06:30"))
+    pd.testing.assert_index_equal(
+        pd.DatetimeIndex(selected.target_time.values),
+        pd.date_range("2020-04-01 05:00", "2020-04-01 09:00", freq="H"),
+    )
+    pd.testing.assert_index_equal(
+        pd.DatetimeIndex(selected.init_time.values),
+        pd.DatetimeIndex(["2020-04-01 03:00"] + ["2020-04-01 06:00"] * 4),
+    )
+    xr.testing.assert_identical(
+        selected.isel(target_time=2).drop_vars("target_time"),
+        nwp.data.sel(init_time="2020-04-01 06:00", step=pd.Timedelta("1H")),
+    )
+
+    batch = nwp.get_batch(
+        t0_datetimes=[pd.Timestamp("2020-04-01 06:30")] * 2,
+        x_locations=nwp.data.x[[0, 4]].values,
+        y_locations=nwp.data.y[[0, 4]].values,
+    )
+    assert batch.data.shape == (2, 1, 4, 2, 2)
+
+
+@pytest.mark.parametrize("load_each_t0_once", [False, True])
+@pytest.mark.parametrize("init_time_policy", ["latest_before_start", "closest_to_t0"])
+def test_nwp_point_store(load_each_t0_once, init_time_policy):  # noqa: D103
+    kwargs = dict(
+        zarr_path=NWP_ZARR_PATH,
+        history_minutes=60,
+        forecast_minutes=60,
+        channels=["t"],
+        load_each_t0_once=load_each_t0_once,
+        init_time_policy=init_time_policy,
+    )
+    nwp = NWPDataSource(**kwargs)
+    nwp.open()
+
+    # Sites which aren't on the NWP grid.  The last site is outside of the NWP data.
+    x = nwp.data.x.values[[10, 20, 30]] + 500.5
+    y = nwp.data.y.values[[10, 20, 30]] - 300.25
+    with tempfile.TemporaryDirectory() as tmp_path:
+        point_store_path = os.path.join(tmp_path, "nwp_points.zarr")
+        write_nwp_point_store(
+            nwp,
+            x_locations=list(x) + [-1e9],
+            y_locations=list(y) + [0],
+            output_path=point_store_path,
+            init_times_per_chunk=2,
+        )
+        nwp_points = NWPDataSource(point_store_path=point_store_path, **kwargs)
+        nwp_points.open()
+        assert nwp_points._point_data.sizes["location"] == 3
+
+        t0_datetimes = pd.DatetimeIndex(
+            ["2020-04-01 06:30", "2020-04-01 06:30", "2020-04-01 12:00"]
+        )
+        batch = nwp.get_batch(t0_datetimes=t0_datetimes, x_locations=x, y_locations=y)
+        batch_from_points = nwp_points.get_batch(
+            t0_datetimes=t0_datetimes, x_locations=x, y_locations=y
+        )
+        xr.testing.assert_identical(xr.Dataset(batch_from_points), xr.Dataset(batch))
+
+        # Examples centred anywhere else are read from the NWP Zarr.
+        x[0] += 1000
+        batch = nwp.get_batch(t0_datetimes=t0_datetimes, x_locations=x, y_locations=y)
+        batch_from_points = nwp_points.get_batch(
+            t0_datetimes=t0_datetimes, x_locations=x, y_locations=y
+        )
+        xr.testing.assert_identical(xr.Dataset(batch_from_points), xr.Dataset(batch))
+
+
+@pytest.mark.parametrize("init_time_policy", ["latest_before_start", "closest_to_t0"])
+def test_nwp_resample_to_5_minutes(init_time_policy):  # noqa: D103
+    kwargs = dict(
+        zarr_path=NWP_ZARR_PATH,
+        history_minutes=60,
+        forecast_minutes=60,
+        channels=["t"],
+        init_time_policy=init_time_policy,
+    )
+    nwp = NWPDataSource(resample_to_5_minutes=True, **kwargs)
+    nwp.open()
+
+    t0_datetimes = pd.DatetimeIndex(["2020-04-01 07:05", "2020-04-01 07:00", "2020-04-01 10:35"])
+    x = nwp.data.x.values[[5, 6, 7]]
+    y = nwp.data.y.values[[5, 6, 7]]
+    batch = nwp.get_batch(t0_datetimes=t0_datetimes, x_locations=x, y_locations=y)
+    assert batch.data.shape == (3, 1, 25, 2, 2)
+
+    # Each example has one more hourly step than usual, which is then interpolated.
+    for example_i, t0_dt in enumerate(t0_datetimes):
+        example = nwp.get_example(t0_dt, x[example_i], y[example_i])
+        assert len(example.time) == 4
+        times = pd.date_range(t0_dt - pd.Timedelta("1H"), t0_dt + pd.Timedelta("1H"), freq="5T")
+        np.testing.assert_array_equal(batch.time.values[example_i], times.values)
+        np.testing.assert_allclose(
+            batch.data.values[example_i], example.data.interp(time=times).values, rtol=1e-6
+        )
+
+    # The last t0 is an hour earlier, because each example needs the hour after it ends.
+    contiguous_time_periods = nwp.get_contiguous_t0_time_periods()
+    correct_time_periods = NWPDataSource(**kwargs).get_contiguous_t0_time_periods()
+    correct_time_periods["end_dt"] -= pd.Timedelta("1H")
+    pd.testing.assert_frame_equal(contiguous_time_periods, correct_time_periods)
@@ -5,6 +5,7 @@ from datetime import datetime
 
 import pandas as pd
 import pytest
+import xarray as xr
 
 import nowcasting_dataset
 from nowcasting_dataset.data_sources.fake import pv_fake
@@ -57,6 +58,18 @@ def test_get_example_and_batch():  # noqa: D103
     )
     assert batch.power_mw.shape == (10, 19, 128)
 
+    # The batch must be the same as joining the examples together.
+    pv_data_source.random_pv_system_for_given_location = False
+    kwargs = dict(
+        t0_datetimes=pv_data_source.pv_power.index[6:16],
+        x_locations=x_locations[0:10],
+        y_locations=y_locations[0:10],
+    )
+    xr.testing.assert_identical(
+        pv_data_source._get_batch_dataset(**kwargs),
+        pv_data_source._get_batch_dataset_from_examples(**kwargs),
+    )
+
 
 def test_drop_pv_systems_which_produce_overnight():  # noqa: D103
     pv_power = pd.DataFrame(index=pd.date_range("2010-01-01", "2010-01-02", freq="5 min"))
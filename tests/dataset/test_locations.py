@@ -0,0 +1,68 @@
+"""Test saving and loading the locations of each example."""
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from nowcasting_dataset.dataset import locations as nd_locations
+
+
+@pytest.fixture
+def locations():  # noqa: D103
+    n_examples = 10
+    return pd.DataFrame(
+        {
+            "t0_datetime_UTC": pd.date_range("2020-04-01 12:00", periods=n_examples, freq="5T"),
+            "x_center_OSGB": np.linspace(100_000, 200_000, n_examples),
+            "y_center_OSGB": np.linspace(300_000, 400_000, n_examples),
+        }
+    )
+
+
+def test_save_and_load_locations(locations):  # noqa: D103
+    with tempfile.TemporaryDirectory() as tmp_path:
+        filename = os.path.join(tmp_path, "locations.npy")
+        nd_locations.save_locations(locations, filename)
+
+        assert nd_locations.get_number_of_locations(filename) == len(locations)
+        loaded_locations = nd_locations.load_locations(filename)
+
+    pd.testing.assert_frame_equal(loaded_locations, locations, check_dtype=False)
+    assert loaded_locations["x_center_OSGB"].dtype == np.float32
+
+
+@pytest.mark.parametrize("filename", ["locations.npy", "memory://locations.npy"])
+def test_load_row_range(locations, filename):  # noqa: D103
+    with tempfile.TemporaryDirectory() as tmp_path:
+        if not filename.startswith("memory://"):
+            filename = os.path.join(tmp_path, filename)
+        nd_locations.save_locations(locations, filename)
+        loaded_locations = nd_locations.load_locations(filename, start_row=4, end_row=8)
+
+    pd.testing.assert_frame_equal(loaded_locations, locations.iloc[4:8], check_dtype=False)
+
+
+def test_load_locations_from_csv(locations):  # noqa: D103
+    with tempfile.TemporaryDirectory() as tmp_path:
+        filename = os.path.join(tmp_path, "locations.csv")
+        locations.to_csv(filename)
+        loaded_locations = nd_locations.load_locations_from_csv(filename)
+
+    pd.testing.assert_frame_equal(loaded_locations, locations)
+
+
+def test_sort_locations_within_each_batch(locations):  # noqa: D103
+    shuffled_locations = locations.sample(frac=1, random_state=0).reset_index(drop=True)
+    sorted_locations = nd_locations.sort_locations_within_each_batch(
+        shuffled_locations, batch_size=4
+    )
+    for start_row in range(0, len(locations), 4):
+        batch = shuffled_locations.iloc[start_row : start_row + 4]
+        sorted_batch = sorted_locations.iloc[start_row : start_row + 4]
+        assert sorted_batch["t0_datetime_UTC"].is_monotonic_increasing
+        pd.testing.assert_frame_equal(
+            sorted_batch.reset_index(drop=True),
+            batch.sort_values("t0_datetime_UTC").reset_index(drop=True),
+        )
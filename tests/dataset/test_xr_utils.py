@@ -0,0 +1,31 @@
+"""Test joining examples into a batch."""
+import numpy as np
+import xarray as xr
+
+from nowcasting_dataset.data_sources.fake import create_gsp_pv_dataset, create_image_array
+from nowcasting_dataset.dataset.xr_utils import (
+    convert_coordinates_to_indexes_for_list_datasets,
+    join_list_dataset_to_batch_dataset,
+    join_list_dataset_to_batch_dataset_with_concat,
+)
+
+
+def test_join_list_dataset_to_batch_dataset():  # noqa: D103
+    examples = [
+        create_image_array(seq_length=5, image_size_pixels=8).to_dataset() for _ in range(4)
+    ]
+    examples = convert_coordinates_to_indexes_for_list_datasets(examples)
+
+    batch = join_list_dataset_to_batch_dataset(examples)
+
+    xr.testing.assert_identical(batch, join_list_dataset_to_batch_dataset_with_concat(examples))
+    np.testing.assert_array_equal(batch.data[2], examples[2].data)
+
+
+def test_join_list_dataset_to_batch_dataset_with_different_layouts():  # noqa: D103
+    # The IDs (which are coords) are different in each example, so the examples are aligned.
+    examples = [create_gsp_pv_dataset(seq_length=4, number_of_systems=3) for _ in range(2)]
+
+    batch = join_list_dataset_to_batch_dataset(examples)
+
+    xr.testing.assert_identical(batch, join_list_dataset_to_batch_dataset_with_concat(examples))
@@ -0,0 +1,85 @@
+"""Test saving and loading batches in a Zarr store."""
+import tempfile
+
+import numpy as np
+import pytest
+import xarray as xr
+import zarr
+
+from nowcasting_dataset.data_sources.fake import pv_fake, satellite_fake
+from nowcasting_dataset.dataset import zarr_batches
+
+
+@pytest.mark.parametrize("zarr_path", ["pv.zarr", "memory://pv.zarr"])
+def test_append_and_load_batches(zarr_path):  # noqa: D103
+    batches = [pv_fake(batch_size=4, seq_length_5=13, n_pv_systems_per_batch=8) for _ in range(3)]
+    with tempfile.TemporaryDirectory() as tmp_path:
+        if not zarr_path.startswith("memory://"):
+            zarr_path = f"{tmp_path}/{zarr_path}"
+
+        assert zarr_batches.get_number_of_batches_in_zarr(zarr_path) == 0
+        for batch_idx, batch in enumerate(batches):
+            zarr_batches.append_batch_to_zarr(batch, zarr_path, batch_idx=batch_idx)
+        assert zarr_batches.get_number_of_batches_in_zarr(zarr_path) == 3
+
+        for batch_idx, batch in enumerate(batches):
+            loaded_batch = zarr_batches.load_batch_from_zarr(zarr_path, batch_idx)
+            xr.testing.assert_identical(loaded_batch, xr.Dataset(batch))
+
+        # Re-writing batch 1 removes batch 2.
+        zarr_batches.append_batch_to_zarr(batches[0], zarr_path, batch_idx=1)
+        assert zarr_batches.get_number_of_batches_in_zarr(zarr_path) == 2
+
+        # Batches can't be skipped.
+        with pytest.raises(ValueError):
+            zarr_batches.append_batch_to_zarr(batches[0], zarr_path, batch_idx=3)
+
+
+def test_append_int16_batches(tmp_path):  # noqa: D103
+    zarr_path = tmp_path / "satellite.zarr"
+    batches = []
+    for _ in range(2):
+        batch = satellite_fake(batch_size=4, seq_length_5=3, satellite_image_size_pixels=8)
+        data = (batch.data.fillna(0) * 100).astype(np.int16)
+        batches.append(batch.assign(data=data.assign_attrs(scale_factor=0.01, _FillValue=-1)))
+
+    for batch_idx, batch in enumerate(batches):
+        zarr_batches.append_batch_to_zarr(batch, zarr_path, batch_idx=batch_idx)
+
+    raw = xr.open_zarr(zarr_path, mask_and_scale=False)
+    assert raw.data.dtype == np.int16
+    for batch_idx, batch in enumerate(batches):
+        np.testing.assert_array_equal(raw.data[batch_idx], batch.data)
+        loaded_batch = zarr_batches.load_batch_from_zarr(zarr_path, batch_idx)
+        np.testing.assert_allclose(loaded_batch.data, batch.data / 100, rtol=1e-6)
+
+
+def test_each_chunk_holds_one_batch(tmp_path):  # noqa: D103
+    zarr_path = tmp_path / "satellite.zarr"
+    batches = [
+        satellite_fake(batch_size=8, seq_length_5=13, satellite_image_size_pixels=64)
+        for _ in range(2)
+    ]
+    for batch_idx, batch in enumerate(batches):
+        zarr_batches.append_batch_to_zarr(batch, zarr_path, batch_idx=batch_idx)
+
+    group = zarr.open_group(str(zarr_path), mode="r")
+    for name in ("data", "time", "x", "y"):
+        assert group[name].chunks == (1, *group[name].shape[1:])
+
+
+def test_append_batches_without_consolidating(tmp_path):  # noqa: D103
+    zarr_path = tmp_path / "pv.zarr"
+    batches = [pv_fake(batch_size=4, seq_length_5=13, n_pv_systems_per_batch=8) for _ in range(3)]
+    for batch_idx, batch in enumerate(batches):
+        zarr_batches.append_batch_to_zarr(
+            batch, zarr_path, batch_idx=batch_idx, truncate=False, consolidate=False
+        )
+
+    # The consolidated metadata is written by the first batch, and then not updated.
+    assert zarr_batches.get_number_of_batches_in_zarr(zarr_path) == 1
+    zarr_batches.consolidate_zarr_metadata(zarr_path)
+    assert zarr_batches.get_number_of_batches_in_zarr(zarr_path) == 3
+    for batch_idx, batch in enumerate(batches):
+        loaded_batch = zarr_batches.load_batch_from_zarr(zarr_path, batch_idx)
+        xr.testing.assert_identical(loaded_batch, xr.Dataset(batch))
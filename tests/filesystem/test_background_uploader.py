@@ -0,0 +1,30 @@
+# noqa: D100
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from nowcasting_dataset.filesystem.background_uploader import BackgroundUploader
+
+
+def test_background_uploader():  # noqa: D103
+    with tempfile.TemporaryDirectory() as local_path, tempfile.TemporaryDirectory() as dst_path:
+        local_filenames = [Path(local_path) / f"{i:06d}.nc" for i in range(5)]
+
+        with BackgroundUploader(dst_path, max_files_in_queue=2) as uploader:
+            for local_filename in local_filenames:
+                local_filename.write_text("fake batch")
+                uploader.upload(local_filename)
+
+        # Each file has been uploaded, and then deleted locally.
+        assert sorted(os.listdir(dst_path)) == [filename.name for filename in local_filenames]
+        assert os.listdir(local_path) == []
+
+
+def test_background_uploader_raises_exceptions():  # noqa: D103
+    with tempfile.TemporaryDirectory() as local_path, tempfile.TemporaryDirectory() as dst_path:
+        uploader = BackgroundUploader(dst_path, max_files_in_queue=2)
+        uploader.upload(Path(local_path) / "does_not_exist.nc")
+        with pytest.raises(RuntimeError):
+            uploader.close()
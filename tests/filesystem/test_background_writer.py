@@ -0,0 +1,92 @@
+# noqa: D100
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+import xarray as xr
+
+from nowcasting_dataset.data_sources.fake import sun_fake
+from nowcasting_dataset.dataset import zarr_batches
+from nowcasting_dataset.dataset.zarr_batches import load_batch_from_zarr
+from nowcasting_dataset.filesystem.background_uploader import BackgroundUploader
+from nowcasting_dataset.filesystem.background_writer import BackgroundWriter, BackgroundZarrWriter
+
+
+def test_background_writer():  # noqa: D103
+    batches = [sun_fake(batch_size=2, seq_length_5=5) for _ in range(3)]
+    with tempfile.TemporaryDirectory() as local_path:
+        with BackgroundWriter(local_path, max_batches_in_queue=1) as writer:
+            for batch_idx, batch in enumerate(batches):
+                writer.write(batch, batch_idx)
+
+        for batch_idx, batch in enumerate(batches):
+            filename = Path(local_path) / f"{batch_idx:06d}.nc"
+            loaded_batch = xr.load_dataset(filename, engine="h5netcdf")
+            xr.testing.assert_identical(loaded_batch, xr.Dataset(batch))
+
+
+def test_background_writer_then_upload():  # noqa: D103
+    with tempfile.TemporaryDirectory() as local_path, tempfile.TemporaryDirectory() as dst_path:
+        with BackgroundUploader(dst_path, max_files_in_queue=2) as uploader:
+            with BackgroundWriter(local_path, uploader=uploader) as writer:
+                writer.write(sun_fake(batch_size=2, seq_length_5=5), batch_idx=0)
+
+        assert os.listdir(dst_path) == ["000000.nc"]
+        assert os.listdir(local_path) == []
+
+
+def test_background_writer_raises_exceptions():  # noqa: D103
+    writer = BackgroundWriter("/does/not/exist/")
+    writer.write(sun_fake(batch_size=2, seq_length_5=5), batch_idx=0)
+    with pytest.raises(RuntimeError):
+        writer.close()
+
+
+def test_background_writer_does_not_mask_exceptions():  # noqa: D103
+    writer = BackgroundWriter("/this/path/does/not/exist/")
+    with pytest.raises(KeyboardInterrupt):
+        with writer:
+            writer.write(sun_fake(batch_size=2, seq_length_5=5), batch_idx=0)
+            raise KeyboardInterrupt()
+    assert writer._exception is not None
+
+
+def test_background_zarr_writer():  # noqa: D103
+    batches = [sun_fake(batch_size=2, seq_length_5=5) for _ in range(3)]
+    with tempfile.TemporaryDirectory() as local_path:
+        zarr_path = Path(local_path) / "sun.zarr"
+        with BackgroundZarrWriter(zarr_path) as writer:
+            for batch_idx, batch in enumerate(batches):
+                writer.write(batch, batch_idx)
+
+        for batch_idx, batch in enumerate(batches):
+            loaded_batch = load_batch_from_zarr(zarr_path, batch_idx)
+            xr.testing.assert_identical(loaded_batch, xr.Dataset(batch))
+
+
+def test_background_zarr_writer_only_truncates_when_resuming(tmp_path, monkeypatch):  # noqa: D103
+    batches = [sun_fake(batch_size=2, seq_length_5=5) for _ in range(4)]
+    zarr_path = tmp_path / "sun.zarr"
+    with BackgroundZarrWriter(zarr_path) as writer:
+        for batch_idx, batch in enumerate(batches[:3]):
+            writer.write(batch, batch_idx)
+
+    batch_idxs_checked = []
+    check_and_truncate_zarr = zarr_batches._check_and_truncate_zarr
+
+    def spy(zarr_path, batch_idx):
+        batch_idxs_checked.append(batch_idx)
+        check_and_truncate_zarr(zarr_path, batch_idx)
+
+    monkeypatch.setattr(zarr_batches, "_check_and_truncate_zarr", spy)
+
+    # Resume from batch 2, which overwrites the last batch.
+    with BackgroundZarrWriter(zarr_path) as writer:
+        for batch_idx in (2, 3):
+            writer.write(batches[batch_idx], batch_idx)
+
+    assert batch_idxs_checked == [2]
+    assert zarr_batches.get_number_of_batches_in_zarr(zarr_path) == 4
+    for batch_idx, batch in enumerate(batches):
+        xr.testing.assert_identical(load_batch_from_zarr(zarr_path, batch_idx), xr.Dataset(batch))
@@ -0,0 +1,85 @@
+"""Test the local disk cache of remote Zarr chunks.
+
+A local filesystem stands in for GCS: the DiskCacheStore can't tell the difference.
+"""
+import os
+import pickle
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pytest
+import xarray as xr
+
+import nowcasting_dataset
+from nowcasting_dataset.data_sources.nwp.nwp_data_source import open_nwp
+from nowcasting_dataset.data_sources.satellite.satellite_data_source import open_sat_data
+from nowcasting_dataset.filesystem.disk_cache import (
+    DiskCacheStore,
+    evict_least_recently_used_files,
+)
+
+PATH = Path(nowcasting_dataset.__file__).parent.parent / "tests" / "data"
+
+
+@pytest.fixture
+def remote_zarr_path():  # noqa: D103
+    with tempfile.TemporaryDirectory() as tmp_path:
+        zarr_path = os.path.join(tmp_path, "remote.zarr")
+        xr.Dataset({"data": (("x",), np.arange(100))}).chunk({"x": 10}).to_zarr(zarr_path)
+        yield zarr_path
+
+
+def test_disk_cache_store_reads_through(remote_zarr_path):  # noqa: D103
+    with tempfile.TemporaryDirectory() as cache_path:
+        store = DiskCacheStore(remote_zarr_path, cache_path=cache_path, max_bytes=1_000_000)
+        expected = xr.open_zarr(remote_zarr_path).load()
+        xr.testing.assert_identical(xr.open_zarr(store).load(), expected)
+
+        # Now every value is in the cache, so we don't need the remote store any more.
+        store = pickle.loads(pickle.dumps(store))
+        store._store = {}
+        xr.testing.assert_identical(xr.open_zarr(store).load(), expected)
+
+        with pytest.raises(PermissionError):
+            store["data/0"] = b""
+
+
+def test_disk_cache_store_evicts_old_files(remote_zarr_path):  # noqa: D103
+    with tempfile.TemporaryDirectory() as cache_path:
+        store = DiskCacheStore(remote_zarr_path, cache_path=cache_path, max_bytes=2_000)
+        xr.open_zarr(store).load()
+        total_bytes = sum(
+            os.path.getsize(os.path.join(dirpath, filename))
+            for dirpath, _, filenames in os.walk(cache_path)
+            for filename in filenames
+        )
+        assert 0 < total_bytes <= 2_000
+
+
+def test_evict_least_recently_used_files():  # noqa: D103
+    with tempfile.TemporaryDirectory() as cache_path:
+        for i in range(4):
+            filename = os.path.join(cache_path, f"{i}")
+            with open(filename, mode="wb") as file:
+                file.write(bytes(100))
+            os.utime(filename, times=(i, i))
+        n_deleted = evict_least_recently_used_files(cache_path, max_bytes=300, target_bytes=200)
+        assert n_deleted == 2
+        assert sorted(os.listdir(cache_path)) == ["2", "3"]
+
+
+def test_open_sat_data_with_disk_cache():  # noqa: D103
+    zarr_path = PATH / "sat_data.zarr"
+    with tempfile.TemporaryDirectory() as cache_path:
+        data = open_sat_data(zarr_path, consolidated=True, disk_cache_path=cache_path)
+        xr.testing.assert_identical(data, open_sat_data(zarr_path, consolidated=True))
+        assert len(os.listdir(cache_path)) == 1
+
+
+def test_open_nwp_with_disk_cache():  # noqa: D103
+    zarr_path = str(PATH / "nwp_data" / "test.zarr")
+    with tempfile.TemporaryDirectory() as cache_path:
+        data = open_nwp(zarr_path, consolidated=True, disk_cache_path=cache_path)
+        xr.testing.assert_identical(data, open_nwp(zarr_path, consolidated=True))
+        assert len(os.listdir(cache_path)) == 1
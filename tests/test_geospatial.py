@@ -1,6 +1,7 @@
 """ Test for geospatial functions """
 import numpy as np
 import pandas as pd
+import pvlib
 
 from nowcasting_dataset import geospatial
 
@@ -43,6 +44,20 @@ def test_calculate_azimuth_and_elevation_angle():
     assert 60 < s["elevation"][0] < 65
 
 
+def test_calculate_solar_elevation():
+    """Test calculate_solar_elevation matches pvlib"""
+    datetimes = pd.date_range("2020-01-01", "2021-01-01", freq="7H")
+    latitudes = [49.8, 51, 58.5]
+    longitudes = [-7.5, 0, 2]
+
+    elevation = geospatial.calculate_solar_elevation(datetimes, latitudes, longitudes)
+
+    assert elevation.shape == (len(datetimes), 3)
+    for i, (latitude, longitude) in enumerate(zip(latitudes, longitudes)):
+        solar_position = pvlib.solarposition.get_solarposition(datetimes, latitude, longitude)
+        np.testing.assert_allclose(elevation[:, i], solar_position["elevation"], atol=0.02)
+
+
 def test_get_osgb_center_from_osgb():
     """Test get OSGB center"""
     x_osgb = np.random.randint(0, 100, 10)
@@ -1,16 +1,22 @@
 """Test Manager."""
+import multiprocessing
 import os
 import tempfile
+import time
 from datetime import datetime
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
+import pytest
 
 import nowcasting_dataset
+from nowcasting_dataset.config.model import BatchFileFormat
 from nowcasting_dataset.data_sources.gsp.gsp_data_source import GSPDataSource
+from nowcasting_dataset.dataset.batch import Batch
 from nowcasting_dataset.data_sources.satellite.satellite_data_source import SatelliteDataSource
 from nowcasting_dataset.data_sources.sun.sun_data_source import SunDataSource
+from nowcasting_dataset import manager as manager_module
 from nowcasting_dataset.manager import Manager
 
 
@@ -66,6 +72,37 @@ def test_sample_spatial_and_temporal_locations_for_examples():  # noqa: D103
     assert (t0_datetimes[-1] >= locations["t0_datetime_UTC"]).all()
 
 
+def test_sample_spatial_and_temporal_locations_for_examples_is_reproducible():  # noqa: D103
+    local_path = Path(nowcasting_dataset.__file__).parent.parent
+
+    gsp = GSPDataSource(
+        zarr_path=f"{local_path}/tests/data/gsp/test.zarr",
+        start_dt=datetime(2020, 4, 1),
+        end_dt=datetime(2020, 4, 2),
+        history_minutes=30,
+        forecast_minutes=60,
+        image_size_pixels=64,
+        meters_per_pixel=2000,
+    )
+
+    manager = Manager()
+    manager.data_sources = {"gsp": gsp}
+    manager.data_source_which_defines_geospatial_locations = gsp
+    t0_datetimes = manager.get_t0_datetimes_across_all_data_sources(freq="30T")
+
+    # Use more than one chunk, so the chunks are split across the workers.
+    n_examples = manager_module.N_EXAMPLES_PER_LOCATIONS_CHUNK + 10
+    locations = manager.sample_spatial_and_temporal_locations_for_examples(
+        t0_datetimes=t0_datetimes, n_examples=n_examples, seed=1234
+    )
+    locations_from_two_workers = manager.sample_spatial_and_temporal_locations_for_examples(
+        t0_datetimes=t0_datetimes, n_examples=n_examples, seed=1234, n_workers=2
+    )
+
+    assert len(locations) == n_examples
+    pd.testing.assert_frame_equal(locations, locations_from_two_workers)
+
+
 def test_load_yaml_configuration():  # noqa: D103
     manager = Manager()
     local_path = Path(nowcasting_dataset.__file__).parent.parent
@@ -176,6 +213,230 @@ def test_batches():
         assert os.path.exists(f"{dst_path}/train/hrvsat/000000.nc")
 
 
+def test_zarr_batches_cannot_be_uploaded():  # noqa: D103
+    manager = Manager()
+    local_path = Path(nowcasting_dataset.__file__).parent.parent
+    manager.load_yaml_configuration(filename=local_path / "tests" / "config" / "test.yaml")
+    manager.config.output_data.batch_file_format = BatchFileFormat.ZARR
+    assert manager.config.process.upload_every_n_batches > 0
+    with pytest.raises(ValueError):
+        manager.create_batches(overwrite_batches=True)
+
+
+def test_batches_with_several_workers_per_data_source():
+    """Test that the batches for one DataSource can be split across several workers"""
+    filename = (
+        Path(nowcasting_dataset.__file__).parent.parent / "tests" / "data" / "gsp" / "test.zarr"
+    )
+
+    gsp = GSPDataSource(
+        zarr_path=filename,
+        start_dt=datetime(2020, 4, 1),
+        end_dt=datetime(2020, 4, 2),
+        history_minutes=30,
+        forecast_minutes=60,
+        image_size_pixels=64,
+        meters_per_pixel=2000,
+    )
+
+    manager = Manager()
+
+    # load config
+    local_path = Path(nowcasting_dataset.__file__).parent.parent
+    filename = local_path / "tests" / "config" / "test.yaml"
+    manager.load_yaml_configuration(filename=filename)
+    manager.config.process.n_workers_per_data_source = {"gsp": 2}
+
+    with tempfile.TemporaryDirectory() as local_temp_path, tempfile.TemporaryDirectory() as dst_path:  # noqa 101
+
+        # set local temp path, and dst path
+        manager.config.output_data.filepath = Path(dst_path)
+        manager.local_temp_path = Path(local_temp_path)
+
+        manager.data_sources = {"gsp": gsp}
+        manager.data_source_which_defines_geospatial_locations = gsp
+
+        # make file for locations
+        manager.create_files_specifying_spatial_and_temporal_locations_of_each_example_if_necessary()  # noqa 101
+
+        # make batches
+        manager.create_batches(overwrite_batches=True)
+
+        assert os.path.exists(f"{dst_path}/train/gsp/000000.nc")
+        assert os.path.exists(f"{dst_path}/train/gsp/000001.nc")
+        assert not os.path.exists(f"{dst_path}/train/gsp/000002.nc")
+
+
+class GSPDataSourceWhichRecordsWriterQueueLength(GSPDataSource):
+    """A GSPDataSource which saves `max_batches_waiting_to_be_written` next to its batches"""
+
+    def create_batches(self, dst_path, max_batches_waiting_to_be_written, **kwargs):  # noqa: D102
+        with open(Path(dst_path) / "max_batches_waiting_to_be_written.txt", "w") as file:
+            file.write(str(max_batches_waiting_to_be_written))
+        super().create_batches(
+            dst_path=dst_path,
+            max_batches_waiting_to_be_written=max_batches_waiting_to_be_written,
+            **kwargs,
+        )
+
+
+def test_max_batches_waiting_to_be_written_is_passed_to_workers():
+    """Test that the Manager passes process.max_batches_waiting_to_be_written to the workers"""
+    local_path = Path(nowcasting_dataset.__file__).parent.parent
+    gsp = GSPDataSourceWhichRecordsWriterQueueLength(
+        zarr_path=local_path / "tests" / "data" / "gsp" / "test.zarr",
+        start_dt=datetime(2020, 4, 1),
+        end_dt=datetime(2020, 4, 2),
+        history_minutes=30,
+        forecast_minutes=60,
+        image_size_pixels=64,
+        meters_per_pixel=2000,
+    )
+
+    manager = Manager()
+    manager.load_yaml_configuration(filename=local_path / "tests" / "config" / "test.yaml")
+    manager.config.process.max_batches_waiting_to_be_written = 3
+
+    with tempfile.TemporaryDirectory() as local_temp_path, tempfile.TemporaryDirectory() as dst_path:  # noqa 101
+        manager.config.output_data.filepath = Path(dst_path)
+        manager.local_temp_path = Path(local_temp_path)
+        manager.data_sources = {"gsp": gsp}
+        manager.data_source_which_defines_geospatial_locations = gsp
+        manager.create_files_specifying_spatial_and_temporal_locations_of_each_example_if_necessary()  # noqa 101
+        manager.create_batches(overwrite_batches=True)
+
+        with open(f"{dst_path}/train/gsp/max_batches_waiting_to_be_written.txt") as file:
+            assert file.read() == "3"
+        assert os.path.exists(f"{dst_path}/train/gsp/000000.nc")
+
+
+@pytest.fixture
+def reset_worker():
+    """Forget the DataSources opened by `_initialise_worker()` in this process after the test"""
+    yield
+    manager_module._data_sources_for_worker = {}
+    manager_module._error_initialising_worker = None
+
+
+class UnreachableSunDataSource(SunDataSource):
+    """A SunDataSource which can't be opened"""
+
+    def open(self):  # noqa: D102
+        raise OSError("Store is unreachable")
+
+
+def test_initialise_worker(reset_worker):
+    """Test that each worker process keeps the DataSource it opened"""
+    local_path = Path(nowcasting_dataset.__file__).parent.parent
+
+    sun = SunDataSource(
+        zarr_path=f"{local_path}/tests/data/sun/test.zarr",
+        history_minutes=30,
+        forecast_minutes=60,
+    )
+
+    manager_module._initialise_worker(data_sources={"sun": sun})
+    assert manager_module._data_sources_for_worker["sun"] is sun
+
+
+def test_initialise_worker_error(reset_worker):
+    """Test that tasks fail (instead of hanging) if the worker can't open the DataSources"""
+    local_path = Path(nowcasting_dataset.__file__).parent.parent
+    sun = UnreachableSunDataSource(
+        zarr_path=f"{local_path}/tests/data/sun/test.zarr",
+        history_minutes=30,
+        forecast_minutes=60,
+    )
+
+    with multiprocessing.Pool(
+        processes=1, initializer=manager_module._initialise_worker, initargs=({"sun": sun},)
+    ) as pool:
+        result = pool.apply_async(
+            manager_module._get_locations_in_worker,
+            args=("sun", pd.DatetimeIndex([]), np.random.SeedSequence(0)),
+        )
+        with pytest.raises(OSError, match="unreachable"):
+            result.get(timeout=60)
+
+    manager_module._initialise_worker(data_sources={"sun": sun})
+    with pytest.raises(OSError, match="unreachable"):
+        manager_module._get_batch_in_worker(locations=pd.DataFrame())
+
+
+def test_wait_for_async_results_when_worker_dies():
+    """Test that waiting fails (instead of hanging) if a worker process dies"""
+    with multiprocessing.Pool(processes=1) as pool:
+        async_results = [pool.apply_async(time.sleep, (0,)), pool.apply_async(os._exit, (1,))]
+        with pytest.raises(RuntimeError, match="died"):
+            manager_module._wait_for_async_results(
+                async_results, pools={"sun": pool}, poll_seconds=0.1
+            )
+
+
+def test_initialise_worker_with_shared_satellite_reads(reset_worker):
+    """Test that the satellite DataSources share reads when share_satellite_reads is set"""
+    local_path = Path(nowcasting_dataset.__file__).parent.parent
+    kwargs = dict(
+        zarr_path=local_path / "tests" / "data" / "sat_data.zarr",
+        history_minutes=0,
+        forecast_minutes=5,
+        channels=("IR_016",),
+    )
+    satellite = SatelliteDataSource(**kwargs)
+    hrvsatellite = SatelliteDataSource(**kwargs)
+
+    manager = Manager()
+    manager.load_yaml_configuration(filename=local_path / "tests" / "config" / "test.yaml")
+    manager.data_sources = {"satellite": satellite, "hrvsatellite": hrvsatellite}
+    assert manager._get_data_sources_sharing_reads() == {}
+
+    manager.config.process.share_satellite_reads = True
+    with pytest.raises(ValueError):
+        manager._get_data_sources_sharing_reads()  # There's no chunk cache.
+
+    satellite.max_chunks_in_cache = 8
+    data_sources_sharing_reads = manager._get_data_sources_sharing_reads()
+    assert data_sources_sharing_reads == {"satellite": ["hrvsatellite"]}
+    manager_module._initialise_worker(manager.data_sources, data_sources_sharing_reads)
+    assert hrvsatellite._chunk_cache is satellite._chunk_cache
+
+
+def test_generate_batches():
+    """Test that batches can be generated in memory, without saving them to disk"""
+    local_path = Path(nowcasting_dataset.__file__).parent.parent
+
+    gsp = GSPDataSource(
+        zarr_path=f"{local_path}/tests/data/gsp/test.zarr",
+        start_dt=datetime(2020, 4, 1),
+        end_dt=datetime(2020, 4, 2),
+        history_minutes=30,
+        forecast_minutes=60,
+        image_size_pixels=64,
+        meters_per_pixel=2000,
+    )
+
+    sun = SunDataSource(
+        zarr_path=f"{local_path}/tests/data/sun/test.zarr",
+        history_minutes=30,
+        forecast_minutes=60,
+    )
+
+    manager = Manager()
+    manager.load_yaml_configuration(filename=local_path / "tests" / "config" / "test.yaml")
+    manager.data_sources = {"gsp": gsp, "sun": sun}
+    manager.data_source_which_defines_geospatial_locations = gsp
+
+    batches = list(manager.generate_batches(n_batches=3, n_workers=2, seed=1234))
+
+    assert len(batches) == 3
+    for batch in batches:
+        assert isinstance(batch, Batch)
+        assert batch.batch_size == manager.config.process.batch_size
+        assert len(batch.gsp.example) == batch.batch_size
+        assert len(batch.sun.example) == batch.batch_size
+        assert batch.pv is None
+
+
 def test_save_config():
     """Test that configuration file is saved"""
 
@@ -2,8 +2,10 @@ from datetime import timedelta
 
 import numpy as np
 import pandas as pd
+import pvlib
 import pytest
 
+from nowcasting_dataset import geospatial
 from nowcasting_dataset import time as nd_time
 from nowcasting_dataset.time import FIVE_MINUTES, THIRTY_MINUTES
 
@@ -16,6 +18,49 @@ def test_select_daylight_datetimes():
     np.testing.assert_array_equal(daylight_datetimes, correct_daylight_datetimes)
 
 
+def test_compute_daylight_mask_matches_pvlib():
+    # The corners of the UK, over a year.
+    datetimes = pd.date_range("2020-01-01", "2021-01-01", freq="5T")
+    locations = [(-200_000, 1_000_000), (600_000, 1_000_000), (-200_000, 0), (600_000, 0)]
+    mask = nd_time.compute_daylight_mask(datetimes, locations, ghi_threshold=10)
+
+    # Compute the mask with pvlib, one location at a time.
+    ghi_for_all_locations = []
+    for x, y in locations:
+        lat, lon = geospatial.osgb_to_lat_lon(x, y)
+        location = pvlib.location.Location(latitude=lat, longitude=lon)
+        ghi_for_all_locations.append(location.get_clearsky(datetimes)["ghi"])
+    max_ghi = pd.concat(ghi_for_all_locations, axis="columns").max(axis="columns")
+    expected_mask = (max_ghi > 10).values
+
+    # The masks only differ in the 5 minutes either side of sunrise and sunset.
+    is_next_to_sunrise_or_sunset = np.zeros_like(expected_mask)
+    changes = np.flatnonzero(expected_mask[1:] != expected_mask[:-1])
+    is_next_to_sunrise_or_sunset[changes] = True
+    is_next_to_sunrise_or_sunset[changes + 1] = True
+    assert not np.any((mask != expected_mask) & ~is_next_to_sunrise_or_sunset)
+    assert np.count_nonzero(mask != expected_mask) < 20
+
+
+def test_select_daylight_datetimes_with_cache(tmp_path):
+    datetimes = pd.date_range("2020-06-01", "2020-06-08", freq="5T")
+    locations = [(0, 0), (600_000, 1_000_000)]
+    daylight_datetimes = nd_time.select_daylight_datetimes(datetimes=datetimes, locations=locations)
+
+    for _ in range(2):  # Compute and save the mask, then load it.
+        cached_daylight_datetimes = nd_time.select_daylight_datetimes(
+            datetimes=datetimes, locations=locations, cache_path=tmp_path
+        )
+        pd.testing.assert_index_equal(cached_daylight_datetimes, daylight_datetimes)
+    assert len(list(tmp_path.glob("daylight_mask_*.npy"))) == 1
+
+    # A different time index gets its own mask.
+    nd_time.select_daylight_datetimes(
+        datetimes=datetimes[:-1], locations=locations, cache_path=tmp_path
+    )
+    assert len(list(tmp_path.glob("daylight_mask_*.npy"))) == 2
+
+
 @pytest.mark.parametrize("min_seq_length", [2, 3, 12])
 def test_get_contiguous_time_periods_1_with_1_chunk(min_seq_length):
     freq = pd.Timedelta(5, unit="minutes")
@@ -45,6 +90,21 @@ def test_get_contiguous_time_periods_2_with_2_chunks(min_seq_length):
     pd.testing.assert_frame_equal(periods, correct_periods)
 
 
+def test_merge_time_periods():
+    start_dts = pd.DatetimeIndex(["2020-01-01 06:00", "2020-01-01 00:00", "2020-01-01 03:00"])
+    end_dts = pd.DatetimeIndex(["2020-01-01 08:00", "2020-01-01 04:00", "2020-01-01 05:00"])
+    start_dts = start_dts.append(pd.DatetimeIndex(["2020-01-01 10:00"]))
+    end_dts = end_dts.append(pd.DatetimeIndex(["2020-01-01 12:00"]))
+    periods = nd_time.merge_time_periods(start_dts, end_dts, max_gap_duration=pd.Timedelta("1H"))
+    correct_periods = pd.DataFrame(
+        {
+            "start_dt": pd.DatetimeIndex(["2020-01-01 00:00", "2020-01-01 10:00"]),
+            "end_dt": pd.DatetimeIndex(["2020-01-01 08:00", "2020-01-01 12:00"]),
+        }
+    )
+    pd.testing.assert_frame_equal(periods, correct_periods)
+
+
 def test_intersection_of_2_dataframes_of_periods():
     dt = pd.Timestamp("2020-01-01 00:00")
     a = []
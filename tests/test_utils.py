@@ -1,5 +1,8 @@
 # noqa: D100
+import numpy as np
 import pandas as pd
+import pytest
+import xarray as xr
 
 from nowcasting_dataset import utils
 
@@ -14,6 +17,20 @@ def test_is_monotically_increasing():  # noqa: D103
     assert not utils.is_monotonically_increasing(index[::-1])
 
 
+def test_sort_and_drop_duplicates():  # noqa: D103
+    times = pd.DatetimeIndex(
+        ["2020-01-01 00:10", "2020-01-01 00:00", "2020-01-01 00:05", "2020-01-01 00:00"]
+    )
+    data_array = xr.DataArray(np.arange(4), coords={"time": times}, dims="time")
+    fixed = utils.sort_and_drop_duplicates(data_array, dim="time", name="test")
+    np.testing.assert_array_equal(fixed.time.values, np.sort(times.unique()))
+    # The first of the duplicated times is kept.
+    np.testing.assert_array_equal(fixed.values, [1, 2, 0])
+
+    # Data which is already sorted and unique is returned unchanged.
+    assert utils.sort_and_drop_duplicates(fixed, dim="time", name="test") is fixed
+
+
 def test_get_netcdf_filename():  # noqa: D103
     assert utils.get_netcdf_filename(10) == "000010.nc"
 
@@ -33,3 +50,47 @@ def test_remove_regex_pattern_from_keys():  # noqa: D103
     }
     new_dict = utils.remove_regex_pattern_from_keys(d, pattern_to_remove=r"^satellite_")
     assert new_dict == correct
+
+
+@pytest.mark.parametrize("max_rows_per_chunk", [1, 2, 4096])
+def test_get_columns_without_nans_in_windows(max_rows_per_chunk):  # noqa: D103
+    index = pd.date_range("2010-01-01", freq="H", periods=6)
+    df = pd.DataFrame({"a": [1, np.NaN, 1, 1, 1, 1], "b": [1, 1, 1, 1, 1, np.NaN]}, index=index)
+    start_dts = index[[3, 0, 2, 0]]
+    end_dts = index[[5, 2, 4, 0]]
+
+    mask = utils.get_columns_without_nans_in_windows(
+        df=df, start_dts=start_dts, end_dts=end_dts, max_rows_per_chunk=max_rows_per_chunk
+    )
+
+    correct = [
+        df.loc[start_dt:end_dt].notna().all().values for start_dt, end_dt in zip(start_dts, end_dts)
+    ]
+    np.testing.assert_array_equal(mask, correct)
+
+
+def test_get_row_idxs_of_windows():  # noqa: D103
+    index = pd.date_range("2010-01-01", freq="H", periods=6)
+    df = pd.DataFrame({"a": np.arange(6)}, index=index)
+    start_dts = index[[0, 2, 3]]
+    end_dts = index[[2, 4, 5]]
+
+    row_idxs = utils.get_row_idxs_of_windows(index=index, start_dts=start_dts, end_dts=end_dts)
+
+    correct = [df.loc[start_dt:end_dt, "a"].values for start_dt, end_dt in zip(start_dts, end_dts)]
+    np.testing.assert_array_equal(row_idxs, correct)
+
+    # Windows with different numbers of rows
+    row_idxs = utils.get_row_idxs_of_windows(index, start_dts=index[[0, 1]], end_dts=index[[2, 5]])
+    assert row_idxs is None
+
+
+def test_choose_random_true_element_in_each_row():  # noqa: D103
+    mask = np.array([[True, False, False], [False, True, True], [False, False, True]])
+    idxs = utils.choose_random_true_element_in_each_row(mask, rng=np.random.default_rng(42))
+    assert mask[np.arange(len(mask)), idxs].all()
+
+    with pytest.raises(ValueError):
+        utils.choose_random_true_element_in_each_row(
+            np.array([[False, False]]), rng=np.random.default_rng(42)
+        )